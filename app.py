@@ -2,72 +2,61 @@ import os
 import numpy as np
 from PIL import Image
 import gradio as gr
-from huggingface_hub import hf_hub_download
+
+from inference_core import InferenceEngine, fetch_from_hub, preprocess
 
 # ====== ENV / Konfigurasi ======
 HF_REPO   = os.getenv("HF_REPO", "palawakampa/tumorotak")  # brain tumor repo
 HF_FILE   = os.getenv("HF_FILENAME", "brain_tumor.tflite")  # brain tumor model file
 MODEL_DIR = os.getenv("MODEL_DIR", "models")
-MODEL_PATH = os.path.join(MODEL_DIR, HF_FILE)
-
-# ====== Download model ======
-os.makedirs(MODEL_DIR, exist_ok=True)
-if not os.path.exists(MODEL_PATH):
-    local = hf_hub_download(
-        repo_id=HF_REPO,
-        filename=HF_FILE,
-        local_dir=MODEL_DIR,
-        local_dir_use_symlinks=False,
-        token=os.getenv("HF_TOKEN") or None,
-    )
-    if local != MODEL_PATH:
-        import shutil; shutil.copy2(local, MODEL_PATH)
-
-# ====== Load model (TFLite) ======
-import tflite_runtime.interpreter as tflite
-interpreter = tflite.Interpreter(model_path=MODEL_PATH, num_threads=1)
-interpreter.allocate_tensors()
-in_details  = interpreter.get_input_details()
-out_details = interpreter.get_output_details()
-
-def infer(image: Image.Image):
-    """Brain Tumor Inference Function"""
-    if image is None:
-        return {"error": "No image provided"}
-
-    try:
-        # Preprocess
-        img = image.convert("RGB").resize((224, 224))
-        x = np.expand_dims(np.array(img, dtype=np.float32) / 255.0, axis=0)
-
-        # Inference
-        interpreter.set_tensor(in_details[0]["index"], x)
-        interpreter.invoke()
-        y = interpreter.get_tensor(out_details[0]["index"])
-
-        # Handle different output shapes
-        if y.shape == (1, 2):
-            # Softmax output
-            prob_tumor = float(y[0][1])  # Assuming [normal, tumor]
-        elif y.shape == (1,):
-            # Sigmoid output
-            prob_tumor = float(y[0])
-        else:
-            return {"error": f"Unexpected model output shape: {y.shape}"}
-
-        # Determine prediction
-        label = "TUMOR OTAK" if prob_tumor > 0.5 else "TIDAK TUMOR OTAK"
-        confidence = max(prob_tumor, 1 - prob_tumor)
-
-        return {
-            "prediction": label,
-            "probability_tumor": round(prob_tumor, 4),
-            "probability_normal": round(1 - prob_tumor, 4),
-            "confidence": round(confidence, 4)
-        }
 
-    except Exception as e:
-        return {"error": f"Inference failed: {str(e)}"}
+# ====== Queue / batching ======
+MAX_BATCH_SIZE    = int(os.getenv("GRADIO_MAX_BATCH", 8))     # images fused into one invoke
+CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY", 2))   # batches running at once
+QUEUE_MAX_SIZE    = int(os.getenv("GRADIO_QUEUE_SIZE", 64))   # waiting requests before rejecting
+
+# ====== Model (downloaded + loaded by the shared engine, never at import) ======
+ENGINE = InferenceEngine(
+    lambda: fetch_from_hub(HF_REPO, HF_FILE, MODEL_DIR, token=os.getenv("HF_TOKEN"))
+)
+
+def _result(prob_tumor: float):
+    confidence = max(prob_tumor, 1 - prob_tumor)
+    return {
+        "prediction": ENGINE.label_for(prob_tumor),
+        "probability_tumor": round(prob_tumor, 4),
+        "probability_normal": round(1 - prob_tumor, 4),
+        "confidence": round(confidence, 4)
+    }
+
+def infer(images):
+    """
+    Brain Tumor Inference Function (Gradio batch mode).
+    Receives a list of images from the queue and returns a list of results,
+    running every valid image through a single batched invoke.
+    """
+    results = [{"error": "No image provided"} if img is None else None for img in images]
+
+    tensors, slots = [], []
+    for i, img in enumerate(images):
+        if img is None:
+            continue
+        try:
+            tensors.append(preprocess(img))
+            slots.append(i)
+        except Exception as e:
+            results[i] = {"error": f"Invalid image: {str(e)}"}
+
+    if tensors:
+        try:
+            probs = ENGINE.predict_arrays(np.concatenate(tensors, axis=0))
+            for i, p in zip(slots, probs):
+                results[i] = _result(float(p[1]))
+        except Exception as e:
+            for i in slots:
+                results[i] = {"error": f"Inference failed: {str(e)}"}
+
+    return [results]
 
 # Custom CSS for dark mode and styling
 css = """
@@ -129,9 +118,9 @@ with gr.Blocks(title="🩺 Brain Tumor Predictor", theme=gr.themes.Soft(), css=c
     gr.Markdown("""
     Upload an MRI or CT scan image to predict brain tumor presence using AI.
 
-    **Labels:**
-    - TIDAK TUMOR OTAK (No Brain Tumor)
-    - TUMOR OTAK (Brain Tumor)
+    **Labels** (from the model's `assets.json`, default):
+    - No Tumor (Tidak Tumor Otak)
+    - Tumor (Tumor Otak)
 
     **Note:** This is for demonstration purposes only. Always consult medical professionals for actual diagnosis.
 
@@ -163,7 +152,10 @@ with gr.Blocks(title="🩺 Brain Tumor Predictor", theme=gr.themes.Soft(), css=c
     submit_btn.click(
         fn=infer,
         inputs=input_image,
-        outputs=output_json
+        outputs=output_json,
+        batch=True,
+        max_batch_size=MAX_BATCH_SIZE,
+        concurrency_limit=CONCURRENCY_LIMIT
     )
 
     # Dark mode JavaScript
@@ -183,5 +175,9 @@ with gr.Blocks(title="🩺 Brain Tumor Predictor", theme=gr.themes.Soft(), css=c
         """
     )
 
+demo.queue(max_size=QUEUE_MAX_SIZE)
+
 if __name__ == "__main__":
+    # Warm the model while the server comes up; the first batch waits on it
+    ENGINE.start_background_load()
     demo.launch()
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Shared inference core for the brain tumor detection front ends.
+
+    from inference_core import InferenceEngine, fetch_from_hub, preprocess
+"""
+from .backends import (
+    BackendPool, InferenceBackend, OnnxBackend, TFLiteBackend, available_backends,
+    backend_for_path, create_backend, select_backend
+)
+from .cascade import Cascade, load_cascade_band
+from .engine import InferenceEngine, ResultCache, build_backend_pool, content_key
+from .ensemble import Ensemble
+from .model_store import fetch_from_hub
+from .pipeline import StageExecutor, UtilizationMeter
+from .processing import DEFAULT_LABELS, DEFAULT_THRESHOLD, label_for, preprocess, preprocess_bytes, to_probs
+from .tuning import effective_cpu_count, plan_threads
+from .volumes import (
+    VOLUME_BATCH, estimate_window, open_volume, read_slice_batch, slice_batch_bytes, volume_formats, volume_result
+)
+
+__all__ = [
+    "BackendPool",
+    "Cascade",
+    "Ensemble",
+    "InferenceBackend",
+    "InferenceEngine",
+    "OnnxBackend",
+    "ResultCache",
+    "StageExecutor",
+    "TFLiteBackend",
+    "UtilizationMeter",
+    "DEFAULT_LABELS",
+    "DEFAULT_THRESHOLD",
+    "VOLUME_BATCH",
+    "available_backends",
+    "backend_for_path",
+    "build_backend_pool",
+    "content_key",
+    "create_backend",
+    "effective_cpu_count",
+    "estimate_window",
+    "fetch_from_hub",
+    "load_cascade_band",
+    "label_for",
+    "open_volume",
+    "plan_threads",
+    "preprocess",
+    "preprocess_bytes",
+    "read_slice_batch",
+    "select_backend",
+    "slice_batch_bytes",
+    "to_probs",
+    "volume_formats",
+    "volume_result",
+]
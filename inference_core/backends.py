@@ -0,0 +1,372 @@
+"""
+Pluggable inference backends.
+
+Every backend wraps one loaded model instance behind the same small
+surface: load, introspect (input/output shapes), run a single input and
+run a batch. The concrete backend is chosen from the model file extension
+or the INFERENCE_BACKEND setting, and when several model files are
+available a short micro-benchmark can pick the fastest one for the CPU
+we are running on.
+"""
+import importlib.util
+import logging
+import os
+import queue
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Model file extension -> backend name
+BACKEND_EXTENSIONS = {
+    ".tflite": "tflite",
+    ".onnx": "onnx",
+}
+
+
+def available_backends() -> List[str]:
+    """Return the backends whose runtime is importable (without importing it)."""
+    found = []
+    if importlib.util.find_spec("tflite_runtime") or importlib.util.find_spec("tensorflow"):
+        found.append("tflite")
+    if importlib.util.find_spec("onnxruntime"):
+        found.append("onnx")
+    return found
+
+
+def backend_for_path(model_path: str) -> Optional[str]:
+    """Map a model file to a backend name by its extension."""
+    ext = os.path.splitext(model_path)[1].lower()
+    return BACKEND_EXTENSIONS.get(ext)
+
+
+class InferenceBackend:
+    """Base class for a single loaded model instance."""
+
+    name = "base"
+
+    def __init__(self, model_path: str, num_threads: int = 1):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        # Filled in by benchmark()
+        self.throughput_ips = None
+        self.latency_ms = None
+
+    def load(self):
+        raise NotImplementedError
+
+    @property
+    def input_shape(self) -> List[int]:
+        raise NotImplementedError
+
+    @property
+    def output_shape(self) -> List[int]:
+        raise NotImplementedError
+
+    @property
+    def input_dtype(self):
+        return np.float32
+
+    def run_batch(self, x: np.ndarray) -> np.ndarray:
+        """Run a (N, H, W, C) batch and return the (N, ...) model output."""
+        raise NotImplementedError
+
+    def run(self, x: np.ndarray) -> np.ndarray:
+        """Run a single (1, H, W, C) input."""
+        if x.ndim == 3:
+            x = np.expand_dims(x, axis=0)
+        return self.run_batch(x)
+
+    def describe(self) -> Dict:
+        return {
+            "backend": self.name,
+            "model_path": self.model_path,
+            "num_threads": self.num_threads,
+            "input_shape": self.input_shape,
+            "output_shape": self.output_shape,
+            "throughput_ips": round(self.throughput_ips, 2) if self.throughput_ips else None,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms else None,
+        }
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter with the XNNPACK delegate enabled by default."""
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = 1, use_xnnpack: bool = True):
+        super().__init__(model_path, num_threads)
+        self.use_xnnpack = use_xnnpack
+        self._interp = None
+        self._in = None
+        self._out = None
+        self._batch = 1
+        self._resizable = True
+
+    @staticmethod
+    def _import_runtime():
+        try:
+            import tflite_runtime.interpreter as tflite
+        except ImportError:
+            from tensorflow import lite as tflite  # full TensorFlow wheel
+        return tflite
+
+    def load(self):
+        tflite = self._import_runtime()
+        kwargs = {"model_path": self.model_path, "num_threads": self.num_threads}
+        # AUTO applies the default delegates (XNNPACK on CPU); the
+        # WITHOUT_DEFAULT_DELEGATES resolver opts out of it.
+        resolver = getattr(tflite, "OpResolverType", None) or getattr(
+            getattr(tflite, "experimental", None), "OpResolverType", None
+        )
+        if resolver is not None:
+            kwargs["experimental_op_resolver_type"] = (
+                resolver.AUTO if self.use_xnnpack else resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+            )
+        self._interp = tflite.Interpreter(**kwargs)
+        self._interp.allocate_tensors()
+        self._refresh_details()
+        self._batch = int(self._in["shape"][0])
+        return self
+
+    def _refresh_details(self):
+        self._in = self._interp.get_input_details()[0]
+        self._out = self._interp.get_output_details()[0]
+
+    @property
+    def input_shape(self) -> List[int]:
+        return [int(d) for d in self._in["shape"]] if self._in else None
+
+    @property
+    def output_shape(self) -> List[int]:
+        return [int(d) for d in self._out["shape"]] if self._out else None
+
+    @property
+    def input_dtype(self):
+        return self._in["dtype"] if self._in else np.float32
+
+    def _resize(self, n: int) -> bool:
+        """Resize the batch dimension; returns False if the model refuses."""
+        if n == self._batch:
+            return True
+        if not self._resizable:
+            return False
+        try:
+            shape = list(self._in["shape"])
+            shape[0] = n
+            self._interp.resize_tensor_input(self._in["index"], shape)
+            self._interp.allocate_tensors()
+            self._refresh_details()
+            self._batch = n
+            return True
+        except Exception as e:
+            logger.warning(f"TFLite model does not support batch resize ({e}); running per-sample")
+            self._resizable = False
+            return False
+
+    def _invoke(self, x: np.ndarray) -> np.ndarray:
+        self._interp.set_tensor(self._in["index"], x)
+        self._interp.invoke()
+        return self._interp.get_tensor(self._out["index"]).copy()
+
+    def run_batch(self, x: np.ndarray) -> np.ndarray:
+        x = x.astype(self.input_dtype, copy=False)
+        if self._resize(x.shape[0]):
+            return self._invoke(x)
+        if self._batch != 1:
+            self._resize(1)
+        return np.concatenate([self._invoke(x[i:i + 1]) for i in range(x.shape[0])], axis=0)
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU execution provider."""
+
+    name = "onnx"
+
+    _DTYPES = {
+        "tensor(float)": np.float32,
+        "tensor(float16)": np.float16,
+        "tensor(uint8)": np.uint8,
+        "tensor(int8)": np.int8,
+    }
+
+    def __init__(self, model_path: str, num_threads: int = 1):
+        super().__init__(model_path, num_threads)
+        self._sess = None
+        self._in = None
+        self._out = None
+        self._nchw = False
+
+    def load(self):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = self.num_threads
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._sess = ort.InferenceSession(
+            self.model_path, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._in = self._sess.get_inputs()[0]
+        self._out = self._sess.get_outputs()[0]
+        # Exporters from PyTorch produce NCHW; tf2onnx keeps Keras' NHWC.
+        shape = self.input_shape
+        self._nchw = len(shape) == 4 and shape[1] in (1, 3) and shape[3] not in (1, 3)
+        return self
+
+    @staticmethod
+    def _dims(shape) -> List[int]:
+        # Symbolic / dynamic dimensions are reported as -1
+        return [d if isinstance(d, int) else -1 for d in shape]
+
+    @property
+    def input_shape(self) -> List[int]:
+        return self._dims(self._in.shape) if self._in else None
+
+    @property
+    def output_shape(self) -> List[int]:
+        return self._dims(self._out.shape) if self._out else None
+
+    @property
+    def input_dtype(self):
+        return self._DTYPES.get(self._in.type, np.float32) if self._in else np.float32
+
+    def run_batch(self, x: np.ndarray) -> np.ndarray:
+        x = x.astype(self.input_dtype, copy=False)
+        if self._nchw:
+            x = np.ascontiguousarray(x.transpose(0, 3, 1, 2))
+        return self._sess.run([self._out.name], {self._in.name: x})[0]
+
+
+BACKENDS = {
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+
+class BackendPool:
+    """
+    Fixed set of backend instances shared by concurrent requests.
+
+    Interpreters are not thread-safe, so each request checks one out for
+    the duration of its invoke and returns it afterwards.
+    """
+
+    def __init__(self, backends: List[InferenceBackend]):
+        self.backends = list(backends)
+        self._free = queue.Queue()
+        for b in self.backends:
+            self._free.put(b)
+
+    @property
+    def primary(self) -> InferenceBackend:
+        return self.backends[0]
+
+    def __len__(self):
+        return len(self.backends)
+
+    def checkout(self, timeout: Optional[float] = None) -> InferenceBackend:
+        """Take a free backend, blocking until one is returned."""
+        return self._free.get(timeout=timeout)
+
+    def checkin(self, backend: InferenceBackend):
+        self._free.put(backend)
+
+    @property
+    def idle(self) -> int:
+        return self._free.qsize()
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        backend = self.checkout(timeout)
+        try:
+            yield backend
+        finally:
+            self.checkin(backend)
+
+    def run(self, x: np.ndarray) -> np.ndarray:
+        with self.acquire() as backend:
+            return backend.run(x)
+
+    def run_batch(self, x: np.ndarray) -> np.ndarray:
+        with self.acquire() as backend:
+            return backend.run_batch(x)
+
+
+def create_backend(model_path: str, kind: Optional[str] = None, num_threads: int = 1) -> InferenceBackend:
+    """Instantiate and load a backend for a model file."""
+    kind = kind or backend_for_path(model_path)
+    if kind not in BACKENDS:
+        raise ValueError(f"No inference backend for '{model_path}' (kind={kind})")
+    return BACKENDS[kind](model_path, num_threads=num_threads).load()
+
+
+def sample_input(backend: InferenceBackend, batch: int = 1) -> np.ndarray:
+    shape = [d if d > 0 else 224 for d in backend.input_shape]
+    if backend.name == "onnx" and backend._nchw:
+        shape = [shape[0], shape[2], shape[3], shape[1]]
+    shape[0] = batch
+    return np.random.default_rng(0).random(shape).astype(backend.input_dtype)
+
+
+def benchmark(backend: InferenceBackend, runs: int = 10, warmup: int = 2, batch: int = 1) -> float:
+    """Measure steady-state throughput (images/s) and store it on the backend."""
+    x = sample_input(backend, batch)
+    for _ in range(warmup):
+        backend.run_batch(x)
+    start = time.perf_counter()
+    for _ in range(runs):
+        backend.run_batch(x)
+    elapsed = time.perf_counter() - start
+    backend.latency_ms = elapsed / runs * 1000
+    backend.throughput_ips = runs * batch / elapsed if elapsed > 0 else 0.0
+    return backend.throughput_ips
+
+
+def select_backend(
+    candidates: Dict[str, str],
+    preferred: str = "auto",
+    num_threads: int = 1,
+    benchmark_runs: int = 10,
+) -> InferenceBackend:
+    """
+    Load the backend to serve with.
+
+    `candidates` maps backend name -> local model path. With an explicit
+    `preferred` backend only that one is loaded; with "auto" every candidate
+    that loads is benchmarked and the fastest one is kept.
+    """
+    if preferred and preferred != "auto":
+        if preferred not in candidates:
+            raise ValueError(f"INFERENCE_BACKEND={preferred} but no {preferred} model is available")
+        candidates = {preferred: candidates[preferred]}
+
+    loaded = []
+    for kind, path in candidates.items():
+        try:
+            loaded.append(create_backend(path, kind, num_threads=num_threads))
+        except Exception as e:
+            logger.warning(f"Could not load {kind} backend from {path}: {e}")
+    if not loaded:
+        raise RuntimeError(f"No inference backend could be loaded from {candidates}")
+
+    if benchmark_runs > 0:
+        for backend in loaded:
+            try:
+                benchmark(backend, runs=benchmark_runs)
+                logger.info(
+                    f"Backend {backend.name}: {backend.throughput_ips:.1f} img/s "
+                    f"({backend.latency_ms:.1f} ms/img, threads={num_threads})"
+                )
+            except Exception as e:
+                logger.warning(f"Benchmark of {backend.name} backend failed: {e}")
+                backend.throughput_ips = 0.0
+
+    best = max(loaded, key=lambda b: b.throughput_ips or 0.0)
+    if len(loaded) > 1:
+        logger.info(f"Selected {best.name} backend (fastest of {[b.name for b in loaded]})")
+    return best
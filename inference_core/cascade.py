@@ -0,0 +1,165 @@
+"""
+Two-stage cascade: a small screening model in front of the full model.
+
+Every image is scored by the screening engine; only images whose screening
+p_tumor falls inside the uncertainty band [low, high] go on to the full
+engine. Below `low` the screen answers "negative", above `high` "positive".
+The band is calibrated offline (scripts/calibrate_cascade.py) so that, on
+the validation set, the screen never rejects a positive the full model
+finds; with high >= 1.0 (the default) positives are always confirmed by the
+full model. The band must contain the full model's decision threshold, so a
+screen decision always agrees with the label its probabilities get at that
+threshold (including when they are served from the cache). Both stages are
+ordinary InferenceEngines, so each keeps its own interpreter pool,
+micro-batching and idle unloading.
+"""
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .engine import InferenceEngine
+from .processing import preprocess
+
+SCREEN = "screen"
+FULL = "full"
+
+
+def load_cascade_band(path: str) -> Tuple[float, float]:
+    """(low, high) from a calibration file written by scripts/calibrate_cascade.py."""
+    with open(path) as f:
+        band = json.load(f)
+    return float(band["low"]), float(band.get("high", 1.0))
+
+
+class Cascade:
+    """Screening engine, full engine and the band that decides which answers."""
+
+    def __init__(self, screen: InferenceEngine, full: InferenceEngine, low: float, high: float = 1.0):
+        if not 0.0 <= low <= high:
+            raise ValueError(f"Invalid cascade band [{low}, {high}]")
+        self.screen = screen
+        self.full = full
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        # Escalations are queued from here, never from the screen's infer thread,
+        # so a full engine queue cannot stall screening
+        self._escalate = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cascade-escalate")
+        self._counts = {"screened": 0, "screen_negative": 0, "screen_positive": 0, "escalated": 0}
+
+    def load(self):
+        """Load (or reload after an idle unload) both stages; blocking."""
+        self.screen.load()
+        self.full.load()
+        self.check_threshold(self.full.threshold)
+
+    def close(self):
+        """Stop the escalation worker and the screening engine; the full engine is closed by its owner."""
+        self._escalate.shutdown(wait=False, cancel_futures=True)
+        self.screen.close()
+
+    def check_threshold(self, threshold: float):
+        """
+        Reject a band that would let the screen contradict the full model's
+        decision threshold. Checked on load and again per request, since the
+        threshold comes from the model's assets.json and a failed load does
+        not stop the service from serving.
+        """
+        if self.low > threshold or self.high < threshold:
+            raise ValueError(
+                f"Cascade band [{self.low}, {self.high}] must contain the decision threshold {threshold}; "
+                f"recalibrate with scripts/calibrate_cascade.py"
+            )
+
+    def decide(self, p_tumor: float) -> Optional[str]:
+        """The screen's final answer for a screening score, or None to escalate."""
+        if p_tumor < self.low:
+            return "negative"
+        if p_tumor > self.high:
+            return "positive"
+        return None
+
+    def preprocess(self, img: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+        """Inputs for both stages (after the first load); one tensor serves both when their sizes match."""
+        screen_size, full_size = self.screen.input_size, self.full.input_size
+        x_full = preprocess(img, full_size)
+        return (x_full if screen_size == full_size else preprocess(img, screen_size)), x_full
+
+    def _count(self, decisions: List[Optional[str]]):
+        with self._lock:
+            self._counts["screened"] += len(decisions)
+            for decision in decisions:
+                self._counts[f"screen_{decision}" if decision else "escalated"] += 1
+
+    def submit(self, x_screen: np.ndarray, x_full: np.ndarray, cache_key: Optional[str] = None) -> Future:
+        """
+        Queue one image; returns a Future resolving to (probs, stage) where
+        stage is "screen" or "full". The final probabilities are cached in
+        the full engine's cache under `cache_key`. Blocks like
+        InferenceEngine.submit while the screening queue is full. Both stages
+        are loaded here, on the caller's thread, before anything is queued.
+        """
+        self.screen.load()
+        self.full.load()
+        self.check_threshold(self.full.threshold)
+        result = Future()
+
+        def screened(future: Future):
+            try:
+                probs = future.result()
+                decision = self.decide(float(probs[1]))
+                self._count([decision])
+                if decision is not None:
+                    self.full.cache.put(cache_key, probs)
+                    result.set_result((probs, SCREEN))
+                    return
+                self._escalate.submit(escalate).add_done_callback(failed)
+            except Exception as e:
+                result.set_exception(e)
+
+        def escalate():
+            self.full.submit(x_full, cache_key).add_done_callback(escalated)
+
+        def failed(future: Future):
+            if future.cancelled():
+                result.set_exception(RuntimeError("Cascade closed before escalation"))
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+
+        def escalated(future: Future):
+            try:
+                result.set_result((future.result(), FULL))
+            except Exception as e:
+                result.set_exception(e)
+
+        self.screen.submit(x_screen).add_done_callback(screened)
+        return result
+
+    def predict_arrays(self, x_screen: np.ndarray, x_full: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+        """Score a batch: one screening invoke, one full invoke for the escalated rows."""
+        self.check_threshold(self.full.threshold)
+        probs = self.screen.predict_arrays(x_screen)
+        decisions = [self.decide(float(p[1])) for p in probs]
+        self._count(decisions)
+        escalate = [i for i, decision in enumerate(decisions) if decision is None]
+        if escalate:
+            probs = probs.copy()
+            probs[escalate] = self.full.predict_arrays(x_full[escalate])
+        return probs, [SCREEN if decision else FULL for decision in decisions]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        screened = counts["screened"]
+        return {
+            "band": [self.low, self.high],
+            **counts,
+            "escalation_rate": round(counts["escalated"] / screened, 4) if screened else None,
+            "screen_model_sha": self.screen.model_sha or "unknown",
+            "screen_backend": self.screen.backend.name if self.screen.backend else None,
+            "screen_load_time": round(self.screen.load_time, 3),
+        }
@@ -0,0 +1,511 @@
+"""
+Inference engine shared by the FastAPI, Railway and Gradio front ends.
+
+The engine owns model loading (lazy or in a background thread), the
+interpreter pool, dynamic micro-batching of concurrent requests and an LRU
+cache of results keyed by the caller's content hash. Front ends only decode
+their input, call preprocess() and hand the tensor over.
+
+With MODEL_IDLE_MINUTES set, the interpreter pool is released after that
+long without inference. The model files stay in the local model directory,
+and the next request rebuilds the pool from them with the backend and
+thread split chosen at first load, skipping the download, benchmark and
+calibration. TFLite memory-maps the model file, so a reload only maps it
+and allocates tensors.
+"""
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .backends import BackendPool, benchmark, create_backend, sample_input, select_backend
+from .pipeline import UtilizationMeter
+from .processing import DEFAULT_LABELS, DEFAULT_THRESHOLD, INPUT_SIZE, label_for, to_probs
+from .tuning import plan_threads
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "auto").lower()  # auto | tflite | onnx
+BACKEND_BENCHMARK_RUNS = int(os.environ.get("BACKEND_BENCHMARK_RUNS", 10))
+THREAD_CALIBRATION_RUNS = int(os.environ.get("THREAD_CALIBRATION_RUNS", 5))  # 0 disables calibration
+INFER_MAX_BATCH = int(os.environ.get("INFER_MAX_BATCH", 8))
+INFER_BATCH_WAIT_MS = float(os.environ.get("INFER_BATCH_WAIT_MS", 2))
+INFER_QUEUE_SIZE = int(os.environ.get("INFER_QUEUE_SIZE", 64))  # preprocessed images waiting for an interpreter
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 256))  # 0 disables the cache
+MODEL_IDLE_MINUTES = float(os.environ.get("MODEL_IDLE_MINUTES", 0))  # release interpreters when idle, 0 = never
+
+# (candidates, assets): backend name -> local model path, parsed assets.json
+ModelFetcher = Callable[[], Tuple[Dict[str, str], Dict]]
+
+
+def build_backend_pool(candidates: Dict[str, str], preferred: str = INFERENCE_BACKEND,
+                       benchmark_runs: int = BACKEND_BENCHMARK_RUNS,
+                       calibration_runs: int = THREAD_CALIBRATION_RUNS, cpu_share: float = 1.0):
+    """
+    Select the backend, plan the thread split for the CPU quota (or the
+    `cpu_share` of it) and build the interpreter pool. Blocking; returns
+    (pool, thread_config).
+    """
+    config = plan_threads(cpu_share=cpu_share)
+    backend = select_backend(candidates, preferred, config["threads_per_interpreter"], benchmark_runs)
+
+    def make_backend(threads):
+        return create_backend(backend.model_path, backend.name, num_threads=threads)
+
+    # Confirm the heuristic split with a short calibration run
+    if calibration_runs > 0 and config["source"] != "override":
+        config = plan_threads(make_backend, sample_input(backend), calibration_runs, cpu_share)
+
+    threads = config["threads_per_interpreter"]
+    if backend.num_threads != threads:
+        backend = make_backend(threads)
+        if benchmark_runs > 0:
+            benchmark(backend, runs=benchmark_runs)
+    members = [backend] + [make_backend(threads) for _ in range(config["pool_size"] - 1)]
+    logger.info(
+        f"Interpreter pool: {len(members)} x {backend.name} with {threads} thread(s) "
+        f"({config['source']}, {config['cpus']} CPU(s) via {config['cpu_source']})"
+    )
+    return BackendPool(members), config
+
+
+def model_input_size(shape) -> Tuple[int, int]:
+    """(width, height) from an NHWC input shape; INPUT_SIZE when it is dynamic."""
+    if not shape or len(shape) != 4 or not all(isinstance(d, int) and d > 0 for d in shape[1:3]):
+        return INPUT_SIZE
+    return shape[2], shape[1]
+
+
+def content_key(data: bytes) -> str:
+    """Cache key for raw upload bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU of probability vectors keyed by content hash."""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Optional[str]) -> Optional[np.ndarray]:
+        if not key or self.max_entries <= 0:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Optional[str], value: np.ndarray):
+        if not key or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+class InferenceEngine:
+    """
+    Loaded model plus everything needed to serve it fast.
+
+    `fetch` is called (with retries) on first load and must return the
+    backend candidates and assets.json contents, see model_store.fetch_from_hub.
+    """
+
+    def __init__(
+        self,
+        fetch: ModelFetcher,
+        backend: str = INFERENCE_BACKEND,
+        benchmark_runs: int = BACKEND_BENCHMARK_RUNS,
+        calibration_runs: int = THREAD_CALIBRATION_RUNS,
+        max_batch: int = INFER_MAX_BATCH,
+        batch_wait_ms: float = INFER_BATCH_WAIT_MS,
+        queue_size: int = INFER_QUEUE_SIZE,
+        cache_size: int = RESULT_CACHE_SIZE,
+        max_retries: int = 3,
+        retry_delay: float = 2.0,
+        idle_minutes: float = MODEL_IDLE_MINUTES,
+        cpu_share: float = 1.0,
+    ):
+        self.fetch = fetch
+        self.backend_pref = backend
+        self.benchmark_runs = benchmark_runs
+        self.calibration_runs = calibration_runs
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000.0
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.idle_s = max(0.0, idle_minutes) * 60
+        self.cpu_share = cpu_share
+        self.cache = ResultCache(cache_size)
+
+        self.ready = threading.Event()
+        self.error = None
+        self.pool = None
+        self.thread_config = {}
+        self.assets = {}
+        self.labels = list(DEFAULT_LABELS)
+        self.threshold = DEFAULT_THRESHOLD
+        self.model_sha = None
+        self.load_time = 0.0
+        self.input_size = INPUT_SIZE  # (width, height) for preprocess(), kept across idle unloads
+
+        self._load_lock = threading.Lock()
+        self._loader = None  # background load thread, see start_background_load()
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._meter = None  # inference-stage utilization, sized to the interpreter pool
+        self._executor = None
+        self._dispatcher = None
+        self._batches = 0
+        self._batched_items = 0
+
+        # Idle unloading: in-flight work and last use are guarded by _use_lock
+        self._use_lock = threading.Lock()
+        self._inflight = 0
+        self._last_used = time.monotonic()
+        self._reload_from = None  # (backend name, model path) once a model has been loaded
+        self._idle_stop = threading.Event()
+        self._idle_watcher = None
+        self._idle_counters = {"unloads": 0, "reloads": 0, "last_reload_ms": None, "max_reload_ms": None}
+
+    # ------------------------------------------------------------------ loading
+
+    @property
+    def backend(self):
+        return self.pool.primary if self.pool else None
+
+    @property
+    def unloaded(self) -> bool:
+        """True while the interpreters are released after an idle period."""
+        return self._reload_from is not None and not self.ready.is_set()
+
+    def load(self):
+        """Load the model (idempotent, thread-safe, blocking)."""
+        if self.ready.is_set():
+            return
+        with self._load_lock:
+            if self.ready.is_set():
+                return
+            if self._reload_from is not None:
+                self._reload()
+                return
+            start = time.time()
+            delay = self.retry_delay
+            for attempt in range(self.max_retries):
+                try:
+                    logger.info(f"Loading model (attempt {attempt + 1}/{self.max_retries})...")
+                    candidates, assets = self.fetch()
+                    pool, config = build_backend_pool(
+                        candidates, self.backend_pref, self.benchmark_runs, self.calibration_runs, self.cpu_share
+                    )
+                    break
+                except Exception as e:
+                    logger.error(f"Model loading attempt {attempt + 1} failed: {e}")
+                    if attempt == self.max_retries - 1:
+                        self.error = e
+                        self.load_time = time.time() - start
+                        raise
+                    logger.info(f"Retrying in {delay}s...")
+                    time.sleep(delay)
+                    delay *= 2  # Exponential backoff
+
+            self.assets = assets or {}
+            self.labels = self.assets.get("labels", list(DEFAULT_LABELS))
+            self.threshold = self.assets.get("threshold", DEFAULT_THRESHOLD)
+            with open(pool.primary.model_path, "rb") as f:
+                self.model_sha = hashlib.sha256(f.read()).hexdigest()[:8]
+            self.pool = pool
+            self.thread_config = config
+            self.input_size = model_input_size(pool.primary.input_shape)
+            self._start_dispatcher()
+            self.error = None
+            self.load_time = time.time() - start
+            self._reload_from = (pool.primary.name, pool.primary.model_path)
+            self._mark_used()
+            self.ready.set()
+            self._start_idle_watcher()
+            logger.info(
+                f"✅ Model loaded successfully in {self.load_time:.2f}s "
+                f"(SHA: {self.model_sha}, backend: {pool.primary.name})"
+            )
+
+    def _reload(self):
+        """Rebuild the interpreter pool from the local model file (caller holds _load_lock)."""
+        start = time.perf_counter()
+        name, path = self._reload_from
+        threads = self.thread_config.get("threads_per_interpreter", 1)
+        members = [create_backend(path, name, num_threads=threads)
+                   for _ in range(self.thread_config.get("pool_size", 1))]
+        # One warm-up invoke each so the first request doesn't pay for weight packing
+        for member in members:
+            member.run(sample_input(member))
+        self.pool = BackendPool(members)
+        self._start_dispatcher()
+        reload_ms = round((time.perf_counter() - start) * 1000, 1)
+        counters = self._idle_counters
+        counters["reloads"] += 1
+        counters["last_reload_ms"] = reload_ms
+        counters["max_reload_ms"] = max(counters["max_reload_ms"] or 0.0, reload_ms)
+        self._mark_used()
+        self.ready.set()
+        logger.info(f"Model reloaded from {path} in {reload_ms:.0f}ms after idle unload")
+
+    def _mark_used(self):
+        with self._use_lock:
+            self._last_used = time.monotonic()
+
+    def _start_idle_watcher(self):
+        if self.idle_s <= 0 or self._idle_watcher is not None:
+            return
+        self._idle_watcher = threading.Thread(target=self._watch_idle, name="idle-unloader", daemon=True)
+        self._idle_watcher.start()
+
+    def _watch_idle(self):
+        interval = min(60.0, max(1.0, self.idle_s / 4))
+        while not self._idle_stop.wait(interval):
+            if self.ready.is_set() and self.idle_for() >= self.idle_s:
+                self.unload()
+
+    def idle_for(self) -> float:
+        """Seconds since the last inference finished (0 while work is in flight)."""
+        with self._use_lock:
+            return 0.0 if self._inflight else time.monotonic() - self._last_used
+
+    def unload(self) -> bool:
+        """
+        Release the interpreter pool if nothing is in flight; the next
+        load() (or request through predict/predict_arrays) reloads it.
+        """
+        with self._load_lock:
+            with self._use_lock:
+                if not self.ready.is_set() or self._inflight:
+                    return False
+                # Cleared under the use lock: new callers now see "not ready" and reload
+                self.ready.clear()
+            idle = time.monotonic() - self._last_used
+            self._stop_workers()
+            self.pool = None
+            self._idle_counters["unloads"] += 1
+        logger.info(f"Model unloaded after {idle / 60:.1f} min idle; will reload from local files on next request")
+        return True
+
+    def start_background_load(self) -> threading.Thread:
+        """
+        Load in a daemon thread so startup never blocks on the download.
+        While a background load is running, callers get that thread back
+        instead of starting another one.
+        """
+        with self._use_lock:
+            if self._loader is not None and self._loader.is_alive():
+                return self._loader
+
+        def _run():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Background model load failed: {e}")
+
+        with self._use_lock:
+            if self._loader is not None and self._loader.is_alive():
+                return self._loader
+            self._loader = threading.Thread(target=_run, name="model-loader", daemon=True)
+            self._loader.start()
+            return self._loader
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    # ---------------------------------------------------------------- inference
+
+    def predict_arrays(self, x: np.ndarray) -> np.ndarray:
+        """Run an (N, H, W, C) batch in one invoke; returns (N, 2) probabilities."""
+        while True:
+            self.load()
+            with self._use_lock:
+                if self.ready.is_set():  # not unloaded between load() and here
+                    self._inflight += 1
+                    pool, meter = self.pool, self._meter
+                    break
+        with pool.acquire() as backend:
+            started = meter.start()
+            try:
+                return to_probs(backend.run_batch(x))
+            finally:
+                meter.finish(started)
+                self._release(1)
+
+    def _release(self, n: int):
+        with self._use_lock:
+            self._inflight -= n
+            self._last_used = time.monotonic()
+
+    def submit(self, x: np.ndarray, cache_key: Optional[str] = None) -> Future:
+        """
+        Queue a single preprocessed image for micro-batched inference.
+
+        Returns a Future resolving to its [p_normal, p_tumor] vector; the
+        result is stored in the cache under `cache_key`. Callers check
+        `self.cache` first so a hit can skip decoding and preprocessing.
+
+        Blocks while INFER_QUEUE_SIZE images are already waiting, which is
+        the back-pressure on the decode stage: call it from a worker thread,
+        not from an event loop.
+        """
+        future = Future()
+        if x.ndim == 4:
+            x = x[0]
+        with self._use_lock:
+            if not self.ready.is_set():
+                raise RuntimeError("Model is not loaded")
+            # Counted before queueing so an idle unload can't slip in between
+            self._inflight += 1
+        self._queue.put((x, cache_key, future))
+        return future
+
+    def predict(self, x: np.ndarray, cache_key: Optional[str] = None) -> np.ndarray:
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        self.load()
+        return self.submit(x, cache_key).result()
+
+    def label_for(self, p_tumor: float) -> str:
+        return label_for(p_tumor, self.labels, self.threshold)
+
+    def _start_dispatcher(self):
+        self._meter = UtilizationMeter(len(self.pool))
+        self._executor = ThreadPoolExecutor(max_workers=len(self.pool), thread_name_prefix="infer")
+        self._dispatcher = threading.Thread(target=self._dispatch, name="batch-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _dispatch(self):
+        """
+        Form batches from queued requests. A batch is only cut once a
+        backend is free, so under load requests pile up and batch sizes
+        grow on their own; when idle a lone request waits at most
+        batch_wait before running.
+        """
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+            backend = self.pool.checkout()
+            items = [first]
+            deadline = time.perf_counter() + self.batch_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True  # shut down after this batch
+                    break
+                items.append(item)
+            self._executor.submit(self._run_items, backend, items)
+
+    def _run_items(self, backend, items):
+        started = self._meter.start()
+        try:
+            probs = to_probs(backend.run_batch(np.stack([x for x, _, _ in items])))
+        except Exception as e:
+            for _, _, future in items:
+                future.set_exception(e)
+            return
+        finally:
+            self._meter.finish(started)
+            self.pool.checkin(backend)
+            self._release(len(items))
+        self._batches += 1
+        self._batched_items += len(items)
+        for (_, key, future), p in zip(items, probs):
+            self.cache.put(key, p)
+            future.set_result(p)
+
+    def close(self):
+        """Stop the dispatcher, worker and idle-watcher threads."""
+        self._idle_stop.set()
+        self._stop_workers()
+
+    def _stop_workers(self):
+        if self._dispatcher is not None:
+            self._queue.put(None)
+            self._dispatcher.join(timeout=5)
+            self._dispatcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # -------------------------------------------------------------------- meta
+
+    def meta(self) -> Dict:
+        backend = self.backend
+        return {
+            "model_loaded": self.ready.is_set(),
+            "error": str(self.error) if self.error else None,
+            "labels": self.labels,
+            "threshold": self.threshold,
+            "model_sha": self.model_sha or "unknown",
+            "model_load_time": round(self.load_time, 3),
+            "input_shape": backend.input_shape if backend else None,
+            "output_shape": backend.output_shape if backend else None,
+            "backend": backend.describe() if backend else None,
+            "thread_config": self.thread_config,
+            **self.live_stats(),
+        }
+
+    def live_stats(self) -> Dict:
+        """Counters that change per request (cheap; no backend introspection)."""
+        return {
+            "batching": {
+                "max_batch": self.max_batch,
+                "wait_ms": self.batch_wait * 1000,
+                "batches": self._batches,
+                "avg_batch_size": round(self._batched_items / self._batches, 2) if self._batches else None,
+            },
+            "cache": self.cache.stats(),
+            "inference_stage": {
+                **(self._meter.stats() if self._meter else {}),
+                # Images waiting for an interpreter (the dispatcher holds at most one more batch)
+                "queued": self._queue.qsize(),
+                "queue_max": self._queue.maxsize,
+            },
+            "idle_unload": {
+                "enabled": self.idle_s > 0,
+                "idle_after_s": self.idle_s,
+                "unloaded": self.unloaded,
+                "idle_for_s": round(self.idle_for(), 1),
+                **self._idle_counters,
+            },
+        }
@@ -0,0 +1,162 @@
+"""
+Multi-model ensemble: several models score the same image side by side.
+
+Every member is an ordinary InferenceEngine with its own request queue,
+micro-batching and interpreter pool, so submitting an image to all of them
+runs the members concurrently and the ensemble answers in about the time of
+its slowest member instead of the sum. Members whose models take the same
+input size share one preprocessed tensor. Member probabilities are combined
+by a weighted mean, or by the maximum p_tumor for the most sensitive
+reading; per-member results are returned alongside.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .engine import RESULT_CACHE_SIZE, InferenceEngine, ResultCache
+from .processing import preprocess
+
+AGGREGATES = ("mean", "max")
+
+
+class Ensemble:
+    """Named member engines, their weights and how their probabilities are combined."""
+
+    def __init__(self, members: Dict[str, InferenceEngine], weights: Optional[Sequence[float]] = None,
+                 aggregate: str = "mean", cache_size: int = RESULT_CACHE_SIZE):
+        if not members:
+            raise ValueError("An ensemble needs at least one member")
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Unknown ensemble aggregate {aggregate!r}, expected one of {AGGREGATES}")
+        weights = list(weights) if weights else [1.0] * len(members)
+        if len(weights) != len(members):
+            raise ValueError(f"{len(weights)} ensemble weight(s) for {len(members)} member(s)")
+        self.members = dict(members)
+        self.weights = np.asarray(weights, dtype=np.float32) / float(sum(weights))
+        self.aggregate = aggregate
+        self.cache = ResultCache(cache_size)  # (combined, per-member) per content hash
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._member_latency_ms = {name: 0.0 for name in self.members}
+
+    @property
+    def ready(self) -> bool:
+        """True when every member is loaded (none pending or released after an idle period)."""
+        return all(member.ready.is_set() for member in self.members.values())
+
+    def load(self):
+        """Load (or reload after an idle unload) the members that need it, concurrently; blocking."""
+        pending = [member for member in self.members.values() if not member.ready.is_set()]
+        if len(pending) <= 1:
+            for member in pending:
+                member.load()
+            return
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="ensemble-load") as pool:
+            for future in [pool.submit(member.load) for member in pending]:
+                future.result()
+
+    def preprocess(self, img: Image.Image) -> Dict[Tuple[int, int], np.ndarray]:
+        """One tensor per distinct member input size (after the first load)."""
+        return {size: preprocess(img, size) for size in {m.input_size for m in self.members.values()}}
+
+    def combine(self, member_probs: np.ndarray) -> np.ndarray:
+        """Aggregate an (M, 2) stack of member probabilities into one [p_normal, p_tumor]."""
+        if self.aggregate == "max":
+            p_tumor = float(member_probs[:, 1].max())
+            return np.array([1.0 - p_tumor, p_tumor], dtype=np.float32)
+        return (self.weights[:, None] * member_probs).sum(axis=0)
+
+    def submit(self, inputs: Dict[Tuple[int, int], np.ndarray], cache_key: Optional[str] = None) -> Future:
+        """
+        Queue one image with every member; returns a Future resolving to
+        (probs, {member: {"probs", "latency_ms"}}) once the slowest member
+        is done; latency_ms runs from submission, so it includes the wait in
+        the member's queue. The result is cached under `cache_key`. Blocks
+        like InferenceEngine.submit while a member's queue is full.
+
+        Every member is loaded and checked before any is queued, so a member
+        that cannot score fails the call without leaving the others working
+        for nobody.
+        """
+        self.load()  # returns at once unless a member was idle-unloaded since the caller's check
+        unready = [name for name, member in self.members.items() if not member.ready.is_set()]
+        if unready:
+            raise RuntimeError(f"Ensemble member(s) not loaded: {', '.join(unready)}")
+        result = Future()
+        names = list(self.members)
+        outputs: Dict[str, Dict] = {}
+        remaining = [len(names)]
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def done(name: str, future: Future):
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            try:
+                probs = future.result()
+            except Exception as e:
+                # Several members can fail at once; only the first may resolve the result
+                with lock:
+                    failed = remaining[0] > 0
+                    remaining[0] = 0
+                if failed:
+                    result.set_exception(e)
+                return
+            with lock:
+                if remaining[0] == 0:
+                    return  # another member already failed
+                outputs[name] = {"probs": probs, "latency_ms": round(elapsed_ms, 2)}
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                combined = self.combine(np.stack([outputs[n]["probs"] for n in names]))
+                per_member = {n: outputs[n] for n in names}
+                self.cache.put(cache_key, (combined, per_member))
+                self._record(per_member)
+                result.set_result((combined, per_member))
+
+        for name in names:
+            member = self.members[name]
+            try:
+                queued = member.submit(inputs[member.input_size])
+            except Exception:
+                with lock:
+                    remaining[0] = 0  # members queued so far finish without resolving anything
+                raise
+            queued.add_done_callback(lambda f, name=name: done(name, f))
+        return result
+
+    def _record(self, per_member: Dict[str, Dict]):
+        with self._lock:
+            self._requests += 1
+            for name, output in per_member.items():
+                self._member_latency_ms[name] += output["latency_ms"]
+
+    def describe(self) -> List[Dict]:
+        return [
+            {
+                "model": name,
+                "weight": round(float(weight), 4),
+                "model_sha": member.model_sha or "unknown",
+                "backend": member.backend.name if member.backend else None,
+                "input_size": list(member.input_size),
+                "threads": member.thread_config.get("threads_per_interpreter"),
+                "pool_size": member.thread_config.get("pool_size"),
+            }
+            for (name, member), weight in zip(self.members.items(), self.weights)
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            requests, member_ms = self._requests, dict(self._member_latency_ms)
+        return {
+            "aggregate": self.aggregate,
+            "members": len(self.members),
+            "shared_inputs": len({m.input_size for m in self.members.values()}),
+            "requests": requests,
+            "avg_member_latency_ms": {n: round(ms / requests, 2) for n, ms in member_ms.items()} if requests else None,
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1,64 @@
+"""
+Model artifact download and local caching.
+
+Artifacts are fetched from the Hugging Face Hub once into a local
+directory; later starts (and reloads) reuse the local copy.
+"""
+import json
+import logging
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+from .backends import backend_for_path
+
+logger = logging.getLogger(__name__)
+
+ASSETS_FILENAME = "assets.json"
+
+
+def _hub_file(repo_id: str, filename: str, local_dir: str, token: Optional[str]) -> str:
+    local = os.path.join(local_dir, filename)
+    if os.path.exists(local):
+        return local
+    from huggingface_hub import hf_hub_download  # deferred: only needed on first download
+
+    os.makedirs(local_dir, exist_ok=True)
+    return hf_hub_download(repo_id=repo_id, filename=filename, local_dir=local_dir, token=token)
+
+
+def fetch_from_hub(
+    repo_id: str,
+    filename: str,
+    local_dir: str,
+    token: Optional[str] = None,
+    extra_files: Sequence[str] = (),
+    assets_filename: str = ASSETS_FILENAME,
+) -> Tuple[Dict[str, str], Dict]:
+    """
+    Download the model (plus optional alternative exports) and assets.json.
+
+    Returns (candidates, assets) where candidates maps backend name to a
+    local model path and assets is the parsed assets.json ({} if missing).
+    """
+    token = token or None
+    model_path = _hub_file(repo_id, filename, local_dir, token)
+    candidates = {backend_for_path(model_path) or "tflite": model_path}
+
+    for extra in extra_files:
+        if not extra:
+            continue
+        try:
+            path = _hub_file(repo_id, extra, local_dir, token)
+            candidates.setdefault(backend_for_path(path) or "tflite", path)
+        except Exception as e:
+            logger.warning(f"Could not download {extra}: {e}")
+
+    assets = {}
+    if assets_filename:
+        try:
+            with open(_hub_file(repo_id, assets_filename, local_dir, token)) as f:
+                assets = json.load(f)
+            logger.info(f"Loaded model config: {assets}")
+        except Exception as e:
+            logger.warning(f"Could not load {assets_filename}: {e}, using defaults")
+    return candidates, assets
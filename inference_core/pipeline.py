@@ -0,0 +1,98 @@
+"""
+Stage executors and utilization metering for the decode -> inference pipeline.
+
+Decoding/preprocessing (Pillow, CPU-bound) and inference (the interpreter
+pool) run in separate, independently sized thread pools joined by the
+engine's bounded request queue: a decode worker hands its tensor to the
+engine and immediately starts on the next image, so the interpreters never
+wait for a decode when there is work queued, and a full inference queue
+stalls the decoders instead of piling up preprocessed tensors.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+WINDOW_S = 60  # utilization is reported over this many trailing seconds
+
+
+class UtilizationMeter:
+    """Busy time of a fixed number of workers, in one-second buckets over a trailing window."""
+
+    def __init__(self, workers: int, window_s: int = WINDOW_S):
+        self.workers = max(1, workers)
+        self.window_s = window_s
+        self.started = time.monotonic()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self._buckets = [0.0] * window_s
+        self._bucket_times = [0] * window_s
+        self._lock = threading.Lock()
+
+    def enqueue(self):
+        with self._lock:
+            self.queued += 1
+
+    def start(self) -> float:
+        with self._lock:
+            self.queued = max(0, self.queued - 1)
+            self.active += 1
+        return time.monotonic()
+
+    def finish(self, started: float):
+        now = time.monotonic()
+        second = int(now)
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            i = second % self.window_s
+            if self._bucket_times[i] != second:
+                self._bucket_times[i] = second
+                self._buckets[i] = 0.0
+            self._buckets[i] += now - started
+
+    def utilization(self) -> float:
+        """Share of worker time spent busy over the trailing window (0..1)."""
+        now = time.monotonic()
+        oldest = int(now) - self.window_s + 1
+        with self._lock:
+            busy = sum(b for b, t in zip(self._buckets, self._bucket_times) if t >= oldest)
+        span = min(self.window_s, max(now - self.started, 1e-6))
+        return min(1.0, busy / (span * self.workers))
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "active": self.active,
+            "completed": self.completed,
+            "utilization": round(self.utilization(), 3),
+        }
+
+
+class StageExecutor:
+    """A named thread pool whose queue depth and utilization are metered."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.meter = UtilizationMeter(workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.meter.workers, thread_name_prefix=name)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        self.meter.enqueue()
+
+        def run():
+            started = self.meter.start()
+            try:
+                return fn(*args)
+            finally:
+                self.meter.finish(started)
+
+        return self._executor.submit(run)
+
+    def stats(self) -> Dict:
+        return self.meter.stats()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
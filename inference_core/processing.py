@@ -0,0 +1,62 @@
+"""
+Pre- and post-processing shared by every front end.
+
+Keeping these in one place guarantees the FastAPI service, the Railway
+app and the Gradio Space feed the model identical tensors and read its
+output the same way regardless of whether it ends in softmax or sigmoid.
+"""
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_LABELS = ["No Tumor", "Tumor"]
+DEFAULT_THRESHOLD = 0.5
+INPUT_SIZE = (224, 224)
+
+
+def preprocess(img: Image.Image, size=INPUT_SIZE) -> np.ndarray:
+    """Preprocess image for ResNet50 model: RGB, resize, scale to [0, 1]."""
+    img = img.convert("RGB").resize(size)
+    x = np.asarray(img, dtype=np.float32)
+    x /= 255.0
+    return np.expand_dims(x, axis=0)
+
+
+# Bytes per pixel of Pillow's in-memory storage (RGB is padded to 4 bytes)
+_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "LA": 4, "PA": 4, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+
+def preprocess_bytes(img: Image.Image, size=INPUT_SIZE) -> int:
+    """
+    Estimated peak memory preprocess() needs for `img`, from its header only:
+    the decoded image, the RGB copy when a conversion is needed, the resized
+    image and the float32 tensor.
+    """
+    pixels = img.size[0] * img.size[1]
+    decoded = pixels * _PIXEL_BYTES.get(img.mode, 4)
+    converted = 0 if img.mode == "RGB" else pixels * 4
+    resized = size[0] * size[1] * (4 + 3 + 3 * 4)  # RGB image, uint8 view, float32 tensor
+    return decoded + converted + resized
+
+
+def to_probs(y: np.ndarray) -> np.ndarray:
+    """
+    Normalize raw model output to an (N, 2) array of [p_normal, p_tumor].
+
+    Accepts softmax heads (N, 2) and sigmoid heads (N, 1) / (N,).
+    """
+    y = np.asarray(y, dtype=np.float32)
+    if y.ndim == 1:
+        y = y.reshape(-1, 1) if y.shape[0] != 2 else y.reshape(1, 2)
+    y = y.reshape(y.shape[0], -1)
+    if y.shape[1] == 2:
+        return y
+    if y.shape[1] == 1:
+        return np.concatenate([1.0 - y, y], axis=1)
+    raise ValueError(f"Unexpected model output shape: {y.shape}")
+
+
+def label_for(p_tumor: float, labels: List[str] = DEFAULT_LABELS,
+              threshold: float = DEFAULT_THRESHOLD) -> str:
+    return labels[1] if p_tumor >= threshold else labels[0]
@@ -0,0 +1,179 @@
+"""
+CPU-quota-aware thread tuning for inference backends.
+
+Cloud Run (and most container runtimes) expose the vCPU allocation via a
+cgroup CPU quota rather than the host CPU count, so os.cpu_count() can be
+far too high. We read the effective quota, derive a split between intra-op
+threads per interpreter and the number of concurrent interpreters, and
+optionally confirm the choice with a short calibration run.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_DIRS = ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct")
+
+# Intra-op scaling of a batch-1 CNN flattens out past a few threads;
+# beyond that it is cheaper to run more interpreters side by side.
+MAX_THREADS_PER_INTERPRETER = 4
+MAX_POOL_SIZE = int(os.environ.get("INFER_POOL_MAX", 4))
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Tuple[Optional[float], str]:
+    """Return (cpus, source) from the cgroup CPU quota, or (None, reason)."""
+    raw = _read(CGROUP_V2_CPU_MAX)
+    if raw:
+        quota, _, period = raw.partition(" ")
+        if quota == "max":
+            return None, "cgroup v2 (unlimited)"
+        try:
+            return int(quota) / int(period or 100000), "cgroup v2"
+        except ValueError:
+            pass
+
+    for base in CGROUP_V1_DIRS:
+        quota = _read(os.path.join(base, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(base, "cpu.cfs_period_us"))
+        if quota and period:
+            try:
+                if int(quota) <= 0:
+                    return None, "cgroup v1 (unlimited)"
+                return int(quota) / int(period), "cgroup v1"
+            except ValueError:
+                continue
+    return None, "no cgroup quota"
+
+
+def effective_cpu_count() -> Tuple[int, str]:
+    """Usable CPUs: min(cgroup quota, scheduler affinity), at least 1."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+        source = "affinity"
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+        source = "os.cpu_count"
+
+    quota, quota_source = cgroup_cpu_quota()
+    if quota is not None and quota < cpus:
+        # Round down so we never plan more threads than the quota pays for
+        return max(1, int(math.floor(quota))), quota_source
+    return max(1, cpus), source
+
+
+def candidate_configs(cpus: int) -> List[Tuple[int, int]]:
+    """All (threads_per_interpreter, pool_size) splits that fit in `cpus`."""
+    configs = []
+    for threads in range(1, min(cpus, MAX_THREADS_PER_INTERPRETER) + 1):
+        pool = max(1, min(cpus // threads, MAX_POOL_SIZE))
+        if (threads, pool) not in configs:
+            configs.append((threads, pool))
+    return configs
+
+
+def heuristic_config(cpus: int) -> Tuple[int, int]:
+    """Default split: fill one interpreter first, then add interpreters."""
+    threads = min(cpus, MAX_THREADS_PER_INTERPRETER)
+    pool = max(1, min(cpus // threads, MAX_POOL_SIZE))
+    return threads, pool
+
+
+def _pool_throughput(make_backend: Callable[[int], object], threads: int, pool: int,
+                     runs: int, sample) -> float:
+    """Images/s of `pool` interpreters with `threads` each running concurrently."""
+    backends = [make_backend(threads) for _ in range(pool)]
+    for b in backends:
+        b.run_batch(sample)  # warm-up
+
+    def worker(b):
+        for _ in range(runs):
+            b.run_batch(sample)
+
+    workers = [threading.Thread(target=worker, args=(b,)) for b in backends]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return pool * runs * sample.shape[0] / elapsed if elapsed > 0 else 0.0
+
+
+def calibrate(make_backend: Callable[[int], object], cpus: int, sample, runs: int = 5) -> List[Dict]:
+    """Measure every candidate split; returns results sorted fastest first."""
+    results = []
+    for threads, pool in candidate_configs(cpus):
+        try:
+            ips = _pool_throughput(make_backend, threads, pool, runs, sample)
+        except Exception as e:
+            logger.warning(f"Calibration of threads={threads} pool={pool} failed: {e}")
+            continue
+        results.append({"threads": threads, "pool_size": pool, "throughput_ips": round(ips, 2)})
+        logger.info(f"Calibration threads={threads} pool={pool}: {ips:.1f} img/s")
+    return sorted(results, key=lambda r: r["throughput_ips"], reverse=True)
+
+
+def plan_threads(
+    make_backend: Optional[Callable[[int], object]] = None,
+    sample=None,
+    calibration_runs: int = 0,
+    cpu_share: float = 1.0,
+) -> Dict:
+    """
+    Decide threads-per-interpreter and interpreter pool size.
+
+    INFER_THREADS / INFER_POOL_SIZE override the plan, INFER_CPUS overrides
+    the detected CPU budget. Without overrides the heuristic split is used,
+    and confirmed by calibration when `calibration_runs` > 0. Models that
+    run side by side (ensemble members) each plan for their `cpu_share` of
+    the budget.
+    """
+    cpus, cpu_source = effective_cpu_count()
+    if os.environ.get("INFER_CPUS"):
+        cpus, cpu_source = max(1, int(os.environ["INFER_CPUS"])), "INFER_CPUS"
+    if cpu_share < 1.0:
+        cpus, cpu_source = max(1, int(cpus * cpu_share)), f"{cpu_source} x {cpu_share:.2g}"
+
+    threads, pool = heuristic_config(cpus)
+    config = {
+        "cpus": cpus,
+        "cpu_source": cpu_source,
+        "threads_per_interpreter": threads,
+        "pool_size": pool,
+        "source": "heuristic",
+        "calibration": [],
+    }
+
+    env_threads = os.environ.get("INFER_THREADS")
+    env_pool = os.environ.get("INFER_POOL_SIZE")
+    if env_threads or env_pool:
+        if env_threads:
+            config["threads_per_interpreter"] = max(1, int(env_threads))
+        if env_pool:
+            config["pool_size"] = max(1, int(env_pool))
+        elif env_threads:
+            config["pool_size"] = max(1, min(cpus // config["threads_per_interpreter"], MAX_POOL_SIZE))
+        config["source"] = "override"
+        return config
+
+    if make_backend is not None and sample is not None and calibration_runs > 0 and cpus > 1:
+        results = calibrate(make_backend, cpus, sample, runs=calibration_runs)
+        if results:
+            config["threads_per_interpreter"] = results[0]["threads"]
+            config["pool_size"] = results[0]["pool_size"]
+            config["source"] = "calibrated"
+            config["calibration"] = results
+    return config
@@ -0,0 +1,275 @@
+"""
+Volumetric input: NIfTI volumes and DICOM series scored slice by slice.
+
+Volumes are never loaded whole. NIfTI files are memory-mapped through
+nibabel and DICOM series are indexed from their headers first, then pixel
+data is read one chunk of slices at a time. Each chunk is windowed and
+normalized in one vectorized step, resized to the model input and scored
+as a single batch, so peak memory depends on the batch size, not on the
+number of slices.
+
+nibabel and pydicom are optional; volume_formats() reports what is usable.
+"""
+import importlib.util
+import logging
+import os
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .processing import DEFAULT_LABELS, DEFAULT_THRESHOLD, INPUT_SIZE, label_for
+
+logger = logging.getLogger(__name__)
+
+VOLUME_BATCH = int(os.environ.get("VOLUME_BATCH", 16))  # slices per inference batch
+VOLUME_TOP_K = int(os.environ.get("VOLUME_TOP_K", 3))   # slices averaged for the volume score
+WINDOW_SAMPLE_SLICES = 16  # slices sampled to estimate an automatic window
+
+NIFTI_SUFFIXES = (".nii", ".nii.gz")
+DICOM_SUFFIXES = (".dcm", ".dicom", ".ima")
+
+
+def volume_formats() -> List[str]:
+    """Volume formats whose reader library is installed."""
+    formats = []
+    if importlib.util.find_spec("nibabel") is not None:
+        formats.append("nifti")
+    if importlib.util.find_spec("pydicom") is not None:
+        formats.append("dicom")
+    return formats
+
+
+def format_for(filenames: List[str]) -> Optional[str]:
+    """'nifti' or 'dicom' from upload filenames (a .zip is taken as a DICOM series)."""
+    names = [n.lower() for n in filenames]
+    if len(names) == 1 and names[0].endswith(NIFTI_SUFFIXES):
+        return "nifti"
+    if all(n.endswith(DICOM_SUFFIXES + (".zip",)) for n in names):
+        return "dicom"
+    return None
+
+
+class Volume:
+    """A stack of 2-D slices read lazily in chunks."""
+
+    format = "volume"
+
+    def __init__(self):
+        self.shape: Tuple[int, ...] = ()
+        self.num_slices = 0
+        self.axis = 2  # slicing axis within shape
+        self.window: Optional[Tuple[float, float]] = None  # (center, width) from metadata
+
+    @property
+    def slice_shape(self) -> Tuple[int, int]:
+        """(H, W) of one slice as returned by read()."""
+        height, width = (d for axis, d in enumerate(self.shape[:3]) if axis != self.axis)
+        return height, width
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Slices [start, stop) as a float32 (k, H, W) array in stored intensity units."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NiftiVolume(Volume):
+    """NIfTI-1/2 volume; uncompressed files are memory-mapped, .nii.gz is read by slice range."""
+
+    format = "nifti"
+
+    def __init__(self, path: str, axis: int = 2):
+        super().__init__()
+        import nibabel as nib
+
+        self.img = nib.load(path, mmap=True)
+        self.shape = tuple(int(d) for d in self.img.shape)
+        if len(self.shape) < 3:
+            raise ValueError(f"Expected a 3-D volume, got shape {self.shape}")
+        self.axis = axis
+        self.num_slices = self.shape[axis]
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        index = [slice(None)] * 3 + [0] * (len(self.shape) - 3)  # first frame of 4-D series
+        index[self.axis] = slice(start, stop)
+        # ArrayProxy slicing reads (and scales) only the requested slab
+        chunk = np.asarray(self.img.dataobj[tuple(index)], dtype=np.float32)
+        return np.moveaxis(chunk, self.axis, 0)
+
+
+def _first_value(value) -> float:
+    """DICOM window tags may list several presets; the first is the default."""
+    try:
+        return float(value)
+    except TypeError:
+        return float(value[0])
+
+
+class DicomSeries(Volume):
+    """
+    One DICOM file per slice, from individual files or a zip archive.
+    Headers are read up front to order the slices; pixels only per chunk.
+    """
+
+    format = "dicom"
+
+    def __init__(self, paths: List[str]):
+        super().__init__()
+        import pydicom
+
+        self._dcmread = pydicom.dcmread
+        self._zips: List[zipfile.ZipFile] = []
+        sources = []
+        for path in paths:
+            if zipfile.is_zipfile(path):
+                archive = zipfile.ZipFile(path)
+                self._zips.append(archive)
+                sources.extend(
+                    (archive, info.filename) for info in archive.infolist()
+                    if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+                )
+            else:
+                sources.append((None, path))
+
+        entries = []
+        for source in sources:
+            try:
+                with self._open(source) as f:
+                    header = self._dcmread(f, stop_before_pixels=True)
+            except Exception as e:
+                logger.debug(f"Skipping non-DICOM member {source[1]}: {e}")
+                continue
+            if "Rows" not in header:
+                continue
+            position = header.get("ImagePositionPatient")
+            order = float(position[2]) if position else float(header.get("InstanceNumber", 0) or 0)
+            entries.append((order, source, header))
+        if not entries:
+            raise ValueError("No DICOM slices found")
+        entries.sort(key=lambda e: e[0])
+
+        self._sources = [source for _, source, _ in entries]
+        first = entries[0][2]
+        self.num_slices = len(entries)
+        self.shape = (int(first.Rows), int(first.Columns), self.num_slices)
+        center, width = first.get("WindowCenter"), first.get("WindowWidth")
+        if center is not None and width is not None:
+            self.window = (_first_value(center), _first_value(width))
+
+    @staticmethod
+    def _open(source):
+        archive, name = source
+        return archive.open(name) if archive is not None else open(name, "rb")
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        out = np.empty((stop - start, self.shape[0], self.shape[1]), dtype=np.float32)
+        for i, source in enumerate(self._sources[start:stop]):
+            with self._open(source) as f:
+                ds = self._dcmread(f)
+            pixels = ds.pixel_array
+            if pixels.shape != out.shape[1:]:
+                raise ValueError(f"Slice {start + i} has shape {pixels.shape}, expected {out.shape[1:]}")
+            slope = float(ds.get("RescaleSlope", 1) or 1)
+            intercept = float(ds.get("RescaleIntercept", 0) or 0)
+            np.multiply(pixels, slope, out=out[i], casting="unsafe")
+            out[i] += intercept
+        return out
+
+    def close(self):
+        for archive in self._zips:
+            archive.close()
+
+
+def open_volume(paths: List[str], filenames: Optional[List[str]] = None, axis: int = 2) -> Volume:
+    """Open uploaded files as a volume; `filenames` are the client names used to detect the format."""
+    fmt = format_for(filenames or paths)
+    if fmt is None:
+        raise ValueError("Upload one .nii/.nii.gz file, DICOM (.dcm) slices, or a .zip of a DICOM series")
+    if fmt not in volume_formats():
+        raise RuntimeError(f"{fmt} support is not installed on this server")
+    return NiftiVolume(paths[0], axis=axis) if fmt == "nifti" else DicomSeries(paths)
+
+
+def estimate_window(volume: Volume, sample_slices: int = WINDOW_SAMPLE_SLICES) -> Tuple[float, float]:
+    """(center, width) from the 0.5-99.5 percentile range of a few evenly spaced slices."""
+    if volume.window is not None:
+        return volume.window
+    picks = np.unique(np.linspace(0, volume.num_slices - 1, min(sample_slices, volume.num_slices)).astype(int))
+    sample = np.concatenate([volume.read(i, i + 1)[0, ::4, ::4].ravel() for i in picks])
+    low, high = np.percentile(sample, [0.5, 99.5])
+    width = max(float(high - low), 1e-6)
+    return float(low) + width / 2, width
+
+
+def window_normalize(slices: np.ndarray, center: float, width: float) -> np.ndarray:
+    """Map [center - width/2, center + width/2] to [0, 1] in place, clipping outside."""
+    slices -= center - width / 2
+    slices *= 1.0 / width
+    return np.clip(slices, 0.0, 1.0, out=slices)
+
+
+def to_model_input(slices: np.ndarray, size=INPUT_SIZE) -> np.ndarray:
+    """(k, H, W) in [0, 1] -> (k, h, w, 3) float32, grey replicated to RGB like preprocess()."""
+    out = np.empty((slices.shape[0], size[1], size[0], 3), dtype=np.float32)
+    for i, s in enumerate(slices):
+        out[i, ..., 0] = np.asarray(Image.fromarray(s, mode="F").resize(size, Image.BILINEAR))
+    out[..., 1] = out[..., 0]
+    out[..., 2] = out[..., 0]
+    return out
+
+
+def slice_batch_bytes(volume: Volume, count: int, size=INPUT_SIZE) -> int:
+    """
+    Estimated peak memory for scoring `count` slices, from the volume header:
+    the float32 slab read from disk, one resized slice and the model input.
+    """
+    height, width = volume.slice_shape
+    return count * height * width * 4 + size[0] * size[1] * (4 + count * 3 * 4)
+
+
+def read_slice_batch(volume: Volume, window: Tuple[float, float], start: int, stop: int,
+                     size=INPUT_SIZE) -> np.ndarray:
+    """Slices [start, stop) windowed, normalized and resized into a model-ready batch."""
+    center, width = window
+    return to_model_input(window_normalize(volume.read(start, stop), center, width), size)
+
+
+def aggregate(p_tumor: np.ndarray, threshold: float = DEFAULT_THRESHOLD, top_k: int = VOLUME_TOP_K) -> Dict:
+    """Volume-level summary of slice probabilities; the score is the mean of the top-k slices."""
+    if p_tumor.size == 0:
+        return {"p_tumor": 0.0, "max_p_tumor": 0.0, "mean_p_tumor": 0.0, "positive_slices": 0, "top_slices": []}
+    k = min(top_k, p_tumor.size)
+    top = np.argsort(p_tumor)[::-1][:k]
+    return {
+        "p_tumor": round(float(p_tumor[top].mean()), 4),
+        "max_p_tumor": round(float(p_tumor.max()), 4),
+        "mean_p_tumor": round(float(p_tumor.mean()), 4),
+        "positive_slices": int((p_tumor >= threshold).sum()),
+        "top_slices": [int(i) for i in top],
+    }
+
+
+def volume_result(
+    volume: Volume,
+    window: Tuple[float, float],
+    p_tumor: np.ndarray,
+    labels: List[str] = DEFAULT_LABELS,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Dict:
+    """Per-slice results and the volume aggregate for already scored slices."""
+    summary = aggregate(p_tumor, threshold)
+    summary["prediction"] = label_for(summary["p_tumor"], labels, threshold)
+    return {
+        "format": volume.format,
+        "shape": list(volume.shape),
+        "num_slices": volume.num_slices,
+        "window": {"center": round(window[0], 3), "width": round(window[1], 3)},
+        "slices": [
+            {"index": i, "p_tumor": round(float(p), 4), "prediction": label_for(float(p), labels, threshold)}
+            for i, p in enumerate(p_tumor)
+        ],
+        "aggregate": summary,
+    }
@@ -0,0 +1,149 @@
+"""
+tf.data input pipeline for train_model.py
+
+Replaces ImageDataGenerator.flow_from_directory with parallel file reads and
+decodes, a cache of the resized uint8 images, and augmentations applied to
+whole batches on the TF runtime instead of per image in Python. The
+augmentation ranges mirror the generator settings in create_data_generators().
+"""
+
+import math
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from dataset_cache import IMG_SIZE, ensure_cache, list_image_files, shard_dataset
+
+AUTOTUNE = tf.data.AUTOTUNE
+BATCH_SIZE = 32
+
+# Same ranges as the ImageDataGenerator in train_model.create_data_generators()
+AUGMENTATION = {
+    'rotation_range': 20,           # degrees
+    'width_shift_range': 0.2,       # fraction of width
+    'height_shift_range': 0.2,      # fraction of height
+    'shear_range': 0.2,             # degrees (Keras semantics)
+    'zoom_range': 0.2,              # [1 - z, 1 + z], independent per axis
+    'horizontal_flip': True,
+    'brightness_range': (0.8, 1.2),
+}
+
+
+def decode_and_resize(path, img_size=IMG_SIZE):
+    """Read one file and return an RGB uint8 image of img_size."""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    # flow_from_directory loads with nearest-neighbour resizing
+    image = tf.image.resize(image, img_size, method='nearest')
+    return tf.cast(image, tf.uint8)
+
+
+def _affine_matrices(batch_size, height, width, aug=AUGMENTATION):
+    """
+    Random output->input affine transforms for a batch, composed like
+    ImageDataGenerator: rotation @ shift @ shear @ zoom around the image centre.
+    """
+    def uniform(low, high):
+        return tf.random.uniform([batch_size], low, high)
+
+    zeros, ones = tf.zeros([batch_size]), tf.ones([batch_size])
+
+    def matrix(rows):
+        return tf.reshape(tf.stack([v for row in rows for v in row], axis=1), [batch_size, 3, 3])
+
+    theta = uniform(-aug['rotation_range'], aug['rotation_range']) * (math.pi / 180)
+    tx = uniform(-aug['width_shift_range'], aug['width_shift_range']) * width
+    ty = uniform(-aug['height_shift_range'], aug['height_shift_range']) * height
+    shear = uniform(-aug['shear_range'], aug['shear_range']) * (math.pi / 180)
+    zx = uniform(1 - aug['zoom_range'], 1 + aug['zoom_range'])
+    zy = uniform(1 - aug['zoom_range'], 1 + aug['zoom_range'])
+
+    rotation = matrix([[tf.cos(theta), -tf.sin(theta), zeros],
+                       [tf.sin(theta), tf.cos(theta), zeros],
+                       [zeros, zeros, ones]])
+    shift = matrix([[ones, zeros, tx], [zeros, ones, ty], [zeros, zeros, ones]])
+    shear_m = matrix([[ones, -tf.sin(shear), zeros],
+                      [zeros, tf.cos(shear), zeros],
+                      [zeros, zeros, ones]])
+    zoom = matrix([[zx, zeros, zeros], [zeros, zy, zeros], [zeros, zeros, ones]])
+
+    cx, cy = width / 2 - 0.5, height / 2 - 0.5
+    to_center = matrix([[ones, zeros, ones * cx], [zeros, ones, ones * cy], [zeros, zeros, ones]])
+    from_center = matrix([[ones, zeros, ones * -cx], [zeros, ones, ones * -cy], [zeros, zeros, ones]])
+
+    transform = to_center @ rotation @ shift @ shear_m @ zoom @ from_center
+    return tf.reshape(transform, [batch_size, 9])[:, :8]
+
+
+def augment_batch(images, labels, aug=AUGMENTATION):
+    """Random affine, flip and brightness for a whole uint8 batch, then rescale to [0, 1]."""
+    images = tf.cast(images, tf.float32)
+    shape = tf.shape(images)
+    batch_size, height, width = shape[0], shape[1], shape[2]
+
+    images = tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=_affine_matrices(batch_size, tf.cast(height, tf.float32), tf.cast(width, tf.float32), aug),
+        output_shape=tf.stack([height, width]),
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode='NEAREST',
+    )
+
+    if aug['horizontal_flip']:
+        flip = tf.random.uniform([batch_size, 1, 1, 1]) < 0.5
+        images = tf.where(flip, tf.reverse(images, axis=[2]), images)
+
+    low, high = aug['brightness_range']
+    brightness = tf.random.uniform([batch_size, 1, 1, 1], low, high)
+    images = tf.clip_by_value(images * brightness, 0.0, 255.0)
+
+    return images / 255.0, labels
+
+
+def rescale_batch(images, labels):
+    return tf.cast(images, tf.float32) / 255.0, labels
+
+
+def make_dataset(directory, training, batch_size=BATCH_SIZE, img_size=IMG_SIZE, cache_dir=None,
+                 shard_dir=None):
+    """
+    Build a batched dataset of (images in [0, 1], float labels).
+
+    Decoded images are cached as uint8 (in memory, or under cache_dir when
+    given) so only the first epoch pays for JPEG decoding. With shard_dir the
+    images come from the persistent shard cache (see dataset_cache.py) and no
+    run decodes at all. The returned dataset carries `.classes` /
+    `.class_indices` like a DirectoryIterator, in file order, so the existing
+    class-weight and evaluation code works.
+    """
+    if shard_dir:
+        split_cache, index = ensure_cache(directory, shard_dir, img_size)
+        class_names = index['class_names']
+        print(f"Found {index['num_samples']} cached images belonging to {len(class_names)} classes.")
+        # Shuffled by reading the memory maps in permuted order
+        ds, labels = shard_dataset(split_cache, index, shuffle=training)
+    else:
+        paths, labels, class_names = list_image_files(directory)
+        print(f"Found {len(paths)} images belonging to {len(class_names)} classes.")
+
+        ds = tf.data.Dataset.from_tensor_slices((paths, labels.astype(np.float32)))
+        ds = ds.map(lambda p, y: (decode_and_resize(p, img_size), y), num_parallel_calls=AUTOTUNE)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            split = os.path.basename(os.path.normpath(directory))
+            ds = ds.cache(os.path.join(cache_dir, f'{split}_{img_size[0]}x{img_size[1]}'))
+        else:
+            ds = ds.cache()
+
+    if training:
+        if not shard_dir:
+            ds = ds.shuffle(len(labels), seed=42, reshuffle_each_iteration=True)
+        ds = ds.batch(batch_size).map(augment_batch, num_parallel_calls=AUTOTUNE)
+    else:
+        ds = ds.batch(batch_size).map(rescale_batch, num_parallel_calls=AUTOTUNE)
+    ds = ds.prefetch(AUTOTUNE)
+
+    ds.classes = labels
+    ds.class_indices = {name: i for i, name in enumerate(class_names)}
+    return ds
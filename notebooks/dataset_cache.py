@@ -0,0 +1,187 @@
+"""
+Preprocessed dataset cache in sharded .npy files
+
+Decodes and resizes every image of a split once and stores the result as
+uint8 shards (N x H x W x 3) plus int32 label shards and an index.json. Later
+runs memory-map the shards, so training and evaluation stream pixels without
+any JPEG decoding. The index records a fingerprint of the source directory
+(relative paths, sizes, mtimes and the target size); when it no longer
+matches, the cache is rebuilt automatically.
+
+    python dataset_cache.py /path/to/chest_xray /path/to/cache
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMG_SIZE = (224, 224)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.tif', '.tiff')
+CACHE_VERSION = 1
+SHARD_SIZE = 1024  # images per shard (~150 MB at 224x224x3)
+INDEX_FILE = 'index.json'
+
+
+def list_image_files(directory):
+    """
+    List (paths, labels, class_names) the way flow_from_directory does:
+    one class per sorted subdirectory, files sorted within each class.
+    """
+    class_names = sorted(
+        d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))
+    )
+    paths, labels = [], []
+    for index, name in enumerate(class_names):
+        class_dir = os.path.join(directory, name)
+        for root, _, files in sorted(os.walk(class_dir)):
+            for fname in sorted(files):
+                if fname.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, fname))
+                    labels.append(index)
+    return paths, np.asarray(labels, dtype=np.int32), class_names
+
+
+def source_fingerprint(paths, directory, img_size=IMG_SIZE):
+    """Hash of every source file's relative path, size and mtime, plus the target size."""
+    digest = hashlib.sha256(f'v{CACHE_VERSION}:{img_size[0]}x{img_size[1]}'.encode())
+    for path in paths:
+        st = os.stat(path)
+        rel = os.path.relpath(path, directory)
+        digest.update(f'{rel}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def load_image(path, img_size=IMG_SIZE):
+    """RGB uint8 array resized like flow_from_directory (nearest neighbour)."""
+    with Image.open(path) as img:
+        img = img.convert('RGB')
+        # PIL takes (width, height)
+        img = img.resize((img_size[1], img_size[0]), Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_cache(directory, cache_dir, img_size=IMG_SIZE, shard_size=SHARD_SIZE, workers=None):
+    """Write the shards for one split directory; returns the index."""
+    paths, labels, class_names = list_image_files(directory)
+    fingerprint = source_fingerprint(paths, directory, img_size)
+    print(f"🗜️ Building shard cache for {directory} ({len(paths)} images) -> {cache_dir}")
+
+    # Build next to the final location and swap in only when complete
+    tmp_dir = cache_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    shards = []
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(paths), shard_size):
+            chunk = paths[start:start + shard_size]
+            images = np.stack(list(pool.map(lambda p: load_image(p, img_size), chunk)))
+            name = f'shard-{len(shards):05d}'
+            np.save(os.path.join(tmp_dir, f'{name}.images.npy'), images)
+            np.save(os.path.join(tmp_dir, f'{name}.labels.npy'), labels[start:start + shard_size])
+            shards.append({'images': f'{name}.images.npy', 'labels': f'{name}.labels.npy',
+                           'count': len(chunk)})
+            print(f"   {start + len(chunk)}/{len(paths)}")
+
+    index = {
+        'version': CACHE_VERSION,
+        'fingerprint': fingerprint,
+        'source': os.path.abspath(directory),
+        'img_size': list(img_size),
+        'num_samples': len(paths),
+        'class_names': class_names,
+        'files': [os.path.relpath(p, directory) for p in paths],
+        'shards': shards,
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=1)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return index
+
+
+def ensure_cache(directory, cache_root, img_size=IMG_SIZE, shard_size=SHARD_SIZE):
+    """Return (cache_dir, index) for a split, rebuilding when the source changed."""
+    split = os.path.basename(os.path.normpath(directory))
+    cache_dir = os.path.join(cache_root, split)
+    index = read_index(cache_dir)
+    if index is not None and index.get('version') == CACHE_VERSION:
+        paths, _, _ = list_image_files(directory)
+        if index['fingerprint'] == source_fingerprint(paths, directory, img_size):
+            return cache_dir, index
+        print(f"♻️ Source changed since the shard cache was built: {directory}")
+    return cache_dir, build_cache(directory, cache_dir, img_size, shard_size)
+
+
+def load_shards(cache_dir, index):
+    """Memory-mapped (images, labels) arrays per shard."""
+    return [
+        (np.load(os.path.join(cache_dir, s['images']), mmap_mode='r'),
+         np.load(os.path.join(cache_dir, s['labels']), mmap_mode='r'))
+        for s in index['shards']
+    ]
+
+
+def shard_dataset(cache_dir, index, shuffle=False, seed=42):
+    """
+    Unbatched tf.data.Dataset of (uint8 image, float label) streamed from the
+    shards, plus the labels in file order. With shuffle=True each epoch reads
+    a fresh permutation straight from the memory maps, so no shuffle buffer
+    has to hold decoded images.
+    """
+    import tensorflow as tf
+
+    height, width = index['img_size']
+    shards = load_shards(cache_dir, index)
+    images = [img for img, _ in shards]
+    labels = np.concatenate([lbl for _, lbl in shards]) if shards else np.zeros(0, dtype=np.int32)
+    # (shard, row) address of every sample
+    locations = [(s, i) for s, (_, lbl) in enumerate(shards) for i in range(len(lbl))]
+    rng = np.random.default_rng(seed)
+
+    def generate():
+        order = rng.permutation(len(locations)) if shuffle else range(len(locations))
+        for n in order:
+            s, i = locations[n]
+            yield images[s][i], np.float32(shards[s][1][i])
+
+    ds = tf.data.Dataset.from_generator(
+        generate,
+        output_signature=(
+            tf.TensorSpec(shape=(height, width, 3), dtype=tf.uint8),
+            tf.TensorSpec(shape=(), dtype=tf.float32),
+        ),
+    ).apply(tf.data.experimental.assert_cardinality(index['num_samples']))
+    return ds, labels
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    base_dir, cache_root = sys.argv[1], sys.argv[2]
+    for split in ('train', 'val', 'test'):
+        split_dir = os.path.join(base_dir, split)
+        if os.path.isdir(split_dir):
+            cache_dir, index = ensure_cache(split_dir, cache_root)
+            print(f"✅ {split}: {index['num_samples']} images in {len(index['shards'])} shards ({cache_dir})")
+
+
+if __name__ == "__main__":
+    main()
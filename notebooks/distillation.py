@@ -0,0 +1,252 @@
+"""
+Knowledge distillation of the ResNet50 teacher into low-latency students
+
+Each candidate student is trained on a mix of the hard labels and the
+teacher's temperature-softened predictions for the same augmented batch,
+then exported to TFLite and timed with the serving backend from
+inference_core. Candidates are compared at equal sensitivity: every model
+(teacher included) gets its own threshold for the target sensitivity on the
+validation split, and the fastest student whose validation specificity stays
+within tolerance of the teacher wins. The test split is only scored at those
+fixed thresholds, for the final report. The winner is written out as
+model.tflite + assets.json, the same pair the serving apps download.
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers, models
+
+from evaluation import DEFAULT_TARGET_SENSITIVITY, binary_metrics, threshold_for_sensitivity, write_threshold
+
+try:
+    import inference_core  # noqa: F401
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from inference_core import benchmark, create_backend
+
+IMG_SHAPE = (224, 224, 3)
+# Students are accepted if their validation specificity at the target sensitivity is within this of the teacher's
+SPECIFICITY_TOLERANCE = 0.02
+
+
+# --------------------------------------------------------------------- students
+
+def mobilenet_v3_small_student(alpha=1.0):
+    """MobileNetV3-Small backbone; inputs stay in [0, 1] like the serving preprocess."""
+    base = tf.keras.applications.MobileNetV3Small(
+        input_shape=IMG_SHAPE, alpha=alpha, include_top=False,
+        weights='imagenet', include_preprocessing=False, minimalistic=False
+    )
+    return models.Sequential([
+        layers.Input(IMG_SHAPE),
+        layers.Rescaling(2.0, offset=-1.0),  # [0, 1] -> [-1, 1] expected by the backbone
+        base,
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.2),
+        layers.Dense(1, activation='sigmoid')
+    ], name=f'mobilenet_v3_small_{alpha:g}')
+
+
+def compact_cnn_student(width=32):
+    """Small from-scratch CNN: four strided separable-conv stages."""
+    model = models.Sequential([layers.Input(IMG_SHAPE)], name=f'compact_cnn_{width}')
+    model.add(layers.Conv2D(width, 3, strides=2, padding='same', use_bias=False))
+    model.add(layers.BatchNormalization())
+    model.add(layers.ReLU())
+    for multiplier in (2, 4, 8, 8):
+        model.add(layers.SeparableConv2D(width * multiplier, 3, strides=2, padding='same', use_bias=False))
+        model.add(layers.BatchNormalization())
+        model.add(layers.ReLU())
+    model.add(layers.GlobalAveragePooling2D())
+    model.add(layers.Dropout(0.2))
+    model.add(layers.Dense(1, activation='sigmoid'))
+    return model
+
+
+STUDENTS = {
+    'mobilenet_v3_small': lambda: mobilenet_v3_small_student(1.0),
+    'mobilenet_v3_small_075': lambda: mobilenet_v3_small_student(0.75),
+    'compact_cnn': lambda: compact_cnn_student(32),
+}
+
+
+# --------------------------------------------------------------------- training
+
+def _logit(p):
+    p = tf.clip_by_value(p, 1e-6, 1 - 1e-6)
+    return tf.math.log(p) - tf.math.log1p(-p)
+
+
+class Distiller(models.Model):
+    """Trains `student` against hard labels and the frozen teacher's soft labels."""
+
+    def __init__(self, student, teacher, alpha=0.3, temperature=4.0):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.alpha = alpha
+        self.temperature = temperature
+        self.bce = tf.keras.losses.BinaryCrossentropy()
+        self.loss_tracker = tf.keras.metrics.Mean(name='loss')
+        self.accuracy = tf.keras.metrics.BinaryAccuracy(name='accuracy')
+        self.recall = tf.keras.metrics.Recall(name='recall')
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy, self.recall]
+
+    def call(self, x, training=False):
+        return self.student(x, training=training)
+
+    def train_step(self, data):
+        x, y, sample_weight = tf.keras.utils.unpack_x_y_sample_weight(data)
+        y = tf.reshape(tf.cast(y, tf.float32), [-1, 1])
+        soft_targets = tf.sigmoid(_logit(self.teacher(x, training=False)) / self.temperature)
+
+        with tf.GradientTape() as tape:
+            pred = self.student(x, training=True)
+            soft_pred = tf.sigmoid(_logit(pred) / self.temperature)
+            hard_loss = self.bce(y, pred, sample_weight=sample_weight)
+            # T^2 keeps the soft-label gradients on the same scale as the hard ones
+            soft_loss = self.bce(soft_targets, soft_pred) * self.temperature ** 2
+            loss = self.alpha * hard_loss + (1 - self.alpha) * soft_loss
+
+        grads = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(grads, self.student.trainable_variables))
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(y, pred)
+        self.recall.update_state(y, pred)
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        x, y, _ = tf.keras.utils.unpack_x_y_sample_weight(data)
+        y = tf.reshape(tf.cast(y, tf.float32), [-1, 1])
+        pred = self.student(x, training=False)
+        self.loss_tracker.update_state(self.bce(y, pred))
+        self.accuracy.update_state(y, pred)
+        self.recall.update_state(y, pred)
+        return {m.name: m.result() for m in self.metrics}
+
+
+def train_student(student, teacher, train_data, val_data, epochs=15, alpha=0.3, temperature=4.0,
+                  learning_rate=1e-3):
+    """Distil `teacher` into `student`; returns the trained student."""
+    distiller = Distiller(student, teacher, alpha=alpha, temperature=temperature)
+    distiller.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate))
+    distiller.fit(
+        train_data,
+        epochs=epochs,
+        validation_data=val_data,
+        callbacks=[
+            tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=4, restore_best_weights=True,
+                                             verbose=1),
+            tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-6,
+                                                 verbose=1),
+        ],
+        verbose=1
+    )
+    return student
+
+
+# ------------------------------------------------------------ export and timing
+
+def export_tflite(model, path):
+    """Convert a Keras model to float32 TFLite (the format the serving backends load)."""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    return path
+
+
+def tflite_latency_ms(path, num_threads=2, runs=50):
+    """Single-image latency through the same TFLite backend the API uses."""
+    backend = create_backend(path, kind='tflite', num_threads=num_threads)
+    benchmark(backend, runs=runs, warmup=5, batch=1)
+    return backend.latency_ms
+
+
+def operating_point(y_true, probs, target_sensitivity):
+    threshold = threshold_for_sensitivity(y_true, probs, target_sensitivity)
+    return binary_metrics(y_true, probs, threshold)
+
+
+def pick_winner(teacher_row, rows, tolerance=SPECIFICITY_TOLERANCE):
+    """Fastest student within `tolerance` of the teacher's validation specificity, else the most specific one."""
+    eligible = [r for r in rows if r['val_specificity'] >= teacher_row['val_specificity'] - tolerance]
+    if eligible:
+        return min(eligible, key=lambda r: r['latency_ms'])
+    return max(rows, key=lambda r: (r['val_specificity'], -r['latency_ms']))
+
+
+def distill_and_export(teacher, train_data, val_data, test_data, candidates=None, export_dir='student_export',
+                       epochs=15, alpha=0.3, temperature=4.0, target_sensitivity=DEFAULT_TARGET_SENSITIVITY,
+                       num_threads=2):
+    """
+    Train every candidate student, compare accuracy against TFLite latency at
+    equal sensitivity and export the winner with its assets.json. Thresholds
+    and the winner come from val_data; test_data is only used for the
+    reported accuracy/sensitivity/specificity at those thresholds.
+    Returns the comparison table (list of dicts, teacher first).
+    """
+    candidates = candidates or list(STUDENTS)
+    os.makedirs(export_dir, exist_ok=True)
+    y_val = np.asarray(val_data.classes)
+    y_test = np.asarray(test_data.classes)
+
+    def measure(name, model):
+        val_probs = model.predict(val_data, verbose=0).ravel()
+        calibrated = operating_point(y_val, val_probs, target_sensitivity)
+        test_probs = model.predict(test_data, verbose=0).ravel()
+        point = binary_metrics(y_test, test_probs, calibrated['threshold'])
+        path = export_tflite(model, os.path.join(export_dir, f'{name}.tflite'))
+        return {
+            'model': name,
+            'params': int(model.count_params()),
+            'latency_ms': round(tflite_latency_ms(path, num_threads=num_threads), 2),
+            'size_mb': round(os.path.getsize(path) / (1024 * 1024), 2),
+            'threshold': point['threshold'],
+            'val_sensitivity': round(calibrated['sensitivity'], 4),
+            'val_specificity': round(calibrated['specificity'], 4),
+            'accuracy': round(point['accuracy'], 4),
+            'sensitivity': round(point['sensitivity'], 4),
+            'specificity': round(point['specificity'], 4),
+            'tflite': path,
+        }
+
+    print("⏱️ Measuring teacher...")
+    teacher_row = measure('teacher', teacher)
+    rows = []
+    for name in candidates:
+        print(f"🎓 Distilling into {name}...")
+        start = time.perf_counter()
+        student = train_student(STUDENTS[name](), teacher, train_data, val_data,
+                                epochs=epochs, alpha=alpha, temperature=temperature)
+        row = measure(name, student)
+        row['train_s'] = round(time.perf_counter() - start, 1)
+        row['speedup'] = round(teacher_row['latency_ms'] / row['latency_ms'], 2) if row['latency_ms'] else None
+        rows.append(row)
+
+    print(f"\n📊 Accuracy vs latency @ validation sensitivity >= {target_sensitivity:.2f} ({num_threads} threads):")
+    print(f"{'model':<24}{'params':>12}{'ms':>9}{'x':>7}{'val spec':>10}{'test acc':>10}{'sens':>8}{'spec':>8}")
+    for r in [teacher_row] + rows:
+        print(f"{r['model']:<24}{r['params']:>12,}{r['latency_ms']:>9.2f}{r.get('speedup') or 1.0:>7.2f}"
+              f"{r['val_specificity']:>10.4f}{r['accuracy']:>10.4f}{r['sensitivity']:>8.4f}{r['specificity']:>8.4f}")
+
+    winner = pick_winner(teacher_row, rows)
+    print(f"\n🏆 Winner: {winner['model']} ({winner['latency_ms']} ms, {winner.get('speedup')}x faster)")
+    final_path = os.path.join(export_dir, 'model.tflite')
+    shutil.copyfile(winner['tflite'], final_path)
+    write_threshold(os.path.join(export_dir, 'assets.json'), winner['threshold'],
+                    student=winner['model'], teacher_latency_ms=teacher_row['latency_ms'],
+                    latency_ms=winner['latency_ms'])
+    with open(os.path.join(export_dir, 'distillation_report.json'), 'w') as f:
+        json.dump({'teacher': teacher_row, 'students': rows, 'winner': winner['model']}, f, indent=2)
+    print(f"✅ Exported {final_path}")
+    return [teacher_row] + rows
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Single-pass model evaluation and threshold calibration
+
+Inference runs once per (model, dataset) pair and the positive-class
+probabilities are cached in an .npz file. Every metric is then derived from
+that one array with vectorized NumPy: confusion counts at any threshold,
+ROC and PR curves, calibration (reliability bins, ECE, Brier) and a
+threshold sweep that picks the operating point for a target sensitivity.
+The chosen threshold is written into assets.json, which is where the
+serving apps read `threshold` from.
+
+Keras models (train_model.py) and exported .tflite/.onnx artifacts share the
+same code path; artifacts are scored with the serving backends and
+preprocessing from inference_core, so the calibrated threshold matches what
+the API will actually see.
+
+Calibrate on the validation split, then report the test split at that
+fixed threshold (never fit the threshold to the images it is scored on):
+
+    python evaluation.py --model brain_tumor.tflite --data chest_xray/val \\
+        --assets assets.json --target-sensitivity 0.95
+    python evaluation.py --model brain_tumor.tflite --data chest_xray/test \\
+        --threshold <threshold from assets.json> --target-sensitivity 0
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Shared serving code lives at the repository root
+try:
+    import inference_core  # noqa: F401
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from inference_core import create_backend, preprocess, to_probs
+
+from dataset_cache import list_image_files, source_fingerprint
+
+DEFAULT_TARGET_SENSITIVITY = 0.95
+CALIBRATION_BINS = 10
+
+
+# ---------------------------------------------------------------- probabilities
+
+def save_probabilities(path, y_true, probs, **meta):
+    np.savez_compressed(path, y_true=np.asarray(y_true), probs=np.asarray(probs), meta=json.dumps(meta))
+
+
+def load_probabilities(path):
+    with np.load(path) as data:
+        return data['y_true'], data['probs'], json.loads(str(data['meta']))
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_predictor(model_path, num_threads=None):
+    """Positive-class probability function for an exported .tflite/.onnx model."""
+    backend = create_backend(model_path, num_threads=num_threads or os.cpu_count() or 1)
+    return lambda x: to_probs(backend.run_batch(x))[:, 1]
+
+
+def predict_files(predict, paths, batch_size=32, workers=None):
+    """Score files in order; decoding runs in a thread pool ahead of inference."""
+    from PIL import Image
+
+    def load(path):
+        with Image.open(path) as img:
+            return preprocess(img)[0]
+
+    probs = []
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        pending = pool.map(lambda batch: np.stack([load(p) for p in batch]), batches)
+        for done, x in enumerate(pending, 1):
+            probs.append(np.asarray(predict(x), dtype=np.float32).ravel())
+            print(f"\r   {min(done * batch_size, len(paths))}/{len(paths)}", end='', flush=True)
+    print()
+    return np.concatenate(probs) if probs else np.zeros(0, dtype=np.float32)
+
+
+def cached_artifact_probabilities(model_path, data_dir, cache_dir='.eval_cache', batch_size=32):
+    """
+    (y_true, probs, class_names) for an artifact on a class-per-folder split,
+    reusing the cached probabilities while neither the model nor the data changed.
+    """
+    paths, y_true, class_names = list_image_files(data_dir)
+    key = hashlib.sha256(
+        f'{file_sha256(model_path)}:{source_fingerprint(paths, data_dir)}'.encode()
+    ).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f'{Path(model_path).stem}-{key}.npz')
+    if os.path.exists(cache_path):
+        print(f"♻️ Using cached probabilities: {cache_path}")
+        y_cached, probs, _ = load_probabilities(cache_path)
+        return y_cached, probs, class_names
+
+    print(f"🔮 Scoring {len(paths)} images with {model_path}...")
+    start = time.perf_counter()
+    probs = predict_files(artifact_predictor(model_path), paths, batch_size=batch_size)
+    print(f"✅ Inference done in {time.perf_counter() - start:.1f}s")
+    os.makedirs(cache_dir, exist_ok=True)
+    save_probabilities(cache_path, y_true, probs, model=str(model_path), data=str(data_dir),
+                       class_names=class_names)
+    return y_true, probs, class_names
+
+
+# ---------------------------------------------------------------------- metrics
+
+def confusion_at(y_true, probs, thresholds):
+    """TP/FP/TN/FN for every threshold at once (broadcast over thresholds)."""
+    y = np.asarray(y_true).astype(bool)
+    pred = np.asarray(probs)[None, :] >= np.atleast_1d(thresholds)[:, None]
+    tp = (pred & y).sum(axis=1)
+    fp = (pred & ~y).sum(axis=1)
+    return tp, fp, (~y).sum() - fp, y.sum() - tp
+
+
+def _ratio(num, den):
+    num, den = np.asarray(num, dtype=np.float64), np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def binary_metrics(y_true, probs, threshold):
+    tp, fp, tn, fn = (int(v[0]) for v in confusion_at(y_true, probs, threshold))
+    precision = float(_ratio(tp, tp + fp))
+    recall = float(_ratio(tp, tp + fn))
+    return {
+        'threshold': float(threshold),
+        'accuracy': float(_ratio(tp + tn, tp + fp + tn + fn)),
+        'precision': precision,
+        'sensitivity': recall,
+        'specificity': float(_ratio(tn, tn + fp)),
+        'f1': float(_ratio(2 * precision * recall, precision + recall)),
+        'confusion': {'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn},
+    }
+
+
+def _cumulative_counts(y_true, probs):
+    """Cumulative TP/FP at each distinct score, scores descending."""
+    order = np.argsort(-np.asarray(probs), kind='mergesort')
+    scores = np.asarray(probs)[order]
+    y = np.asarray(y_true)[order].astype(np.float64)
+    # Last index of each run of equal scores
+    ends = np.r_[np.flatnonzero(np.diff(scores)), scores.size - 1]
+    tps = np.cumsum(y)[ends]
+    fps = (ends + 1) - tps
+    return tps, fps, scores[ends]
+
+
+def roc_curve(y_true, probs):
+    """(fpr, tpr, thresholds), starting at (0, 0)."""
+    tps, fps, thresholds = _cumulative_counts(y_true, probs)
+    tpr = _ratio(np.r_[0, tps], tps[-1] if tps.size else 0)
+    fpr = _ratio(np.r_[0, fps], fps[-1] if fps.size else 0)
+    return fpr, tpr, np.r_[np.inf, thresholds]
+
+
+def pr_curve(y_true, probs):
+    """(precision, recall, thresholds) for decreasing thresholds."""
+    tps, fps, thresholds = _cumulative_counts(y_true, probs)
+    precision = _ratio(tps, tps + fps)
+    recall = _ratio(tps, tps[-1] if tps.size else 0)
+    return precision, recall, thresholds
+
+
+def area(x, y):
+    """Trapezoidal area under a curve."""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2))
+
+
+def average_precision(y_true, probs):
+    precision, recall, _ = pr_curve(y_true, probs)
+    return float(np.sum(np.diff(np.r_[0, recall]) * precision))
+
+
+def calibration(y_true, probs, bins=CALIBRATION_BINS):
+    """Reliability table, expected calibration error and Brier score."""
+    y = np.asarray(y_true, dtype=np.float64)
+    p = np.asarray(probs, dtype=np.float64)
+    idx = np.minimum((p * bins).astype(int), bins - 1)
+    counts = np.bincount(idx, minlength=bins)
+    confidence = _ratio(np.bincount(idx, weights=p, minlength=bins), counts)
+    observed = _ratio(np.bincount(idx, weights=y, minlength=bins), counts)
+    return {
+        'bins': [
+            {'range': [i / bins, (i + 1) / bins], 'count': int(c),
+             'mean_prob': round(float(m), 4), 'observed_rate': round(float(o), 4)}
+            for i, (c, m, o) in enumerate(zip(counts, confidence, observed))
+        ],
+        'ece': float(np.sum(counts / max(len(p), 1) * np.abs(observed - confidence))),
+        'brier': float(np.mean((p - y) ** 2)) if len(p) else 0.0,
+    }
+
+
+def threshold_for_sensitivity(y_true, probs, target=DEFAULT_TARGET_SENSITIVITY):
+    """
+    Highest threshold whose sensitivity reaches `target`, i.e. the best
+    specificity among operating points that meet the sensitivity goal.
+    """
+    fpr, tpr, thresholds = roc_curve(y_true, probs)
+    ok = np.flatnonzero((tpr >= target) & np.isfinite(thresholds))
+    if ok.size == 0:
+        return float(np.min(probs)) if len(probs) else 0.5
+    return float(thresholds[ok[0]])
+
+
+def sweep(y_true, probs, thresholds=None):
+    """Sensitivity/specificity/precision for a grid of thresholds in one pass."""
+    thresholds = np.linspace(0.0, 1.0, 101) if thresholds is None else np.asarray(thresholds)
+    tp, fp, tn, fn = confusion_at(y_true, probs, thresholds)
+    return {
+        'threshold': thresholds,
+        'sensitivity': _ratio(tp, tp + fn),
+        'specificity': _ratio(tn, tn + fp),
+        'precision': _ratio(tp, tp + fp),
+    }
+
+
+def evaluate(y_true, probs, threshold=0.5, target_sensitivity=DEFAULT_TARGET_SENSITIVITY):
+    """Full report from cached probabilities; no model calls."""
+    y_true, probs = np.asarray(y_true), np.asarray(probs, dtype=np.float64)
+    fpr, tpr, _ = roc_curve(y_true, probs)
+    report = {
+        'samples': int(len(y_true)),
+        'prevalence': float(np.mean(y_true)) if len(y_true) else 0.0,
+        'roc_auc': area(fpr, tpr),
+        'average_precision': average_precision(y_true, probs),
+        'calibration': calibration(y_true, probs),
+        'at_threshold': binary_metrics(y_true, probs, threshold),
+    }
+    if target_sensitivity:
+        chosen = threshold_for_sensitivity(y_true, probs, target_sensitivity)
+        report['target_sensitivity'] = target_sensitivity
+        report['calibrated'] = binary_metrics(y_true, probs, chosen)
+    return report
+
+
+def print_report(report):
+    print("\n📈 Test Results:")
+    print(f"Samples: {report['samples']} (prevalence {report['prevalence']:.3f})")
+    print(f"ROC AUC: {report['roc_auc']:.4f}")
+    print(f"Average precision: {report['average_precision']:.4f}")
+    print(f"Brier: {report['calibration']['brier']:.4f}  ECE: {report['calibration']['ece']:.4f}")
+    for name in ('at_threshold', 'calibrated'):
+        if name not in report:
+            continue
+        m = report[name]
+        print(f"\n@ threshold {m['threshold']:.4f}" +
+              (f" (target sensitivity {report['target_sensitivity']:.2f})" if name == 'calibrated' else ''))
+        print(f"  Accuracy: {m['accuracy']:.4f}  Precision: {m['precision']:.4f}  F1: {m['f1']:.4f}")
+        print(f"  Sensitivity: {m['sensitivity']:.4f}  Specificity: {m['specificity']:.4f}")
+        print(f"  Confusion: {m['confusion']}")
+
+
+def write_threshold(assets_path, threshold, **extra):
+    """Set `threshold` (plus any extra keys) in assets.json, keeping other entries."""
+    assets = {}
+    if os.path.exists(assets_path):
+        with open(assets_path) as f:
+            assets = json.load(f)
+    assets['threshold'] = round(float(threshold), 4)
+    assets.update(extra)
+    with open(assets_path, 'w') as f:
+        json.dump(assets, f, indent=2)
+    print(f"💾 threshold={assets['threshold']} written to {assets_path}")
+    return assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a .tflite/.onnx model and calibrate its threshold")
+    parser.add_argument('--model', required=True, help="Exported .tflite or .onnx model")
+    parser.add_argument('--data', required=True, help="Split directory with one subfolder per class")
+    parser.add_argument('--assets', default='', help="assets.json to update with the calibrated threshold")
+    parser.add_argument('--target-sensitivity', type=float, default=DEFAULT_TARGET_SENSITIVITY,
+                        help="Sensitivity to calibrate the threshold for; 0 only reports at --threshold")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Reference threshold to report")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--cache-dir', default='.eval_cache')
+    parser.add_argument('--report', default='', help="Optional JSON report path")
+    args = parser.parse_args()
+
+    y_true, probs, class_names = cached_artifact_probabilities(
+        args.model, args.data, cache_dir=args.cache_dir, batch_size=args.batch_size
+    )
+    report = evaluate(y_true, probs, threshold=args.threshold, target_sensitivity=args.target_sensitivity)
+    report['class_names'] = class_names
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.assets and 'calibrated' in report:
+        write_threshold(args.assets, report['calibrated']['threshold'])
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ This script creates a new .h5 model file for deployment
 """
 
 import os
+import time
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers, models, callbacks
@@ -18,6 +19,24 @@ import matplotlib.pyplot as plt
 tf.random.set_seed(42)
 np.random.seed(42)
 
+# Input pipeline: 'tfdata' (parallel decode + batched augmentation) or 'keras' (ImageDataGenerator)
+DATA_PIPELINE = os.environ.get('DATA_PIPELINE', 'tfdata').lower()
+# Optional on-disk cache for decoded images (default: in memory)
+DATA_CACHE_DIR = os.environ.get('DATA_CACHE_DIR', '')
+# Persistent preprocessed shards (see dataset_cache.py); rebuilt when the source changes
+DATA_SHARD_DIR = os.environ.get('DATA_SHARD_DIR', '')
+# Threshold calibration: operating point picked on the validation set, written to assets.json for serving
+TARGET_SENSITIVITY = float(os.environ.get('TARGET_SENSITIVITY', 0.95))
+ASSETS_PATH = os.environ.get('ASSETS_PATH', 'assets.json')
+# Optional distillation of the trained ResNet50 into a low-latency student (see distillation.py)
+DISTILL = os.environ.get('DISTILL', 'false').lower() in ('1', 'true', 'yes')
+DISTILL_STUDENTS = [s for s in os.environ.get('DISTILL_STUDENTS', '').split(',') if s]
+DISTILL_EPOCHS = int(os.environ.get('DISTILL_EPOCHS', 15))
+DISTILL_ALPHA = float(os.environ.get('DISTILL_ALPHA', 0.3))
+DISTILL_TEMPERATURE = float(os.environ.get('DISTILL_TEMPERATURE', 4.0))
+DISTILL_EXPORT_DIR = os.environ.get('DISTILL_EXPORT_DIR', 'student_export')
+DISTILL_BENCH_THREADS = int(os.environ.get('DISTILL_BENCH_THREADS', 2))  # vCPUs of the serving instance
+
 def download_dataset():
     """Download the chest X-ray pneumonia dataset"""
     try:
@@ -66,14 +85,24 @@ def create_model():
     print("✅ Model built successfully")
     return model
 
-def create_data_generators(base_dir):
+def create_data_generators(base_dir, pipeline=None):
     """Create data generators for training"""
-    print("📊 Creating data generators...")
+    pipeline = pipeline or DATA_PIPELINE
+    print(f"📊 Creating data generators ({pipeline})...")
 
     train_dir = os.path.join(base_dir, 'chest_xray', 'train')
     val_dir = os.path.join(base_dir, 'chest_xray', 'val')
     test_dir = os.path.join(base_dir, 'chest_xray', 'test')
 
+    if pipeline == 'tfdata':
+        from data_pipeline import make_dataset
+        options = {'cache_dir': DATA_CACHE_DIR or None, 'shard_dir': DATA_SHARD_DIR or None}
+        train_generator = make_dataset(train_dir, training=True, **options)
+        validation_generator = make_dataset(val_dir, training=False, **options)
+        test_generator = make_dataset(test_dir, training=False, **options)
+        print("✅ Data pipelines created")
+        return train_generator, validation_generator, test_generator
+
     # Enhanced data augmentation for training
     train_datagen = ImageDataGenerator(
         rescale=1./255,
@@ -122,6 +151,15 @@ def create_data_generators(base_dir):
     print("✅ Data generators created")
     return train_generator, validation_generator, test_generator
 
+class EpochTimer(callbacks.Callback):
+    """Print wall time per epoch to compare input pipelines"""
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        print(f"⏱️ Epoch {epoch + 1} wall time: {time.perf_counter() - self.start:.1f}s")
+
 def train_model(model, train_generator, validation_generator):
     """Train the model with callbacks"""
     print("🚀 Starting training...")
@@ -155,7 +193,8 @@ def train_model(model, train_generator, validation_generator):
             monitor='val_accuracy',
             save_best_only=True,
             verbose=1
-        )
+        ),
+        EpochTimer()
     ]
 
     # Train the model
@@ -173,28 +212,34 @@ def train_model(model, train_generator, validation_generator):
     print("✅ Training completed")
     return history
 
-def evaluate_model(model, test_generator):
-    """Evaluate the model"""
+def evaluate_model(model, validation_generator, test_generator):
+    """Calibrate the threshold on the validation split, then evaluate the test split at that threshold"""
+    from evaluation import evaluate, print_report, save_probabilities, threshold_for_sensitivity, write_threshold
     print("📊 Evaluating model...")
 
-    # Evaluate on test set
-    test_loss, test_acc, test_auc, test_precision, test_recall = model.evaluate(test_generator, verbose=1)
+    # Operating point from validation data only; the test split stays untouched until the final report
+    y_val = np.asarray(validation_generator.classes)
+    val_probs = model.predict(validation_generator, verbose=1).ravel()
+    save_probabilities('val_probabilities.npz', y_val, val_probs)
+    threshold = threshold_for_sensitivity(y_val, val_probs, TARGET_SENSITIVITY)
+    print(f"🎯 Threshold {threshold:.4f} for target sensitivity {TARGET_SENSITIVITY:.2f} ({len(y_val)} validation images)")
+    write_threshold(ASSETS_PATH, threshold)
+
+    # One predict pass on test; every metric below is computed from these probabilities
+    y_true = np.asarray(test_generator.classes)
+    probs = model.predict(test_generator, verbose=1).ravel()
+    save_probabilities('test_probabilities.npz', y_true, probs)
 
-    print(f"\\n📈 Test Results:")
-    print(f"Accuracy: {test_acc:.4f}")
-    print(f"AUC: {test_auc:.4f}")
-    print(f"Precision: {test_precision:.4f}")
-    print(f"Recall: {test_recall:.4f}")
-    print(f"F1-Score: {2 * test_precision * test_recall / (test_precision + test_recall):.4f}")
+    report = evaluate(y_true, probs, threshold=threshold, target_sensitivity=None)
+    print_report(report)
 
     # Classification report
-    y_true = test_generator.classes
-    y_pred = (model.predict(test_generator) > 0.5).astype(int)
+    y_pred = (probs >= threshold).astype(int)
 
-    print("\\n📋 Classification Report:")
+    print(f"\n📋 Classification Report (threshold {threshold:.4f}):")
     print(classification_report(y_true, y_pred, target_names=['NORMAL', 'PNEUMONIA']))
 
-    return test_acc
+    return report['at_threshold']['accuracy']
 
 def save_model(model, accuracy):
     """Save the trained model"""
@@ -270,7 +315,7 @@ def main():
     history = train_model(model, train_gen, val_gen)
 
     # Evaluate model
-    accuracy = evaluate_model(model, test_gen)
+    accuracy = evaluate_model(model, val_gen, test_gen)
 
     # Save model
     model_file, needs_drive = save_model(model, accuracy)
@@ -278,6 +323,20 @@ def main():
     # Plot training history
     plot_training_history(history)
 
+    # Distil into a faster student and export it for serving
+    if DISTILL:
+        from distillation import distill_and_export
+        distill_and_export(
+            model, train_gen, val_gen, test_gen,
+            candidates=DISTILL_STUDENTS or None,
+            export_dir=DISTILL_EXPORT_DIR,
+            epochs=DISTILL_EPOCHS,
+            alpha=DISTILL_ALPHA,
+            temperature=DISTILL_TEMPERATURE,
+            target_sensitivity=TARGET_SENSITIVITY,
+            num_threads=DISTILL_BENCH_THREADS
+        )
+
     print("\\n🎉 Training pipeline completed!")
     print(f"📁 Model saved: {model_file}")
     print(f"📊 Final accuracy: {accuracy:.4f}")
@@ -1,42 +1,63 @@
-import os, numpy as np
+import os, io, sys, asyncio
+from pathlib import Path
 from PIL import Image
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from huggingface_hub import hf_hub_download
-import tflite_runtime.interpreter as tflite
+
+# Shared inference core: next to the app in the image (see Dockerfile), at the repository root in a checkout
+try:
+    import inference_core  # noqa: F401
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from inference_core import InferenceEngine, fetch_from_hub, preprocess, content_key
 
 HF_REPO   = os.getenv("HF_REPO", "palawakampa/tumorotak")
 HF_FILE   = os.getenv("HF_FILENAME", "brain_tumor.tflite")
 MODEL_DIR = os.getenv("MODEL_DIR", "/app/models")
-MODEL_PATH = os.path.join(MODEL_DIR, HF_FILE)
-
-os.makedirs(MODEL_DIR, exist_ok=True)
-if not os.path.exists(MODEL_PATH):
-    local = hf_hub_download(repo_id=HF_REPO, filename=HF_FILE,
-                            local_dir=MODEL_DIR, local_dir_use_symlinks=False,
-                            token=os.getenv("HF_TOKEN") or None)
-    if local != MODEL_PATH:
-        import shutil; shutil.copy2(local, MODEL_PATH)
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", 60))
+# Response contract of this API: "probability" is the model's tumor output and
+# "prediction" is LABELS[1] above THRESHOLD, else LABELS[0]
+LABELS    = os.getenv("LABELS", "NORMAL,Tumor Otak").split(",")  # negative,positive
+THRESHOLD = float(os.getenv("THRESHOLD", 0.5))
 
-interpreter = tflite.Interpreter(model_path=MODEL_PATH, num_threads=1)
-interpreter.allocate_tensors()
-in_det, out_det = interpreter.get_input_details(), interpreter.get_output_details()
+# Download + load in the background so the server starts accepting
+# health checks immediately instead of blocking on import.
+ENGINE = InferenceEngine(lambda: fetch_from_hub(HF_REPO, HF_FILE, MODEL_DIR, token=os.getenv("HF_TOKEN")))
+ENGINE.start_background_load()
 
 app = FastAPI(title="Tumor Otak API (Railway)")
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "model_ready": True}
+    return {"status": "ok", "model_ready": ENGINE.ready.is_set()}
+
+@app.get("/debug/model_meta")
+def model_meta():
+    return ENGINE.meta()
 
 @app.post("/predict")
 async def predict(file: UploadFile = File(...)):
-    try:
-        img = Image.open(file.file).convert("RGB").resize((224,224))
-        x = np.expand_dims(np.array(img, dtype=np.float32)/255.0, 0)
-        interpreter.set_tensor(in_det[0]['index'], x)
-        interpreter.invoke()
-        y = interpreter.get_tensor(out_det[0]['index'])
-        prob = float(y[0][0])
-        label = "Tumor Otak" if prob > 0.5 else "NORMAL"
-        return {"prediction": label, "probability": prob}
-    except Exception as e:
-        raise HTTPException(400, f"Bad image: {e}")
+    if (ENGINE.error is not None or ENGINE.unloaded) and not ENGINE.ready.is_set():
+        # Retry after a failed load, or reload after an idle unload (no-op while a load is running)
+        ENGINE.start_background_load()
+    if not await asyncio.to_thread(ENGINE.wait_ready, READY_TIMEOUT):
+        raise HTTPException(503, "Model is still loading, retry shortly", headers={"Retry-After": "5"})
+    data = await file.read()
+    key = content_key(data)
+    probs = ENGINE.cache.get(key)
+    if probs is None:
+        # Decode off the event loop; only decoding errors are the client's fault
+        try:
+            x = await asyncio.to_thread(lambda: preprocess(Image.open(io.BytesIO(data))))
+        except Exception as e:
+            raise HTTPException(400, f"Bad image: {e}")
+        try:
+            # submit blocks while the inference queue is full
+            future = await asyncio.to_thread(ENGINE.submit, x, key)
+            probs = await asyncio.wrap_future(future)
+        except Exception as e:
+            if not ENGINE.ready.is_set():  # unloaded while this request was queued
+                raise HTTPException(503, "Model is reloading, retry shortly", headers={"Retry-After": "5"})
+            raise HTTPException(500, f"Inference failed: {e}")
+    # Sigmoid heads: probs[1] is the raw model output this API has always reported
+    prob = float(probs[1])
+    return {"prediction": LABELS[1] if prob > THRESHOLD else LABELS[0], "probability": prob}
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Offline batch scoring for directories of scans
+
+Scores every image under a directory (or listed in a file) with the same
+preprocess() and model backends the API uses, without going through HTTP.
+Decoding and preprocessing run in a process pool; inference runs in batches
+in the main process. Results are appended to CSV or written as Parquet part
+files as they complete, so an interrupted run picks up where it stopped.
+
+Usage:
+    python scripts/batch_score.py /data/archive --output scores.csv
+    python scripts/batch_score.py --file-list paths.txt --output scores.parquet \\
+        --model brain_tumor.tflite --assets assets.json --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Shared inference core (repository root)
+try:
+    import inference_core  # noqa: F401
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from inference_core import (
+    DEFAULT_LABELS, DEFAULT_THRESHOLD, create_backend, effective_cpu_count, fetch_from_hub, label_for,
+    preprocess, to_probs
+)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+COLUMNS = ["path", "prediction", "p_normal", "p_tumor", "error"]
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+CPUS, _ = effective_cpu_count()
+
+
+def list_inputs(root=None, file_list=None):
+    """Sorted image paths from a directory walk or a newline-separated file list."""
+    if file_list:
+        with open(file_list) as f:
+            return [line.strip() for line in f if line.strip()]
+    paths = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
+
+
+def load_chunk(paths):
+    """Worker: decode + preprocess a chunk. Returns (paths, stacked batch or None, errors)."""
+    from PIL import Image
+
+    tensors, ok, errors = [], [], {}
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                tensors.append(preprocess(img)[0])
+            ok.append(path)
+        except Exception as e:
+            errors[path] = f"{type(e).__name__}: {e}"
+    return ok, (np.stack(tensors) if tensors else None), errors
+
+
+# ------------------------------------------------------------------ result sinks
+
+class CsvSink:
+    """Appends rows to a CSV file; the path column doubles as the checkpoint."""
+
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if not exists:
+            self.writer.writeheader()
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline="") as f:
+            return {row["path"] for row in csv.DictReader(f)}
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """Writes buffered rows as numbered part files under a directory (requires pyarrow)."""
+
+    def __init__(self, path, rows_per_part=8192):
+        import pyarrow  # noqa: F401  (fail fast before any work is done)
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self.buffer = []
+        os.makedirs(path, exist_ok=True)
+        self.part = len([f for f in os.listdir(path) if f.endswith(".parquet")])
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.isdir(path):
+            return set()
+        import pyarrow.parquet as pq
+        done = set()
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".parquet"):
+                done.update(pq.read_table(os.path.join(path, name), columns=["path"]).column("path").to_pylist())
+        return done
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self.buffer)
+        final = os.path.join(self.path, f"part-{self.part:05d}.parquet")
+        # Write then rename so a crash never leaves a half-written part behind
+        pq.write_table(table, final + ".tmp")
+        os.replace(final + ".tmp", final)
+        self.part += 1
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+
+def open_sink(output):
+    return ParquetSink(output) if output.endswith(".parquet") else CsvSink(output)
+
+
+def done_paths(output):
+    return ParquetSink.done_paths(output) if output.endswith(".parquet") else CsvSink.done_paths(output)
+
+
+# ----------------------------------------------------------------------- scoring
+
+def load_model(args):
+    """(backend, labels, threshold) from a local model file or the Hugging Face repo the API uses."""
+    assets = {}
+    if args.model:
+        model_path = args.model
+        if args.assets:
+            with open(args.assets) as f:
+                assets = json.load(f)
+    else:
+        repo_id = os.environ.get("HF_REPO_ID", "palawakampa/tumorotak")
+        filename = os.environ.get("HF_FILENAME", "brain_tumor.tflite")
+        candidates, assets = fetch_from_hub(repo_id, filename, os.environ.get("MODEL_DIR", "/tmp/models"))
+        model_path = next(iter(candidates.values()))
+    backend = create_backend(model_path, num_threads=args.threads)
+    print(f"Model: {model_path} ({backend.name}, {args.threads} threads)")
+    return backend, assets.get("labels", list(DEFAULT_LABELS)), assets.get("threshold", DEFAULT_THRESHOLD)
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+
+def score(args):
+    paths = list_inputs(args.input, args.file_list)
+    already = done_paths(args.output)
+    todo = [p for p in paths if p not in already]
+    print(f"{len(paths)} images found, {len(already)} already scored, {len(todo)} to go")
+    if not todo:
+        return 0
+
+    backend, labels, threshold = load_model(args)
+    sink = open_sink(args.output)
+    chunks = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+
+    done = failed = 0
+    start = last_report = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # Bounded look-ahead keeps memory flat however large the archive is
+            pending = deque()
+            chunk_iter = iter(chunks)
+            for chunk in chunk_iter:
+                pending.append(pool.submit(load_chunk, chunk))
+                if len(pending) >= args.workers * 2:
+                    break
+            while pending:
+                ok, batch, errors = pending.popleft().result()
+                next_chunk = next(chunk_iter, None)
+                if next_chunk is not None:
+                    pending.append(pool.submit(load_chunk, next_chunk))
+
+                rows = [{"path": p, "prediction": None, "p_normal": None, "p_tumor": None, "error": err}
+                        for p, err in errors.items()]
+                if batch is not None:
+                    probs = to_probs(backend.run_batch(batch))
+                    rows.extend(
+                        {"path": p, "prediction": label_for(float(pr[1]), labels, threshold),
+                         "p_normal": round(float(pr[0]), 6), "p_tumor": round(float(pr[1]), 6), "error": None}
+                        for p, pr in zip(ok, probs)
+                    )
+                sink.write(rows)
+                done += len(rows)
+                failed += len(errors)
+
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL or not pending:
+                    rate = done / (now - start)
+                    eta = (len(todo) - done) / rate if rate else 0
+                    print(f"{done}/{len(todo)} images · {rate:.1f} img/s · ETA {format_eta(eta)} · {failed} failed",
+                          flush=True)
+                    last_report = now
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {done} images in {elapsed:.1f}s ({done / elapsed:.1f} img/s), {failed} failed -> {args.output}")
+    return 1 if failed and failed == done else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory of scans offline")
+    parser.add_argument("input", nargs="?", help="Directory to walk for images")
+    parser.add_argument("--file-list", help="Text file with one image path per line")
+    parser.add_argument("--output", default="scores.csv", help="CSV file, or a .parquet directory of parts")
+    parser.add_argument("--model", help="Local .tflite/.onnx model (default: download like the API)")
+    parser.add_argument("--assets", help="assets.json for labels/threshold when --model is given")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=max(1, CPUS - 1),
+                        help="Decode processes")
+    parser.add_argument("--threads", type=int, default=min(4, CPUS),
+                        help="Inference threads")
+    args = parser.parse_args()
+    if not args.input and not args.file_list:
+        parser.error("give a directory or --file-list")
+    sys.exit(score(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Offline calibration of the screening cascade's uncertainty band
+
+Takes screening-model and full-model scores for the same validation images
+(CSV files written by scripts/batch_score.py) and picks the band the API
+uses with CASCADE_SCREEN_FILENAME: the screen answers "no tumor" below
+`low` and "tumor" above `high`; everything in between goes to the full model.
+
+`low` is the highest value at which the cascade loses no more than
+--max-missed of the positives the full model finds (ground truth from
+--labels or --positive-pattern when given, otherwise the full model's own
+decisions), minus --margin. `high` stays at 1.0 (positives are always
+confirmed by the full model) unless --screen-positives is set.
+
+The full model's decisions use the threshold from its assets.json (--assets)
+unless --threshold is given. The band always contains that threshold (the
+API refuses one that does not), so `low` is capped at it and `high` raised
+to it when needed.
+
+Usage:
+    python scripts/batch_score.py /data/val --model screen.tflite --output screen.csv
+    python scripts/batch_score.py /data/val --model brain_tumor.tflite --output full.csv
+    python scripts/calibrate_cascade.py --screen screen.csv --full full.csv --assets assets.json --output cascade.json
+    python scripts/calibrate_cascade.py --screen screen.csv --full full.csv --positive-pattern /tumor/
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Shared inference core (repository root)
+try:
+    import inference_core  # noqa: F401
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from inference_core import DEFAULT_THRESHOLD
+
+
+def read_scores(path):
+    """path -> p_tumor from a batch_score.py CSV (rows with errors are skipped)."""
+    with open(path, newline="") as f:
+        return {row["path"]: float(row["p_tumor"]) for row in csv.DictReader(f) if not row.get("error")}
+
+
+def read_labels(path):
+    """path -> 0/1 from a CSV with path,label columns (label 1/0, true/false, or a name containing 'tumor')."""
+    labels = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            value = row["label"].strip().lower()
+            labels[row["path"]] = int(value in ("1", "true", "yes", "positive") or
+                                      ("tumor" in value and not value.startswith(("no", "non"))))
+    return labels
+
+
+def full_model_threshold(args):
+    """--threshold, else `threshold` from the full model's assets.json (as the API reads it)."""
+    if args.threshold is not None:
+        return args.threshold, "--threshold"
+    if not os.path.exists(args.assets):
+        sys.exit(f"{args.assets} not found: pass the full model's assets.json with --assets, or --threshold")
+    with open(args.assets) as f:
+        return float(json.load(f).get("threshold", DEFAULT_THRESHOLD)), args.assets
+
+
+def cascade_decisions(screen, full_pos, low, high):
+    """Final positive/negative per image for a band."""
+    return np.where(screen < low, False, np.where(screen > high, True, full_pos))
+
+
+def rates(decisions, reference):
+    positives, negatives = reference.sum(), (~reference).sum()
+    return {
+        "sensitivity": round(float((decisions & reference).sum() / positives), 4) if positives else None,
+        "specificity": round(float((~decisions & ~reference).sum() / negatives), 4) if negatives else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the screening cascade's uncertainty band")
+    parser.add_argument("--screen", required=True, help="batch_score.py CSV from the screening model")
+    parser.add_argument("--full", required=True, help="batch_score.py CSV from the full model")
+    parser.add_argument("--labels", help="CSV with path,label ground truth")
+    parser.add_argument("--positive-pattern", help="Regex on the path marking ground-truth positives")
+    parser.add_argument("--assets", default="assets.json", help="Full model's assets.json (decision threshold)")
+    parser.add_argument("--threshold", type=float, help="Full model's decision threshold (overrides --assets)")
+    parser.add_argument("--max-missed", type=int, default=0, help="Positives the screen may reject")
+    parser.add_argument("--margin", type=float, default=0.01, help="Safety margin subtracted from low (added to high)")
+    parser.add_argument("--screen-positives", action="store_true", help="Also let the screen answer 'tumor'")
+    parser.add_argument("--max-false-positives", type=int, default=0,
+                        help="Negatives the screen may call positive (with --screen-positives)")
+    parser.add_argument("--output", default="cascade.json", help="Band file for CASCADE_BAND_FILE")
+    args = parser.parse_args()
+
+    threshold, threshold_source = full_model_threshold(args)
+    screen_scores, full_scores = read_scores(args.screen), read_scores(args.full)
+    paths = sorted(screen_scores.keys() & full_scores.keys())
+    if not paths:
+        sys.exit("No images scored by both models")
+    screen = np.array([screen_scores[p] for p in paths])
+    full_pos = np.array([full_scores[p] for p in paths]) >= threshold
+
+    if args.labels:
+        labels = read_labels(args.labels)
+        paths_known = [p in labels for p in paths]
+        if not all(paths_known):
+            print(f"Ignoring {paths_known.count(False)} image(s) without a label")
+        keep = np.array(paths_known)
+        screen, full_pos = screen[keep], full_pos[keep]
+        reference = np.array([labels[p] for p in paths if p in labels], dtype=bool)
+        source = f"labels ({args.labels})"
+    elif args.positive_pattern:
+        pattern = re.compile(args.positive_pattern)
+        reference = np.array([bool(pattern.search(p)) for p in paths])
+        source = f"path pattern {args.positive_pattern!r}"
+    else:
+        reference = full_pos
+        source = "full model decisions"
+
+    # Positives the full model gets right; the screen must not reject more than --max-missed of them
+    caught = np.sort(screen[full_pos & reference])
+    low = float(caught[args.max_missed]) if len(caught) > args.max_missed else 1.0
+    low = max(0.0, low - args.margin)
+
+    high = 1.0
+    if args.screen_positives:
+        cleared = np.sort(screen[~full_pos & ~reference])[::-1]
+        high = float(cleared[args.max_false_positives]) if len(cleared) > args.max_false_positives else 0.0
+        high = max(low, min(1.0, high + args.margin))
+
+    # A screen decision must agree with the label its score gets at the full model's threshold
+    if low > threshold or high < threshold:
+        print(f"Band [{low:.6f}, {high:.6f}] widened to contain the threshold {threshold}")
+        low, high = min(low, threshold), max(high, threshold)
+
+    escalated = (screen >= low) & (screen <= high)
+    band = {
+        "low": round(low, 6),
+        "high": round(high, 6),
+        "threshold": threshold,
+        "samples": len(screen),
+        "reference": source,
+        "escalation_rate": round(float(escalated.mean()), 4),
+        "full_model": rates(full_pos, reference),
+        "cascade": rates(cascade_decisions(screen, full_pos, low, high), reference),
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "screen_scores": args.screen,
+        "full_scores": args.full,
+    }
+    with open(args.output, "w") as f:
+        json.dump(band, f, indent=2)
+
+    print(f"Band [{band['low']}, {band['high']}] from {band['samples']} image(s), reference: {source}")
+    print(f"Full model threshold: {threshold} (from {threshold_source})")
+    print(f"Escalated to the full model: {band['escalation_rate']:.1%}")
+    print(f"Full model only:  {band['full_model']}")
+    print(f"Cascade:          {band['cascade']}")
+    print(f"Written to {args.output} (set CASCADE_BAND_FILE)")
+
+
+if __name__ == "__main__":
+    main()
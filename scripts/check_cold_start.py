@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cold-import regression check for the FastAPI service
+
+Imports services/fastapi/app/main.py in fresh interpreters and fails
+(exit status 1) when the median import time exceeds the budget, or when a
+module that should only be imported on first use (inference runtimes,
+huggingface_hub, grpc, volume readers, msgpack) is loaded at import time.
+Prints the service's own startup phases and the slowest imports so a
+regression can be traced to its cause.
+
+Usage:
+    python scripts/check_cold_start.py                 # budget from COLD_IMPORT_BUDGET_MS (default 1500)
+    python scripts/check_cold_start.py --max-ms 800 --runs 5
+    python scripts/check_cold_start.py --service-dir /app      # inside the backend image
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[1] / "services" / "fastapi"
+DEFAULT_BUDGET_MS = float(os.environ.get("COLD_IMPORT_BUDGET_MS", 1500))
+# Must stay out of the import path: they are imported when a model is loaded or a feature is used
+LAZY_MODULES = [
+    "tflite_runtime", "tensorflow", "onnxruntime", "huggingface_hub", "grpc", "nibabel", "pydicom", "msgpack",
+]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({
+    "ms": elapsed,
+    "phases": app.main.STARTUP.report()["phases"],
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def run_once(service_dir):
+    """Import the app in a fresh interpreter; returns (result dict, -X importtime lines)."""
+    env = {**os.environ, "LOG_LEVEL": "WARNING", "HF_HUB_OFFLINE": "1", "MODEL_PRELOAD": "false", "GRPC_PORT": "0"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD % LAZY_MODULES],
+        cwd=service_dir, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Importing app.main failed:\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr.splitlines()
+
+
+def slowest_imports(importtime_lines, top=10):
+    """Modules imported directly by app.main, by cumulative import time (microseconds -> ms)."""
+    rows = []
+    for line in importtime_lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # importtime indents by two spaces per nesting level; app.main itself is at level 0
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when the API's cold import time regresses")
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_BUDGET_MS, help="Median import budget (ms)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to time")
+    parser.add_argument("--service-dir", default=str(SERVICE_DIR), help="Directory containing the app package")
+    args = parser.parse_args()
+
+    results = [run_once(args.service_dir) for _ in range(args.runs)]
+    times = [r["ms"] for r, _ in results]
+    median = statistics.median(times)
+    best, importtime = min(results, key=lambda r: r[0]["ms"])
+
+    print(f"Cold import of app.main: median {median:.0f} ms over {args.runs} run(s) "
+          f"(min {min(times):.0f}, max {max(times):.0f}), budget {args.max_ms:.0f} ms")
+    print("\nStartup phases (fastest run):")
+    for p in best["phases"]:
+        print(f"  {p['phase']:<24}{p['ms']:>8.1f} ms")
+    print("\nSlowest imports made by app.main:")
+    for ms, name in slowest_imports(importtime):
+        print(f"  {name:<40}{ms:>8.1f} ms")
+
+    failed = False
+    if best["loaded"]:
+        print(f"\n❌ Imported eagerly (should be lazy): {', '.join(best['loaded'])}")
+        failed = True
+    if median > args.max_ms:
+        print(f"\n❌ Cold import {median:.0f} ms exceeds the {args.max_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("\n✅ Cold import within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
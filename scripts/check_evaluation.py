@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Known-answer check for the threshold metrics in notebooks/evaluation.py
+
+Computes confusion counts and the derived metrics for small hand-worked
+examples and fails (exit status 1) when any of them differs from the
+expected value, so a slip such as swapped TN/FN counts cannot silently
+shift the calibrated threshold written to assets.json.
+
+Usage:
+    python scripts/check_evaluation.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "notebooks"))
+from evaluation import binary_metrics, confusion_at, sweep  # noqa: E402
+
+# 3 positives, 5 negatives; at 0.5: TP 2, FN 1 (0.2), FP 1 (0.7), TN 4
+Y_TRUE = [1, 1, 1, 0, 0, 0, 0, 0]
+PROBS = [0.9, 0.8, 0.2, 0.1, 0.1, 0.1, 0.1, 0.7]
+EXPECTED = {
+    "confusion": {"tp": 2, "fp": 1, "tn": 4, "fn": 1},
+    "sensitivity": 2 / 3,
+    "specificity": 0.8,
+    "accuracy": 0.75,
+    "precision": 2 / 3,
+}
+
+
+def main():
+    failures = []
+
+    def check(name, actual, expected):
+        ok = actual == expected if isinstance(expected, (dict, list)) else bool(np.isclose(actual, expected))
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {actual} (expected {expected})")
+        if not ok:
+            failures.append(name)
+
+    metrics = binary_metrics(Y_TRUE, PROBS, 0.5)
+    for name, expected in EXPECTED.items():
+        check(f"binary_metrics {name}", metrics[name], expected)
+
+    tp, fp, tn, fn = confusion_at(Y_TRUE, PROBS, [0.0, 0.5, 1.0])
+    check("confusion_at tp", tp.tolist(), [3, 2, 0])
+    check("confusion_at fp", fp.tolist(), [5, 1, 0])
+    check("confusion_at tn", tn.tolist(), [0, 4, 5])
+    check("confusion_at fn", fn.tolist(), [0, 1, 3])
+
+    swept = sweep(Y_TRUE, PROBS, [0.5])
+    check("sweep sensitivity", float(swept["sensitivity"][0]), 2 / 3)
+    check("sweep specificity", float(swept["specificity"][0]), 0.8)
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll evaluation checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+In-process check of the gRPC front end (services/fastapi/app/grpc_service.py)
+
+Starts InferenceServicer on a free local port in front of a real
+InferenceEngine for --model, then exercises both RPCs through a grpc.aio
+client and fails (exit status 1) on any mismatch:
+
+  Predict        scores match the engine called directly, a repeated image
+                 is answered from the cache, undecodable and oversized
+                 images are rejected with INVALID_ARGUMENT
+  PredictStream  more requests than the stream window all come back,
+                 matched by request_id, with per-item errors and codes for
+                 bad images
+  status_for     admission rejections, unloaded models and server errors
+                 map to RESOURCE_EXHAUSTED, UNAVAILABLE and INTERNAL
+
+Usage:
+    python scripts/check_grpc.py --model /tmp/models/brain_tumor.onnx
+    python scripts/check_grpc.py --model brain_tumor.tflite --stream 32 --window 4
+"""
+
+import argparse
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICE_DIR = ROOT / "services" / "fastapi"
+sys.path.insert(0, str(SERVICE_DIR))
+# The service's app package must be bound before the repository root (with its own app.py) is on the path
+import app  # noqa: E402,F401
+sys.path.append(str(ROOT))
+
+import grpc  # noqa: E402
+
+from app import inference_pb2, inference_pb2_grpc  # noqa: E402
+from app.grpc_service import InferenceServicer, start_grpc_server, status_for  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from inference_core import InferenceEngine, backend_for_path, preprocess  # noqa: E402
+
+TOLERANCE = 1e-4
+
+
+def png(seed, size=(256, 256)):
+    """A distinct, deterministic test image."""
+    pixels = np.random.default_rng(seed).integers(0, 256, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels, "RGB").resize(size, Image.BILINEAR).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def direct_p_tumor(engine, data):
+    with Image.open(io.BytesIO(data)) as img:
+        return float(engine.predict_arrays(preprocess(img, engine.input_size))[0, 1])
+
+
+async def run_checks(engine, args):
+    failures = []
+
+    def check(name, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + (f": {detail}" if detail else ""))
+        if not ok:
+            failures.append(name)
+
+    servicer = InferenceServicer(engine, lambda: asyncio.to_thread(engine.load), stream_window=args.window)
+    server, port = await start_grpc_server(servicer, 0)
+    try:
+        async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+            stub = inference_pb2_grpc.InferenceStub(channel)
+
+            # Unary: first call loads the model through ensure_ready
+            image = png(0)
+            first = await stub.Predict(inference_pb2.PredictRequest(image=image, request_id="unary"), timeout=args.timeout)
+            expected = direct_p_tumor(engine, image)
+            check("Predict score", abs(first.p_tumor - expected) < TOLERANCE,
+                  f"{first.p_tumor:.6f} vs direct {expected:.6f}")
+            check("Predict label", first.label == int(first.p_tumor >= engine.threshold), f"label {first.label}")
+            check("Predict request_id", first.request_id == "unary")
+            check("Predict uncached", not first.cached)
+
+            again = await stub.Predict(inference_pb2.PredictRequest(image=image), timeout=args.timeout)
+            check("Predict cached repeat", again.cached and abs(again.p_tumor - first.p_tumor) < TOLERANCE)
+
+            try:
+                await stub.Predict(inference_pb2.PredictRequest(image=b"not an image"), timeout=args.timeout)
+                check("Predict rejects bad image", False, "no error raised")
+            except grpc.aio.AioRpcError as e:
+                check("Predict rejects bad image", e.code() == grpc.StatusCode.INVALID_ARGUMENT, str(e.code()))
+
+            oversized = image + bytes(servicer.max_image_bytes)
+            try:
+                await stub.Predict(inference_pb2.PredictRequest(image=oversized), timeout=args.timeout)
+                check("Predict rejects oversized image", False, "no error raised")
+            except grpc.aio.AioRpcError as e:
+                check("Predict rejects oversized image", e.code() == grpc.StatusCode.INVALID_ARGUMENT, str(e.code()))
+
+            # Streaming: more requests than the window, one undecodable
+            images = {f"s{i}": png(100 + i) for i in range(args.stream)}
+            bad_id = "s-bad"
+
+            async def requests():
+                for request_id, data in images.items():
+                    yield inference_pb2.PredictRequest(image=data, request_id=request_id)
+                yield inference_pb2.PredictRequest(image=b"\x89PNG broken", request_id=bad_id)
+
+            responses = {}
+            try:
+                async for response in stub.PredictStream(requests(), timeout=args.timeout):
+                    responses[response.request_id] = response
+            except grpc.aio.AioRpcError as e:
+                check("PredictStream completes", False, str(e.code()))
+            check("PredictStream response count", len(responses) == len(images) + 1,
+                  f"{len(responses)} of {len(images) + 1}")
+            bad = responses.get(bad_id, inference_pb2.PredictResponse())
+            check("PredictStream bad image error", bool(bad.error) and bad.code == grpc.StatusCode.INVALID_ARGUMENT.value[0],
+                  f"code {bad.code}")
+            mismatched = [
+                request_id for request_id, data in images.items()
+                if request_id not in responses or responses[request_id].error
+                or abs(responses[request_id].p_tumor - direct_p_tumor(engine, data)) >= TOLERANCE
+            ]
+            check("PredictStream scores", not mismatched, f"mismatched: {mismatched}" if mismatched else "")
+    finally:
+        await server.stop(grace=None)
+
+    unavailable = HTTPException(status_code=503, detail="Server is busy decoding other images.")
+    check("status_for admission 503", status_for(unavailable) == grpc.StatusCode.RESOURCE_EXHAUSTED)
+    check("status_for unloaded model",
+          status_for(RuntimeError("Model is not loaded"), engine_ready=False) == grpc.StatusCode.UNAVAILABLE)
+    check("status_for inference failure", status_for(RuntimeError("invoke failed")) == grpc.StatusCode.INTERNAL)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise the gRPC Predict and PredictStream RPCs in-process")
+    parser.add_argument("--model", required=True, help="Exported .tflite or .onnx model")
+    parser.add_argument("--stream", type=int, default=20, help="Images sent on the stream")
+    parser.add_argument("--timeout", type=float, default=60, help="Deadline per RPC (s)")
+    parser.add_argument("--window", type=int, default=4, help="Outstanding images per stream (GRPC_STREAM_WINDOW)")
+    args = parser.parse_args()
+
+    backend = backend_for_path(args.model)
+    if backend is None:
+        sys.exit(f"Unsupported model file: {args.model}")
+    engine = InferenceEngine(lambda: ({backend: args.model}, {}), backend=backend,
+                             benchmark_runs=0, calibration_runs=0, idle_minutes=0)
+    try:
+        failures = asyncio.run(run_checks(engine, args))
+    finally:
+        engine.close()
+
+    if failures:
+        print(f"\n❌ {len(failures)} gRPC check(s) failed")
+        sys.exit(1)
+    print("\n✅ gRPC checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Replay captured production traffic against a local API instance
+
+Reads the JSONL capture written by the FastAPI service (CAPTURE_PATH, plus
+its rotated .1 .. .N files) and re-issues every request with its original
+inter-arrival timing, optionally sped up, so latency and throughput are
+measured under the real mix of image sizes, formats and burstiness rather
+than the uniform gray images of smoke_test.py.
+
+Requests captured with CAPTURE_BYTES=true are replayed byte for byte.
+Otherwise an image of the recorded format, mode and dimensions is
+synthesized, seeded from the upload's hash: the same capture always yields
+the same payloads, and repeated uploads stay identical (so cache hits are
+reproduced). All payloads are built before the clock starts.
+
+Usage:
+    python scripts/replay_traffic.py /tmp/capture/traffic.jsonl
+    python scripts/replay_traffic.py traffic.jsonl --speed 4 --concurrency 32
+    python scripts/replay_traffic.py traffic.jsonl --speed 0 --limit 500     # as fast as possible
+    python scripts/replay_traffic.py traffic.jsonl --results replay.jsonl   # per-request results
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+_session = threading.local()
+
+
+def capture_files(path):
+    """The capture file and its rotated predecessors, oldest first."""
+    rotated = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        rotated.append(f"{path}.{i}")
+        i += 1
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+
+def load_capture(paths, endpoint=None, limit=None):
+    entries, malformed = [], 0
+    for path in paths:
+        files = capture_files(path)
+        if not files:
+            sys.exit(f"No capture found at {path}")
+        for name in files:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        malformed += 1  # e.g. a line cut short by a crash
+                        continue
+                    if endpoint is None or entry["endpoint"] == endpoint:
+                        entries.append(entry)
+    entries.sort(key=lambda e: e["ts"])
+    if malformed:
+        print(f"Skipped {malformed} malformed capture line(s)")
+    return entries[:limit] if limit else entries
+
+
+def seeded_rng(meta, seed):
+    """Random generator derived from the upload's hash, so payloads are identical on every replay."""
+    return np.random.default_rng(int(hashlib.sha256(f"{seed}:{meta.get('sha256')}".encode()).hexdigest()[:16], 16))
+
+
+def synthesize(meta, seed):
+    """A deterministic image with the recorded format, mode and dimensions."""
+    rng = seeded_rng(meta, seed)
+    width, height = meta["width"], meta["height"]
+    mode = meta.get("mode") or "RGB"
+    # Smooth structure plus mild noise compresses roughly like a scan, unlike pure noise
+    coarse = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    img = Image.fromarray(coarse, "RGB").resize((width, height), Image.BILINEAR)
+    pixels = np.asarray(img, dtype=np.int16) + rng.integers(-8, 9, (height, width, 3), dtype=np.int16)
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+    if mode != "RGB":
+        try:
+            img = img.convert(mode)
+        except ValueError:
+            pass
+    fmt = meta.get("format") or "PNG"
+    if fmt == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def build_payloads(entries, seed):
+    """Per request, a list of (filename, bytes, content_type); None when it cannot be rebuilt."""
+    synthesized = {}
+    stats = Counter()
+    payloads = []
+    for entry in entries:
+        parts = []
+        for i, meta in enumerate(entry["files"]):
+            if meta.get("data"):
+                data = base64.b64decode(meta["data"])
+                stats["captured"] += 1
+            elif meta.get("width") and meta.get("height"):
+                key = meta.get("sha256") or f"{entry['ts']}:{i}"
+                if key not in synthesized:
+                    synthesized[key] = synthesize(meta, seed)
+                data = synthesized[key]
+                stats["synthesized"] += 1
+                stats["recorded_bytes"] += meta.get("size") or 0
+                stats["synthesized_bytes"] += len(data)
+            elif meta.get("size"):
+                # Read but not decodable: opaque bytes of the same size reproduce the rejection
+                data = seeded_rng(meta, seed).integers(0, 256, meta["size"], dtype=np.uint8).tobytes()
+                stats["opaque"] += 1
+            else:
+                continue  # rejected before it was read; nothing to rebuild
+            content_type = meta.get("content_type") or CONTENT_TYPES.get(meta.get("format"), "image/png")
+            parts.append((meta.get("filename") or f"replay_{i}", data, content_type))
+        payloads.append(parts or None)
+    return payloads, stats
+
+
+def send(url, entry, parts, scheduled, timeout):
+    session = getattr(_session, "session", None)
+    if session is None:
+        session = _session.session = requests.Session()
+    started = time.perf_counter()
+    result = {
+        "ts": entry["ts"], "endpoint": entry["endpoint"], "lag_ms": (started - scheduled) * 1000,
+        "recorded_status": entry.get("status"), "recorded_server_ms": entry.get("server_ms"),
+    }
+    if entry["endpoint"] == "/predict/batch":
+        files = [("files", part) for part in parts]
+    else:
+        files = {"file": parts[0]}
+    try:
+        resp = session.post(url + entry["endpoint"], files=files, timeout=timeout)
+        result["status"] = resp.status_code
+        if resp.headers.get("content-type", "").startswith("application/json"):
+            result["server_ms"] = resp.json().get("processing_times", {}).get("total_ms")
+    except requests.RequestException as e:
+        result["status"] = None
+        result["error"] = str(e)
+    result["latency_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def percentiles(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return "n/a"
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return (f"p50 {statistics.median(values):8.1f}  p95 {pick(0.95):8.1f}  "
+            f"p99 {pick(0.99):8.1f}  max {values[-1]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured API traffic with its original timing")
+    parser.add_argument("capture", nargs="+", help="Capture file(s) written via CAPTURE_PATH")
+    parser.add_argument("--url", default="http://localhost:8080", help="Base URL of the instance under test")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression (2 = twice as fast, 0 = no delays)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument("--endpoint", choices=["/predict", "/predict/batch"], help="Only replay this endpoint")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthesized images")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout (s)")
+    parser.add_argument("--results", help="Write per-request results to this JSONL file")
+    args = parser.parse_args()
+
+    entries = load_capture(args.capture, args.endpoint, args.limit)
+    if not entries:
+        sys.exit("Capture contains no requests to replay")
+    payloads, built = build_payloads(entries, args.seed)
+    work = [(e, p) for e, p in zip(entries, payloads) if p is not None]
+    recorded_span = entries[-1]["ts"] - entries[0]["ts"]
+    print(f"Replaying {len(work)} of {len(entries)} request(s) spanning {recorded_span:.1f} s "
+          f"at {f'{args.speed}x' if args.speed > 0 else 'full'} speed against {args.url}")
+    print(f"Images: {built['captured']} captured, {built['synthesized']} synthesized, {built['opaque']} undecodable")
+    if built["synthesized"]:
+        print(f"  synthesized/recorded size: {built['synthesized_bytes'] / max(built['recorded_bytes'], 1):.2f}")
+
+    url = args.url.rstrip("/")
+    t0 = entries[0]["ts"]
+    futures = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        start = time.perf_counter()
+        for entry, parts in work:
+            scheduled = start + ((entry["ts"] - t0) / args.speed if args.speed > 0 else 0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, url, entry, parts, scheduled, args.timeout))
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    if args.results:
+        with open(args.results, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+
+    statuses = Counter(r["status"] for r in results)
+    mismatched = sum(1 for r in results if r["status"] != r["recorded_status"])
+    recorded_rate = f"{len(entries) / recorded_span:.1f} req/s" if recorded_span > 0 else "n/a"
+    print(f"\nSent {len(results)} request(s) in {elapsed:.1f} s "
+          f"({len(results) / max(elapsed, 1e-9):.1f} req/s; recorded {recorded_rate})")
+    print(f"Status codes: {dict(statuses)}  (differs from capture: {mismatched})")
+    print(f"Client latency      {percentiles(r['latency_ms'] for r in results)}")
+    print(f"Server total        {percentiles(r.get('server_ms') for r in results)}")
+    print(f"Recorded server     {percentiles(r['recorded_server_ms'] for r in results)}")
+    print(f"Schedule lag        {percentiles(r['lag_ms'] for r in results)}")
+    sys.exit(0 if statuses.get(None, 0) == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Memory-aware admission for image decoding.
+
+Each request is charged the bytes preprocess() is expected to allocate for
+its image (estimated from the header, before any pixel is decoded) against
+a process-wide budget. Requests that do not fit wait for earlier ones to
+release their share and are rejected with 503 if that takes too long, so a
+burst of 4096x4096 scans queues up instead of exhausting the container's
+memory, while small images keep flowing.
+
+A small sample of decodes is also measured with tracemalloc to check the
+estimate against real allocations.
+"""
+import asyncio
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import numpy as np
+from fastapi import HTTPException
+
+MB = 1024 * 1024
+
+
+class MemoryBudget:
+    def __init__(self, budget_bytes: int, timeout_s: float = 10.0):
+        self.budget = budget_bytes  # 0 disables admission control
+        self.timeout_s = timeout_s
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0}
+        self.wait_ms_total = 0.0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        """Hold `nbytes` of the budget for the duration of the block."""
+        if self.budget <= 0:
+            yield
+            return
+        # An image larger than the whole budget may still run, but only on its own
+        charge = min(nbytes, self.budget)
+        async with self._cond:
+            if self.in_use + charge > self.budget:
+                self.counters["queued"] += 1
+                self.waiting += 1
+                start = time.perf_counter()
+                try:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(lambda: self.in_use + charge <= self.budget), self.timeout_s
+                    )
+                except asyncio.TimeoutError:
+                    self.counters["rejected"] += 1
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Server is busy decoding other images. Please try again shortly.",
+                        headers={"Retry-After": "2"}
+                    )
+                finally:
+                    self.waiting -= 1
+                    self.wait_ms_total += (time.perf_counter() - start) * 1000
+            self.in_use += charge
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.counters["admitted"] += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_use -= charge
+                self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.budget > 0,
+            "budget_mb": round(self.budget / MB, 1),
+            "in_use_mb": round(self.in_use / MB, 1),
+            "peak_in_use_mb": round(self.peak_in_use / MB, 1),
+            "waiting": self.waiting,
+            **self.counters,
+            "wait_ms_total": round(self.wait_ms_total, 1),
+        }
+
+
+class AllocationSampler:
+    """
+    Measures peak traced allocations for a random share of calls.
+
+    tracemalloc is only switched on around a sampled call (one at a time),
+    so unsampled requests pay nothing. It sees Python and numpy allocations;
+    Pillow's own image buffers are allocated outside it, so measured peaks
+    are a lower bound on decode memory and the header estimate stays the
+    admission charge. Allocations made concurrently by other threads are
+    counted too.
+    """
+
+    def __init__(self, rate: float, maxlen: int = 256):
+        self.rate = rate
+        self.samples = deque(maxlen=maxlen)  # (peak bytes, estimated bytes, image pixels)
+        self._lock = threading.Lock()
+
+    def run(self, fn, estimate: int, img, *args):
+        """Call fn(img, *args), measuring it if sampled. Safe to call from worker threads."""
+        if self.rate <= 0 or random.random() >= self.rate or not self._lock.acquire(blocking=False):
+            return fn(img, *args)
+        try:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            try:
+                return fn(img, *args)
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                if started:
+                    tracemalloc.stop()
+                self.samples.append((peak - base, estimate, img.size[0] * img.size[1]))
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Dict:
+        if not self.samples:
+            return {"rate": self.rate, "count": 0}
+        peaks, estimates, pixels = (np.array(column, dtype=np.float64) for column in zip(*self.samples))
+        p50, p95 = np.percentile(peaks, [50, 95])
+        return {
+            "rate": self.rate,
+            "count": len(peaks),
+            "peak_p50_mb": round(float(p50) / MB, 2),
+            "peak_p95_mb": round(float(p95) / MB, 2),
+            "peak_max_mb": round(float(peaks.max()) / MB, 2),
+            "measured_to_estimate": round(float((peaks / estimates).mean()), 3),
+            "largest_image_mpx": round(float(pixels.max()) / 1e6, 2),
+        }
+
+
+def process_memory() -> Dict:
+    """Resident set size now (Linux) and its high-water mark."""
+    current = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    return {
+        "rss_mb": round(current / MB, 1) if current is not None else None,
+        "max_rss_mb": round(max_rss / MB, 1),
+    }
@@ -0,0 +1,166 @@
+"""
+Opt-in traffic capture for realistic load testing (see scripts/replay_traffic.py).
+
+Each prediction request is appended as one JSON line to a size-rotated file:
+arrival time, endpoint, status, server time and, per uploaded file, its
+size, content type, format, dimensions and content hash. With include_bytes the upload
+itself is stored too (base64), so a replay reproduces the exact images;
+without it the replay tool synthesizes images of the same format and size.
+
+Like the application logs, records are handed to a background thread via a
+bounded queue (app.logs), so capture never blocks a request; when the
+queue or its byte budget is full, records are dropped and counted. Work
+that needs the upload bytes (reading the header of a file the handler did
+not open, hashing one it did not hash, base64) is done on that thread too.
+Uploads are medical images: only store bytes where that is permitted.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from app.logs import REQUEST_ID, DroppingQueueHandler
+
+MB = 1024 * 1024
+
+
+class CaptureFileHandler(logging.handlers.RotatingFileHandler):
+    """Writes capture entries (record.msg dicts) as JSON lines, rotating by size."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int, include_bytes: bool = False, on_written=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.include_bytes = include_bytes
+        self.on_written = on_written
+
+    def format(self, record: logging.LogRecord) -> str:
+        # Serialized once per record; shouldRollover() and emit() both call format()
+        line = getattr(record, "capture_line", None)
+        if line is None:
+            entry = dict(record.msg)
+            entry["files"] = [self.complete(f) for f in entry["files"]]
+            line = record.capture_line = json.dumps(entry, separators=(",", ":"))
+        return line
+
+    def complete(self, entry: Dict) -> Dict:
+        """Fill in the fields TrafficCapture.file_entry left to this thread."""
+        entry = dict(entry)
+        raw = entry.pop("data", None)
+        if not raw:
+            return entry
+        if entry["width"] is None:
+            try:
+                with Image.open(io.BytesIO(raw)) as img:
+                    entry.update(format=img.format, width=img.size[0], height=img.size[1], mode=img.mode)
+            except Exception:
+                pass
+        if entry["sha256"] is None:
+            entry["sha256"] = hashlib.sha256(raw).hexdigest()
+        if self.include_bytes:
+            entry["data"] = base64.b64encode(raw).decode("ascii")
+        return entry
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            super().emit(record)
+        finally:
+            if self.on_written:
+                self.on_written(record)
+
+
+class TrafficCapture:
+    """Request recorder behind CAPTURE_PATH; record() is cheap and never blocks."""
+
+    def __init__(self, path: str, max_bytes: int = 100 * MB, backups: int = 5, include_bytes: bool = False,
+                 sample_rate: float = 1.0, queue_size: int = 256, max_pending_bytes: int = 64 * MB):
+        self.path = path
+        self.include_bytes = include_bytes
+        self.sample_rate = sample_rate
+        self.max_pending_bytes = max_pending_bytes
+        self.recorded = 0
+        self.dropped = 0
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+
+        file_handler = CaptureFileHandler(path, max_bytes, backups, include_bytes, on_written=self._written)
+        self._queue = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        self._listener = logging.handlers.QueueListener(self._queue.queue, file_handler)
+        self._listener.start()
+
+    def file_entry(self, raw: Optional[bytes], img=None, content_type: Optional[str] = None,
+                   filename: Optional[str] = None, sha256: Optional[str] = None) -> Dict:
+        """
+        Metadata for one uploaded file (header fields only; never decodes
+        pixels). Cheap enough for the event loop: attributes of an image the
+        handler already opened are copied, and `sha256` should be the
+        handler's content key; anything else is filled in by the listener.
+        """
+        entry = {
+            "filename": filename,
+            "content_type": content_type,
+            "size": len(raw) if raw is not None else None,
+            "format": getattr(img, "format", None),
+            "width": img.size[0] if img is not None else None,
+            "height": img.size[1] if img is not None else None,
+            "mode": getattr(img, "mode", None),
+            # Lets a replay without bytes reuse one synthetic image per distinct upload (cache hits)
+            "sha256": sha256,
+        }
+        if raw and (self.include_bytes or img is None or sha256 is None):
+            entry["data"] = raw  # counted against the pending byte budget until written
+        return entry
+
+    def record(self, endpoint: str, arrived: float, files: List[Dict], status: int, server_ms: float, **fields):
+        """Queue one request for the capture file (sampled; drops instead of blocking)."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        size = sum(len(f["data"]) for f in files if f.get("data"))
+        with self._lock:
+            if self._pending_bytes + size > self.max_pending_bytes:
+                self.dropped += 1
+                return
+            self._pending_bytes += size
+        record = logging.makeLogRecord({"msg": {
+            "ts": round(arrived, 6),
+            "endpoint": endpoint,
+            "request_id": REQUEST_ID.get(),
+            "status": status,
+            "server_ms": round(server_ms, 2),
+            **fields,
+            "files": files,
+        }})
+        record.capture_bytes = size
+        dropped_before = self._queue.dropped
+        self._queue.enqueue(record)
+        if self._queue.dropped != dropped_before:
+            self._written(record)
+            with self._lock:
+                self.dropped += 1
+
+    def _written(self, record: logging.LogRecord):
+        with self._lock:
+            self._pending_bytes -= getattr(record, "capture_bytes", 0)
+            if getattr(record, "capture_line", None) is not None:
+                self.recorded += 1
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "include_bytes": self.include_bytes,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending_mb": round(self._pending_bytes / MB, 2),
+        }
+
+    def stop(self):
+        self._listener.stop()
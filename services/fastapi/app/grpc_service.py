@@ -0,0 +1,194 @@
+"""
+Optional gRPC front end sharing the FastAPI process's InferenceEngine.
+
+Callers send raw image bytes and get a compact protobuf back, skipping
+multipart parsing and JSON. Requests from every RPC go through the same
+engine (and so the same micro-batching, result cache and interpreters) as
+/predict.
+
+Flow control: `max_inflight` bounds images being scored across all RPCs
+(unary calls wait for a slot), and each stream reads its next request only
+while it has fewer than `stream_window` outstanding. A stream that is
+ahead of the service stops being read, and HTTP/2 flow control pushes
+back on the client.
+
+Failures carry a gRPC status (the unary call's status, a stream item's
+`code`): INVALID_ARGUMENT for images that are empty, too large, unreadable
+or out of range, RESOURCE_EXHAUSTED when decode memory admission turns the
+image away, UNAVAILABLE while the model is not loaded, INTERNAL otherwise.
+"""
+import asyncio
+import io
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+import grpc
+import numpy as np
+from PIL import Image
+
+from app import inference_pb2, inference_pb2_grpc
+from inference_core import InferenceEngine, content_key, preprocess
+
+logger = logging.getLogger(__name__)
+
+# Raised by Pillow for data it cannot decode
+DECODE_ERRORS = (Image.UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError)
+_CODES = {code.value[0]: code for code in grpc.StatusCode}
+
+
+class InvalidImage(ValueError):
+    """The request's image is empty, too large, unreadable or outside the accepted size."""
+
+
+def status_for(e: Exception, engine_ready: bool = True) -> grpc.StatusCode:
+    """gRPC status for a failure while decoding or scoring an image."""
+    if isinstance(e, InvalidImage):
+        return grpc.StatusCode.INVALID_ARGUMENT
+    status_code = getattr(e, "status_code", None)  # HTTPException from the service's pipeline
+    if status_code == 503:
+        return grpc.StatusCode.RESOURCE_EXHAUSTED  # memory admission: retry after a short wait
+    if status_code is not None:
+        return grpc.StatusCode.INVALID_ARGUMENT if status_code < 500 else grpc.StatusCode.INTERNAL
+    if not engine_ready:
+        return grpc.StatusCode.UNAVAILABLE  # idle unload or failed load after the readiness check
+    if isinstance(e, DECODE_ERRORS):
+        return grpc.StatusCode.INVALID_ARGUMENT
+    return grpc.StatusCode.INTERNAL
+
+
+class InferenceServicer(inference_pb2_grpc.InferenceServicer):
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        ensure_ready: Callable[[], Awaitable[None]],
+        validate: Optional[Callable[[Image.Image], None]] = None,
+        score: Optional[Callable[[Image.Image, str], Awaitable[np.ndarray]]] = None,
+        max_inflight: int = 32,
+        stream_window: int = 8,
+        max_image_bytes: int = 10 * 1024 * 1024,
+        stats=None,
+    ):
+        self.engine = engine
+        self.ensure_ready = ensure_ready
+        self.validate = validate
+        # Decodes and scores an opened image, e.g. through the service's staged pipeline
+        self.score = score or self._score_directly
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.stream_window = stream_window
+        self.max_image_bytes = max_image_bytes
+        self.stats = stats
+
+    async def _score(self, request: inference_pb2.PredictRequest) -> inference_pb2.PredictResponse:
+        """Score one image; failures are reported in the response's error and code fields."""
+        start = time.perf_counter()
+        response = inference_pb2.PredictResponse(request_id=request.request_id)
+        try:
+            if not request.image:
+                raise InvalidImage("Empty image.")
+            if len(request.image) > self.max_image_bytes:
+                raise InvalidImage(f"Image too large. Maximum {self.max_image_bytes // (1024 * 1024)}MB allowed.")
+            key = content_key(request.image)
+            probs = self.engine.cache.get(key)
+            response.cached = probs is not None
+            if probs is None:
+                img = self._open(request.image)
+                async with self.inflight:
+                    probs = await self.score(img, key)
+            p_tumor = float(probs[1])
+            response.p_tumor = p_tumor
+            response.label = 1 if p_tumor >= self.engine.threshold else 0
+        except Exception as e:
+            code = status_for(e, self.engine.ready.is_set())
+            if code == grpc.StatusCode.INTERNAL:
+                logger.error("gRPC scoring failed", exc_info=True)
+            response.error = getattr(e, "detail", None) or str(e)
+            response.code = code.value[0]
+        response.server_ms = (time.perf_counter() - start) * 1000
+        if self.stats is not None:
+            self.stats.incr("grpc_requests")
+            self.stats.incr("errors" if response.error else "images")
+            if not response.error:
+                self.stats.record(grpc_total=response.server_ms)
+        return response
+
+    async def _score_directly(self, img: Image.Image, key: str) -> np.ndarray:
+        future = await asyncio.to_thread(lambda: self.engine.submit(preprocess(img), key))
+        return await asyncio.wrap_future(future)
+
+    def _open(self, data: bytes) -> Image.Image:
+        """Parse and validate the header only; pixels are decoded by preprocess()."""
+        try:
+            img = Image.open(io.BytesIO(data))
+            if self.validate:
+                self.validate(img)
+        except Exception as e:
+            raise InvalidImage(getattr(e, "detail", None) or str(e)) from e
+        return img
+
+    async def _ready(self, context) -> bool:
+        if not self.engine.ready.is_set():
+            try:
+                await self.ensure_ready()
+            except Exception as e:
+                logger.error(f"Model loading failed: {e}")
+        if not self.engine.ready.is_set():
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Model loading failed. Please try again later.")
+            return False
+        return True
+
+    async def Predict(self, request, context):
+        if not await self._ready(context):
+            return inference_pb2.PredictResponse()
+        response = await self._score(request)
+        if response.error:
+            await context.abort(_CODES[response.code], response.error)
+        return response
+
+    async def PredictStream(self, request_iterator, context):
+        if not await self._ready(context):
+            return
+        window = asyncio.Semaphore(self.stream_window)
+        done: asyncio.Queue = asyncio.Queue()
+        tasks = set()
+
+        async def read_requests():
+            async for request in request_iterator:
+                await window.acquire()  # stop reading while the window is full
+                task = asyncio.create_task(self._score(request))
+                tasks.add(task)
+                task.add_done_callback(lambda t: (tasks.discard(t), done.put_nowait(t)))
+            if tasks:
+                await asyncio.wait(set(tasks))
+            done.put_nowait(None)
+
+        reader = asyncio.create_task(read_requests())
+        try:
+            while True:
+                task = await done.get()
+                if task is None:
+                    break
+                # Responses are sent as they finish, not in request order
+                yield task.result()
+                window.release()
+            await reader
+        finally:
+            reader.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+
+async def start_grpc_server(servicer: InferenceServicer, port: int, max_concurrent_rpcs: Optional[int] = None):
+    """Start a grpc.aio server on `port` (0 picks a free port); returns (server, bound_port)."""
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
+        options=[
+            ("grpc.max_receive_message_length", 16 * 1024 * 1024),
+            ("grpc.max_send_message_length", 1024 * 1024),
+        ],
+    )
+    inference_pb2_grpc.add_InferenceServicer_to_server(servicer, server)
+    bound_port = server.add_insecure_port(f"[::]:{port}")
+    await server.start()
+    logger.info(f"gRPC server listening on port {bound_port}")
+    return server, bound_port
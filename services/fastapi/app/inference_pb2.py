@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: app/inference.proto
+# Protobuf Python Version: 4.25.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x61pp/inference.proto\x12\ttumorotak\"3\n\x0ePredictRequest\x12\r\n\x05image\x18\x01 \x01(\x0c\x12\x12\n\nrequest_id\x18\x02 \x01(\t\"\x85\x01\n\x0fPredictResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x0f\n\x07p_tumor\x18\x02 \x01(\x02\x12\r\n\x05label\x18\x03 \x01(\r\x12\x0e\n\x06\x63\x61\x63hed\x18\x04 \x01(\x08\x12\x11\n\tserver_ms\x18\x05 \x01(\x02\x12\r\n\x05\x65rror\x18\x06 \x01(\t\x12\x0c\n\x04\x63ode\x18\x07 \x01(\r2\x99\x01\n\tInference\x12@\n\x07Predict\x12\x19.tumorotak.PredictRequest\x1a\x1a.tumorotak.PredictResponse\x12J\n\rPredictStream\x12\x19.tumorotak.PredictRequest\x1a\x1a.tumorotak.PredictResponse(\x01\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'app.inference_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  DESCRIPTOR._options = None
+  _globals['_PREDICTREQUEST']._serialized_start=34
+  _globals['_PREDICTREQUEST']._serialized_end=85
+  _globals['_PREDICTRESPONSE']._serialized_start=88
+  _globals['_PREDICTRESPONSE']._serialized_end=221
+  _globals['_INFERENCE']._serialized_start=224
+  _globals['_INFERENCE']._serialized_end=377
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,146 @@
+"""
+Non-blocking structured logging for the API process.
+
+Request handlers only put LogRecords on a bounded in-memory queue; a
+QueueListener thread formats them (JSON by default, one object per line as
+Cloud Logging expects) and writes them to stdout. When the queue is full
+records are dropped and counted rather than blocking a request.
+
+Every record carries the current request ID, taken from the X-Request-ID
+header or generated by RequestIdMiddleware, and anything passed through
+`extra=` (stage timings, prediction, ...) becomes a top-level JSON field.
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+REQUEST_ID: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def record_extras(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with Cloud Logging's `severity`/`message` keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        entry.update(record_extras(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic text format with request ID and extras appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_extras(record)
+        if record.request_id:
+            fields = {"request_id": record.request_id, **fields}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and defers all formatting to the listener.
+    The queue is in-process, so records are passed as-is instead of being
+    pre-rendered (and pickle-proofed) on the caller's thread.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", queue_size: int = 10000):
+    """
+    Route all logging through a background listener; returns (listener, handler).
+    Call listener.stop() at shutdown to flush what is still queued.
+    """
+    q = queue.Queue(maxsize=queue_size)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    listener = logging.handlers.QueueListener(q, stream, respect_handler_level=False)
+
+    handler = DroppingQueueHandler(q)
+    handler.addFilter(RequestIdFilter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    listener.start()
+    return listener, handler
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware (no per-request task like BaseHTTPMiddleware) that
+    binds a request ID for the duration of each HTTP request and echoes it
+    back in the X-Request-ID response header.
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = REQUEST_ID.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST_ID.reset(token)
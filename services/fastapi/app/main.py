@@ -1,179 +1,365 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
-import asyncio, io, time, os, logging, hashlib, json
-from PIL import Image
-import numpy as np
-from typing import Optional
-import base64
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from app.startup import StartupTimer, register_image_formats
+
+# Cold-start report: every import/init phase below is timed (see /debug/startup)
+STARTUP = StartupTimer()
+
+with STARTUP.phase("import stdlib"):
+    import asyncio, atexit, io, time, os, sys, logging, random, shutil, tempfile
+    from contextlib import asynccontextmanager
+    from pathlib import Path
+    from typing import List, Optional
+    import base64
+
+with STARTUP.phase("import fastapi"):
+    from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Response
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+
+with STARTUP.phase("import numpy, pillow"):
+    from PIL import Image
+    import numpy as np
+
+from app.logs import RequestIdMiddleware, setup_logging
+
+# Setup logging: records are queued and written by a background thread
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # json | text
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.1))  # share of successful predictions logged
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))  # records buffered before new ones are dropped
+with STARTUP.phase("logging"):
+    LOG_LISTENER, LOG_HANDLER = setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE)
+atexit.register(LOG_LISTENER.stop)
 logger = logging.getLogger(__name__)
 
-# Fallback imports for environments without TFLite
+# Shared inference core (repository root in a source checkout, /app in the image)
+with STARTUP.phase("import inference_core"):
+    try:
+        import inference_core  # noqa: F401
+    except ImportError:
+        sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+    from inference_core import (
+        DEFAULT_LABELS, DEFAULT_THRESHOLD, Cascade, Ensemble, InferenceEngine, StageExecutor, available_backends, content_key,
+        effective_cpu_count, fetch_from_hub, load_cascade_band, open_volume, preprocess, preprocess_bytes, volume_formats,
+        VOLUME_BATCH, estimate_window, read_slice_batch, slice_batch_bytes, volume_result
+    )
+    from app.admission import AllocationSampler, MemoryBudget, process_memory
+    from app.metrics import LatencyWindow
+
+# Only the decoders for accepted uploads; Pillow would otherwise import all of its plugins
+with STARTUP.phase("pillow plugins"):
+    IMAGE_FORMATS = register_image_formats(("JPEG", "PNG", "WEBP"))
+
+# Fast JSON encoding (orjson) and optional MessagePack for machine clients.
+# msgpack is only imported by the first request that asks for it.
+import importlib.util
 try:
-    from huggingface_hub import hf_hub_download
-    import tflite_runtime.interpreter as tflite
-    TFLITE_AVAILABLE = True
+    import orjson
+
+    class FastJSONResponse(JSONResponse):
+        """JSONResponse rendered by orjson (numpy scalars/arrays included)."""
+
+        def render(self, content) -> bytes:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
 except ImportError:
-    TFLITE_AVAILABLE = False
-    logger.warning("TFLite not available - using mock model for testing")
+    FastJSONResponse = JSONResponse
+MSGPACK_AVAILABLE = importlib.util.find_spec("msgpack") is not None
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Inference runtimes and huggingface_hub are only located here (find_spec);
+# they are imported by the engine when the model is first loaded
+with STARTUP.phase("runtime discovery"):
+    AVAILABLE_BACKENDS = available_backends()
+    TFLITE_AVAILABLE = bool(AVAILABLE_BACKENDS) and importlib.util.find_spec("huggingface_hub") is not None
+if not TFLITE_AVAILABLE:
+    logger.warning("No inference runtime available - using mock model for testing")
 
 # Configuration from environment
 HF_REPO_ID = os.environ.get("HF_REPO_ID", "palawakampa/tumorotak")
 HF_FILENAME = os.environ.get("HF_FILENAME", "brain_tumor.tflite")
-ASSETS_FILENAME = "assets.json"
+HF_ONNX_FILENAME = os.environ.get("HF_ONNX_FILENAME", "")  # Optional ONNX export of the same model
+MODEL_DIR = os.environ.get("MODEL_DIR", "/tmp/models")
 MODEL_GCS_PATH = os.environ.get("MODEL_GCS_PATH", "")  # Optional GCS path
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "false").lower() in ("1", "true", "yes")
+BATCH_MAX_FILES = int(os.environ.get("PREDICT_BATCH_MAX_FILES", 32))
+VOLUME_MAX_BYTES = int(os.environ.get("VOLUME_MAX_MB", 512)) * 1024 * 1024
+METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", 2048))  # recent requests kept for percentiles
 PORT = int(os.environ.get("PORT", 8080))
+GRPC_PORT = int(os.environ.get("GRPC_PORT", 0))  # 0 = gRPC server disabled
+GRPC_MAX_INFLIGHT = int(os.environ.get("GRPC_MAX_INFLIGHT", 32))  # images scored at once across RPCs
+GRPC_STREAM_WINDOW = int(os.environ.get("GRPC_STREAM_WINDOW", 8))  # outstanding images per stream
+GRPC_MAX_CONCURRENT_RPCS = int(os.environ.get("GRPC_MAX_CONCURRENT_RPCS", 100))
+MEMORY_BUDGET_MB = int(os.environ.get("MEMORY_BUDGET_MB", 256))  # decode/preprocess memory in flight, 0 = off
+MEMORY_ADMISSION_TIMEOUT = float(os.environ.get("MEMORY_ADMISSION_TIMEOUT", 10))  # seconds queued before 503
+MEMORY_TRACE_RATE = float(os.environ.get("MEMORY_TRACE_RATE", 0.01))  # share of decodes measured by tracemalloc
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", 0)) or effective_cpu_count()[0]  # decode/preprocess threads
+CASCADE_SCREEN_FILENAME = os.environ.get("CASCADE_SCREEN_FILENAME", "")  # screening model in HF_REPO_ID, "" = no cascade
+CASCADE_BAND_FILE = os.environ.get("CASCADE_BAND_FILE", "")  # band from scripts/calibrate_cascade.py (overrides below)
+CASCADE_LOW = float(os.environ.get("CASCADE_LOW", 0.05))  # screen answers "no tumor" below this p_tumor
+CASCADE_HIGH = float(os.environ.get("CASCADE_HIGH", 1.0))  # screen answers "tumor" above this; 1.0 = never
+ENSEMBLE_MODELS = [f.strip() for f in os.environ.get("ENSEMBLE_MODELS", "").split(",") if f.strip()]  # files in HF_REPO_ID
+ENSEMBLE_WEIGHTS = [float(w) for w in os.environ.get("ENSEMBLE_WEIGHTS", "").split(",") if w.strip()]  # default equal
+ENSEMBLE_AGGREGATE = os.environ.get("ENSEMBLE_AGGREGATE", "mean")  # mean (weighted) | max (highest p_tumor)
+CAPTURE_PATH = os.environ.get("CAPTURE_PATH", "")  # JSONL traffic capture for scripts/replay_traffic.py, "" = off
+CAPTURE_BYTES = os.environ.get("CAPTURE_BYTES", "false").lower() in ("1", "true", "yes")  # also store uploads
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", 1.0))  # share of requests captured
+CAPTURE_MAX_MB = int(os.environ.get("CAPTURE_MAX_MB", 100))  # capture file size before rotation
+CAPTURE_BACKUPS = int(os.environ.get("CAPTURE_BACKUPS", 5))  # rotated capture files kept
 CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "*").split(",")
 
+# Upload validation limits
+ALLOWED_TYPES = {"image/jpeg", "image/png", "image/jpg", "image/webp"}
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MIN_SIDE, MAX_SIDE = 32, 4096
+
 # Global model state (singleton pattern for lazy loading)
-INTERP = None
-IN_DET = None
-OUT_DET = None
 READY = asyncio.Event()
 MODEL_LOAD_TIME = 0.0
 MODEL_SHA = None
-LABELS = ["No Tumor", "Tumor"]
-THRESH = 0.5
+LABELS = list(DEFAULT_LABELS)
+THRESH = DEFAULT_THRESHOLD
 MODEL_CONFIG = {}
-MODEL_LOADING = False
 MODEL_LOAD_LOCK = asyncio.Lock()
+MODEL_META = {}  # static part of /debug/model_meta, rebuilt once per model load
+STATS = LatencyWindow(METRICS_WINDOW)
+MEMORY_BUDGET = MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024, MEMORY_ADMISSION_TIMEOUT)
+ALLOCATIONS = AllocationSampler(MEMORY_TRACE_RATE)
+DECODE = StageExecutor("decode", DECODE_WORKERS)  # feeds the engine's bounded inference queue
+CAPTURE = None
+if CAPTURE_PATH:
+    from app.capture import TrafficCapture
+    CAPTURE = TrafficCapture(
+        CAPTURE_PATH, CAPTURE_MAX_MB * 1024 * 1024, CAPTURE_BACKUPS,
+        include_bytes=CAPTURE_BYTES, sample_rate=CAPTURE_SAMPLE_RATE
+    )
+    atexit.register(CAPTURE.stop)
+    logger.info(f"Capturing traffic to {CAPTURE_PATH} (bytes: {CAPTURE_BYTES}, sample rate: {CAPTURE_SAMPLE_RATE})")
+
+def fetch_model():
+    """Resolve the model artifacts to local paths (runs inside the engine's loader)."""
+    if MODEL_GCS_PATH and MODEL_GCS_PATH.startswith("gs://"):
+        logger.info(f"Downloading model from GCS: {MODEL_GCS_PATH}")
+        # TODO: Implement GCS download using google-cloud-storage
+        # For now, fall back to Hugging Face
+        logger.warning("GCS download not implemented, falling back to Hugging Face")
+
+    logger.info(f"Downloading model from Hugging Face: {HF_REPO_ID}/{HF_FILENAME}")
+    return fetch_from_hub(
+        HF_REPO_ID,
+        HF_FILENAME,
+        MODEL_DIR,
+        token=os.environ.get("HF_TOKEN"),
+        extra_files=[HF_ONNX_FILENAME] if "onnx" in AVAILABLE_BACKENDS else []
+    )
+
+ENGINE = InferenceEngine(fetch_model)
+
+# Optional cascade: a small screening model answers the clear cases and only
+# images in its uncertainty band reach the full model
+CASCADE = None
+if CASCADE_SCREEN_FILENAME:
+    def fetch_screen_model():
+        logger.info(f"Downloading screening model from Hugging Face: {HF_REPO_ID}/{CASCADE_SCREEN_FILENAME}")
+        return fetch_from_hub(
+            HF_REPO_ID, CASCADE_SCREEN_FILENAME, MODEL_DIR, token=os.environ.get("HF_TOKEN"), assets_filename=""
+        )
+
+    # A missing or invalid band file fails startup rather than silently changing who decides
+    CASCADE_BAND = load_cascade_band(CASCADE_BAND_FILE) if CASCADE_BAND_FILE else (CASCADE_LOW, CASCADE_HIGH)
+    CASCADE = Cascade(InferenceEngine(fetch_screen_model), ENGINE, *CASCADE_BAND)
+    logger.info(f"Cascade enabled: {CASCADE_SCREEN_FILENAME} screens, band {list(CASCADE_BAND)}")
+
+# Optional ensemble for /predict/ensemble: members run side by side, so each
+# plans its interpreters for its share of the CPU budget. HF_FILENAME in the
+# list reuses the primary engine instead of loading the model twice.
+ENSEMBLE = None
+if ENSEMBLE_MODELS:
+    def member_fetcher(filename: str):
+        return lambda: fetch_from_hub(
+            HF_REPO_ID, filename, MODEL_DIR, token=os.environ.get("HF_TOKEN"), assets_filename=""
+        )
+
+    ENSEMBLE = Ensemble(
+        {
+            filename: ENGINE if filename == HF_FILENAME
+            else InferenceEngine(member_fetcher(filename), cpu_share=1.0 / len(ENSEMBLE_MODELS))
+            for filename in ENSEMBLE_MODELS
+        },
+        weights=ENSEMBLE_WEIGHTS,
+        aggregate=ENSEMBLE_AGGREGATE,
+    )
+    logger.info(f"Ensemble enabled: {', '.join(ENSEMBLE_MODELS)} ({ENSEMBLE_AGGREGATE})")
+
+def check_image_size(img: Image.Image):
+    """Reject images outside the supported dimension range (header only)."""
+    if img.size[0] < MIN_SIDE or img.size[1] < MIN_SIDE:
+        raise HTTPException(
+            status_code=400,
+            detail="Image too small. Minimum 32x32 pixels."
+        )
+    if img.size[0] > MAX_SIDE or img.size[1] > MAX_SIDE:
+        raise HTTPException(
+            status_code=400,
+            detail="Image too large. Maximum 4096x4096 pixels."
+        )
 
-def preprocess(img: Image.Image, size=(224,224)):
-    """Preprocess image for ResNet50 model."""
-    img = img.convert("RGB").resize(size)
-    x = np.asarray(img).astype("float32") / 255.0
-    return np.expand_dims(x, axis=0)
+def stage_timings(request_start: float, preprocess_time: Optional[float], inference_time: Optional[float]) -> dict:
+    """Stage timings (ms) reached so far, for failure logs."""
+    timings = {"total_ms": round((time.time() - request_start) * 1000, 2)}
+    if preprocess_time is not None:
+        timings["preprocessing_ms"] = round(preprocess_time * 1000, 2)
+    if inference_time is not None:
+        timings["inference_ms"] = round(inference_time * 1000, 2)
+    return timings
 
-async def load_model_lazy():
+def build_model_meta() -> dict:
+    """Everything in /debug/model_meta that only changes when a model is loaded."""
+    engine_meta = ENGINE.meta()
+    return {
+        "labels": LABELS,
+        "output_shape": engine_meta["output_shape"],
+        "input_shape": engine_meta["input_shape"],
+        "preprocess": {
+            "size": MODEL_CONFIG.get("input_size", [224, 224, 3])[:2],
+            "rgb": True,
+            "scale": MODEL_CONFIG.get("scale", "x/255.0")
+        },
+        "tflite_sha": MODEL_SHA or "unknown",
+        "threshold": THRESH,
+        "model_config": MODEL_CONFIG,
+        "model_load_time": f"{MODEL_LOAD_TIME:.2f}s",
+        "tflite_available": TFLITE_AVAILABLE,
+        "available_backends": AVAILABLE_BACKENDS,
+        "volume_formats": volume_formats(),
+        "backend": engine_meta["backend"],
+        "thread_config": engine_meta["thread_config"],
+        "cascade": {
+            "screen_model": CASCADE_SCREEN_FILENAME,
+            "screen_sha": CASCADE.screen.model_sha or "unknown",
+            "band": [CASCADE.low, CASCADE.high],
+            "band_file": CASCADE_BAND_FILE or None,
+        } if CASCADE is not None else None,
+        "version": "2.0.0"
+    }
+
+def respond(content: dict, compact: Optional[dict], fmt: str, request: Request) -> Response:
+    """
+    Encode a prediction response.
+    format=json (default) returns the full body, format=compact only the
+    probabilities, and format=msgpack (or an Accept header asking for
+    MessagePack) the compact body as MessagePack.
+    """
+    accept = request.headers.get("accept", "")
+    if fmt == "msgpack" or any(t in accept for t in MSGPACK_TYPES):
+        if not MSGPACK_AVAILABLE:
+            raise HTTPException(status_code=406, detail="MessagePack responses are not available on this server.")
+        import msgpack
+        return Response(msgpack.packb(compact, use_bin_type=True), media_type="application/msgpack")
+    return FastJSONResponse(compact if fmt == "compact" else content)
+
+async def load_model_lazy(ensemble: bool = False):
     """
     Lazy load model on first request (singleton pattern).
-    Supports both Hugging Face and GCS sources with retry logic.
+    The engine handles download, retries, backend selection and pooling.
+    With ensemble=True the ENSEMBLE_MODELS members are loaded as well.
     """
-    global INTERP, IN_DET, OUT_DET, MODEL_LOAD_TIME, LABELS, THRESH, MODEL_CONFIG, MODEL_SHA, MODEL_LOADING
+    global MODEL_LOAD_TIME, LABELS, THRESH, MODEL_CONFIG, MODEL_SHA
+    
+    if ensemble and ENSEMBLE is not None:
+        # Labels and threshold come from the primary model; members load side by side
+        await load_model_lazy()
+        # Like the single-model path: no thread hop once every member is loaded
+        if TFLITE_AVAILABLE and not ENSEMBLE.ready:
+            await asyncio.to_thread(ENSEMBLE.load)
+        return
     
     # If already loaded, return immediately
-    if READY.is_set():
+    if READY.is_set() and not ENGINE.unloaded:
         return
     
     # Prevent concurrent loading
     async with MODEL_LOAD_LOCK:
         # Double-check after acquiring lock
         if READY.is_set():
+            if ENGINE.unloaded:
+                # Released after MODEL_IDLE_MINUTES without traffic: rebuild from local files
+                await asyncio.to_thread(ENGINE.load)
             return
         
-        if MODEL_LOADING:
-            # Wait for ongoing load
-            while not READY.is_set():
-                await asyncio.sleep(0.1)
-            return
-        
-        MODEL_LOADING = True
         start_time = time.time()
         
         if not TFLITE_AVAILABLE:
-            logger.warning("TFLite not available - using mock model")
-            READY.set()
+            logger.warning("No inference runtime available - using mock model")
             MODEL_LOAD_TIME = time.time() - start_time
-            MODEL_LOADING = False
+            MODEL_META.update(build_model_meta())
+            READY.set()
             return
         
-        max_retries = 3
-        retry_delay = 2
+        try:
+            await asyncio.to_thread(CASCADE.load if CASCADE is not None else ENGINE.load)
+        except Exception:
+            logger.error("All model loading attempts failed")
+            # Set ready anyway to prevent blocking
+            MODEL_LOAD_TIME = time.time() - start_time
+            MODEL_META.update(build_model_meta())
+            READY.set()
+            raise
         
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"Loading model (attempt {attempt + 1}/{max_retries})...")
-                
-                # Try GCS first if configured
-                if MODEL_GCS_PATH and MODEL_GCS_PATH.startswith("gs://"):
-                    logger.info(f"Downloading model from GCS: {MODEL_GCS_PATH}")
-                    # TODO: Implement GCS download using google-cloud-storage
-                    # For now, fall back to Hugging Face
-                    logger.warning("GCS download not implemented, falling back to Hugging Face")
-                
-                # Download from Hugging Face
-                logger.info(f"Downloading model from Hugging Face: {HF_REPO_ID}/{HF_FILENAME}")
-                model_path = hf_hub_download(
-                    repo_id=HF_REPO_ID,
-                    filename=HF_FILENAME,
-                    cache_dir="/tmp",
-                    token=os.environ.get("HF_TOKEN")
-                )
-                
-                # Try to load assets.json
-                try:
-                    assets_path = hf_hub_download(
-                        repo_id=HF_REPO_ID,
-                        filename=ASSETS_FILENAME,
-                        cache_dir="/tmp",
-                        token=os.environ.get("HF_TOKEN")
-                    )
-                    with open(assets_path, 'r') as f:
-                        MODEL_CONFIG = json.load(f)
-                    LABELS = MODEL_CONFIG.get("labels", ["No Tumor", "Tumor"])
-                    THRESH = MODEL_CONFIG.get("threshold", 0.5)
-                    logger.info(f"Loaded model config: {MODEL_CONFIG}")
-                except Exception as e:
-                    logger.warning(f"Could not load assets.json: {e}, using defaults")
-                
-                # Load TFLite model
-                logger.info(f"Loading TFLite interpreter from {model_path}")
-                INTERP = tflite.Interpreter(
-                    model_path=model_path,
-                    num_threads=1
-                )
-                INTERP.allocate_tensors()
-                
-                # Cache input/output details
-                IN_DET = INTERP.get_input_details()[0]
-                OUT_DET = INTERP.get_output_details()[0]
-                
-                # Calculate model SHA
-                with open(model_path, 'rb') as f:
-                    MODEL_SHA = hashlib.sha256(f.read()).hexdigest()[:8]
-                
-                MODEL_LOAD_TIME = time.time() - start_time
-                READY.set()
-                MODEL_LOADING = False
-                logger.info(f"✅ Model loaded successfully in {MODEL_LOAD_TIME:.2f}s (SHA: {MODEL_SHA})")
-                return
-                
-            except Exception as e:
-                logger.error(f"Model loading attempt {attempt + 1} failed: {e}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay}s...")
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                else:
-                    logger.error("All model loading attempts failed")
-                    # Set ready anyway to prevent blocking
-                    READY.set()
-                    MODEL_LOADING = False
-                    MODEL_LOAD_TIME = time.time() - start_time
-                    raise
+        MODEL_CONFIG = ENGINE.assets
+        LABELS = ENGINE.labels
+        THRESH = ENGINE.threshold
+        MODEL_SHA = ENGINE.model_sha
+        MODEL_LOAD_TIME = time.time() - start_time
+        MODEL_META.update(build_model_meta())
+        READY.set()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle startup and shutdown events."""
     logger.info(f"🚀 Starting FastAPI application on port {PORT}")
     logger.info(f"CORS origins: {CORS_ORIGINS}")
-    logger.info(f"Model will be lazy-loaded on first request")
+    if MODEL_PRELOAD and TFLITE_AVAILABLE:
+        logger.info("Preloading model in the background")
+        ENGINE.start_background_load()
+        if CASCADE is not None:
+            CASCADE.screen.start_background_load()
+    else:
+        logger.info(f"Model will be lazy-loaded on first request")
+    grpc_server = None
+    if GRPC_PORT and TFLITE_AVAILABLE:
+        with STARTUP.phase("grpc server"):
+            from app.grpc_service import InferenceServicer, start_grpc_server
+            servicer = InferenceServicer(
+                ENGINE, load_model_lazy, validate=check_image_size, score=score_image,
+                max_inflight=GRPC_MAX_INFLIGHT, stream_window=GRPC_STREAM_WINDOW, max_image_bytes=MAX_UPLOAD_BYTES,
+                stats=STATS
+            )
+            grpc_server, _ = await start_grpc_server(servicer, GRPC_PORT, GRPC_MAX_CONCURRENT_RPCS)
+    elif GRPC_PORT:
+        logger.warning("gRPC server disabled: no inference runtime available")
+    STARTUP.checkpoint("server start")
+    logger.info(f"Startup: {STARTUP.summary()}", extra={"startup": STARTUP.report()})
     yield
+    if grpc_server is not None:
+        await grpc_server.stop(grace=5)
+    ENGINE.close()
+    if CASCADE is not None:
+        CASCADE.close()
+    if ENSEMBLE is not None:
+        for member in ENSEMBLE.members.values():
+            member.close()
+    DECODE.shutdown()
     logger.info("Shutting down application")
 
 app = FastAPI(
     title="Brain Tumor Detection API",
     description="FastAPI backend for brain tumor detection using TFLite model",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+app.add_middleware(RequestIdMiddleware)
+
 # CORS middleware with configurable origins
 app.add_middleware(
     CORSMiddleware,
@@ -183,19 +369,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+ROOT_BODY = FastJSONResponse({
+    "message": "Brain Tumor Detection API",
+    "version": "2.0.0",
+    "docs": "/docs",
+    "health": "/health",
+    "endpoints": {
+        "predict": "/predict",
+        "predict_batch": "/predict/batch",
+        "predict_ensemble": "/predict/ensemble",
+        "predict_volume": "/predict/volume",
+        "model_meta": "/debug/model_meta",
+        "stats": "/debug/stats",
+        "memory": "/debug/memory",
+        "startup": "/debug/startup"
+    }
+}).body
+
 @app.get("/")
 def root():
-    """Root endpoint with API information."""
-    return {
-        "message": "Brain Tumor Detection API",
-        "version": "2.0.0",
-        "docs": "/docs",
-        "health": "/health",
-        "endpoints": {
-            "predict": "/predict",
-            "model_meta": "/debug/model_meta"
-        }
-    }
+    """Root endpoint with API information (encoded once at import)."""
+    return Response(ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 def health():
@@ -215,40 +409,118 @@ async def model_meta():
         except Exception as e:
             return {"error": f"Model loading failed: {str(e)}"}
     
-    output_shape = OUT_DET['shape'].tolist() if OUT_DET else None
-    input_shape = IN_DET['shape'].tolist() if IN_DET else None
+    # Static metadata is built once per load; only the live counters are read here
+    # (ensemble members load on first use, so they are described live too)
+    return FastJSONResponse({
+        **MODEL_META,
+        "model_loaded": READY.is_set(),
+        "ensemble": ENSEMBLE.describe() if ENSEMBLE is not None else None,
+        **ENGINE.live_stats()
+    })
+
+@app.get("/debug/stats")
+def stats():
+    """
+    Rolling request statistics for the operator dashboard.
+    Percentiles cover the last METRICS_WINDOW requests; counters are cumulative.
+    Never triggers a model load.
+    """
+    return FastJSONResponse({
+        **STATS.snapshot(),
+        "model_loaded": ENGINE.ready.is_set(),
+        "model_load_time_s": round(ENGINE.load_time, 3),
+        "logs_dropped": LOG_HANDLER.dropped,
+        "capture": CAPTURE.stats() if CAPTURE is not None else None,
+        "decode_stage": {**DECODE.stats(), "waiting_for_memory": MEMORY_BUDGET.waiting},
+        "cascade": CASCADE.stats() if CASCADE is not None else None,
+        "ensemble": ENSEMBLE.stats() if ENSEMBLE is not None else None,
+        **ENGINE.live_stats(),
+    })
 
+@app.get("/debug/startup")
+def startup_report():
+    """
+    Cold-start timing: each import/init phase of this process, measured from
+    the first line of main.py, plus the model load (lazy, so usually on the
+    first request). Never triggers a model load.
+    """
     return {
-        "labels": LABELS,
-        "output_shape": output_shape,
-        "input_shape": input_shape,
-        "preprocess": {
-            "size": MODEL_CONFIG.get("input_size", [224, 224, 3])[:2],
-            "rgb": True,
-            "scale": MODEL_CONFIG.get("scale", "x/255.0")
-        },
-        "tflite_sha": MODEL_SHA or "unknown",
-        "threshold": THRESH,
-        "model_config": MODEL_CONFIG,
-        "model_load_time": f"{MODEL_LOAD_TIME:.2f}s",
-        "model_loaded": READY.is_set(),
-        "tflite_available": TFLITE_AVAILABLE,
-        "version": "2.0.0"
+        **STARTUP.report(),
+        "image_formats": IMAGE_FORMATS,
+        "model_loaded": ENGINE.ready.is_set(),
+        "model_load_time_s": round(ENGINE.load_time, 3),
+    }
+
+@app.get("/debug/memory")
+def memory():
+    """
+    Decode memory admission: budget in use, queued/rejected requests, sampled
+    tracemalloc peaks per decode and the process RSS.
+    """
+    return {
+        "admission": MEMORY_BUDGET.stats(),
+        "allocations": ALLOCATIONS.stats(),
+        "process": process_memory(),
     }
 
+async def decode_stage(fn, img: Image.Image, *args):
+    """
+    Run fn(img, *args) on the decode pool once the image's estimated decode
+    memory fits the budget (queues, or raises 503 after MEMORY_ADMISSION_TIMEOUT).
+    """
+    estimate = preprocess_bytes(img)
+    async with MEMORY_BUDGET.reserve(estimate):
+        return await asyncio.wrap_future(DECODE.submit(ALLOCATIONS.run, fn, estimate, img, *args))
+
+def capture(endpoint: str, request_start: float, status: int, uploads: list, **fields):
+    """
+    Append a request to the traffic capture, if enabled; uploads are
+    (raw, img, content_type, filename[, sha256]). Pass the content key when
+    the handler has one, so the upload is not hashed again.
+    """
+    if CAPTURE is not None:
+        files = [CAPTURE.file_entry(*upload) for upload in uploads]
+        CAPTURE.record(endpoint, request_start, files, status, (time.time() - request_start) * 1000, **fields)
+
+def preprocess_and_queue(img: Image.Image, cache_key: str):
+    """
+    Decode-stage work for one image: preprocess, then hand the tensor to the
+    inference stage. Blocks this decode worker (not the event loop) while
+    the inference queue is full; returns the engine's (or cascade's) result future.
+    """
+    if CASCADE is not None:
+        return CASCADE.submit(*CASCADE.preprocess(img), cache_key)
+    return ENGINE.submit(preprocess(img), cache_key)
+
+async def scored(queued) -> tuple:
+    """(probs, stage that decided) from a preprocess_and_queue() future."""
+    result = await asyncio.wrap_future(queued)
+    return result if CASCADE is not None else (result, "full")
+
+async def score_image(img: Image.Image, cache_key: str) -> np.ndarray:
+    """Both pipeline stages for one image; the engine must be loaded."""
+    probs, _ = await scored(await decode_stage(preprocess_and_queue, img, cache_key))
+    return probs
+
 @app.post("/predict")
 async def predict(
+    request: Request,
     file: Optional[UploadFile] = File(None),
-    image_base64: Optional[str] = None
+    image_base64: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|compact|msgpack)$")
 ):
     """
     Predict brain tumor from image.
     Accepts either multipart/form-data (file) or JSON with base64 image.
+    ?format=compact|msgpack returns only [p_normal, p_tumor] for machine clients.
     """
     request_start = time.time()
+    preprocess_time = inference_time = None
+    raw = img = cache_key = None
+    source = (file.content_type, file.filename) if file else (None, None)  # for the traffic capture
     
-    # Lazy load model on first request
-    if not READY.is_set():
+    # Lazy load model on first request (or reload after an idle unload)
+    if not READY.is_set() or ENGINE.unloaded:
         logger.info("Model not loaded, triggering lazy load...")
         try:
             await load_model_lazy()
@@ -256,18 +528,18 @@ async def predict(
             logger.error(f"Model loading failed: {e}")
             raise HTTPException(
                 status_code=503,
-                detail="Model loading failed. Please try again later."
+                detail="Model loading failed. Please try again later.",
+                headers={"Retry-After": "5"}
             )
     
     # Parse image from either file upload or base64
     try:
         if file:
             # Validate file type
-            allowed_types = {"image/jpeg", "image/png", "image/jpg"}
-            if file.content_type not in allowed_types:
+            if file.content_type not in ALLOWED_TYPES:
                 raise HTTPException(
                     status_code=400,
-                    detail="File must be JPG or PNG image."
+                    detail="File must be JPG, PNG or WebP image."
                 )
             
             # Read file
@@ -276,20 +548,20 @@ async def predict(
                 raise HTTPException(status_code=400, detail="Empty file uploaded.")
             
             # Check file size (max 10MB)
-            max_size = 10 * 1024 * 1024
-            if len(contents) > max_size:
+            if len(contents) > MAX_UPLOAD_BYTES:
                 raise HTTPException(
                     status_code=400,
                     detail="File too large. Maximum 10MB allowed."
                 )
             
+            raw = contents
             img = Image.open(io.BytesIO(contents))
             
         elif image_base64:
             # Decode base64 image
             try:
-                image_data = base64.b64decode(image_base64)
-                img = Image.open(io.BytesIO(image_data))
+                raw = base64.b64decode(image_base64)
+                img = Image.open(io.BytesIO(raw))
             except Exception as e:
                 raise HTTPException(
                     status_code=400,
@@ -302,46 +574,35 @@ async def predict(
             )
         
         # Validate image dimensions
-        if img.size[0] < 32 or img.size[1] < 32:
-            raise HTTPException(
-                status_code=400,
-                detail="Image too small. Minimum 32x32 pixels."
-            )
-        if img.size[0] > 4096 or img.size[1] > 4096:
-            raise HTTPException(
-                status_code=400,
-                detail="Image too large. Maximum 4096x4096 pixels."
-            )
+        check_image_size(img)
         
-        # Preprocess with timing
+        # Identical uploads are answered from the engine's result cache
+        cache_key = content_key(raw)
+        cached = ENGINE.cache.get(cache_key) if TFLITE_AVAILABLE else None
+        
+        # Decode stage with timing (admitted against the decode memory budget);
+        # it queues the tensor for the inference stage itself
         preprocess_start = time.time()
-        x = preprocess(img)
+        queued = None
+        if cached is None:
+            if TFLITE_AVAILABLE and ENGINE.ready.is_set():
+                queued = await decode_stage(preprocess_and_queue, img, cache_key)
+            else:
+                await decode_stage(preprocess, img)
         preprocess_time = time.time() - preprocess_start
         
-        # Inference with timing
+        # Inference with timing (micro-batched across concurrent requests)
         inference_start = time.time()
-        if TFLITE_AVAILABLE and INTERP:
-            INTERP.set_tensor(IN_DET["index"], x)
-            INTERP.invoke()
-            probs = INTERP.get_tensor(OUT_DET["index"])[0]
+        if cached is not None:
+            probs, decided_by = cached, "cache"
+        elif queued is not None:
+            probs, decided_by = await scored(queued)
         else:
             # Mock prediction for testing
-            logger.warning("Using mock prediction (TFLite not available)")
-            probs = np.array([0.7, 0.3])
+            logger.warning("Using mock prediction (no inference backend available)")
+            probs, decided_by = np.array([0.7, 0.3]), "mock"
         inference_time = time.time() - inference_start
-        
-        # Handle different output shapes
-        if len(probs.shape) == 2 and probs.shape[1] == 2:
-            probs_list = [float(probs[0][0]), float(probs[0][1])]
-        elif len(probs.shape) == 1 and probs.shape[0] == 2:
-            probs_list = [float(probs[0]), float(probs[1])]
-        elif len(probs.shape) == 1 and probs.shape[0] == 1:
-            # Sigmoid output
-            p_tumor = float(probs[0])
-            probs_list = [1.0 - p_tumor, p_tumor]
-        else:
-            logger.error(f"Unexpected model output shape: {probs.shape}")
-            probs_list = [0.5, 0.5]
+        probs_list = [float(probs[0]), float(probs[1])]
         
         # Get prediction
         p_tumor = probs_list[1]
@@ -349,13 +610,29 @@ async def predict(
         confidence = max(probs_list)
         
         total_time = time.time() - request_start
-        
-        logger.info(
-            f"Prediction: {prediction} (confidence: {confidence:.4f}, "
-            f"total_time: {total_time*1000:.2f}ms)"
+        timings = {
+            "preprocessing_ms": round(preprocess_time * 1000, 2),
+            "inference_ms": round(inference_time * 1000, 2),
+            "total_ms": round(total_time * 1000, 2)
+        }
+        STATS.incr("predict_requests")
+        STATS.incr("images")
+        STATS.incr("cache_hits" if cached is not None else "cache_misses")
+        STATS.record(
+            preprocessing=None if cached is not None else preprocess_time * 1000,
+            inference=None if cached is not None else inference_time * 1000,
+            total=total_time * 1000,
         )
         
-        return {
+        # Successful predictions are sampled; failures below are always logged
+        if random.random() < LOG_SAMPLE_RATE:
+            logger.info("prediction", extra={
+                "event": "predict", "prediction": prediction, "confidence": round(confidence, 4),
+                "cached": cached is not None, "decided_by": decided_by, "timings_ms": timings
+            })
+        capture("/predict", request_start, 200, [(raw, img, *source, cache_key)], cached=cached is not None)
+        
+        return respond({
             "success": True,
             "prediction": prediction,
             "confidence": round(confidence, 4),
@@ -365,18 +642,406 @@ async def predict(
             },
             "threshold": THRESH,
             "model_sha": MODEL_SHA or "unknown",
-            "processing_times": {
-                "preprocessing_ms": round(preprocess_time * 1000, 2),
-                "inference_ms": round(inference_time * 1000, 2),
-                "total_ms": round(total_time * 1000, 2)
-            }
+            "cached": cached is not None,
+            "decided_by": decided_by,
+            "processing_times": timings
+        }, {"probabilities": probs_list}, fmt, request)
+    
+    except HTTPException as e:
+        STATS.incr("errors")
+        logger.warning("prediction rejected", extra={
+            "event": "predict", "status": e.status_code, "detail": e.detail,
+            "timings_ms": stage_timings(request_start, preprocess_time, inference_time)
+        })
+        capture("/predict", request_start, e.status_code, [(raw, img, *source, cache_key)])
+        raise
+    except Exception as e:
+        STATS.incr("errors")
+        logger.error("prediction failed", exc_info=True, extra={
+            "event": "predict", "status": 500, "detail": str(e),
+            "timings_ms": stage_timings(request_start, preprocess_time, inference_time)
+        })
+        capture("/predict", request_start, 500, [(raw, img, *source, cache_key)])
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing image: {str(e)}"
+        )
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    fmt: str = Query("json", alias="format", pattern="^(json|compact|msgpack)$")
+):
+    """
+    Predict several images in one request.
+    Valid images are preprocessed and scored in a single batched invoke;
+    invalid ones get a per-item error instead of failing the whole batch.
+    ?format=compact|msgpack returns one [p_normal, p_tumor] (or null) per file.
+    """
+    request_start = time.time()
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum {BATCH_MAX_FILES} per batch."
+        )
+    
+    if not READY.is_set() or ENGINE.unloaded:
+        try:
+            await load_model_lazy()
+        except Exception as e:
+            logger.error(f"Model loading failed: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Model loading failed. Please try again later.",
+                headers={"Retry-After": "5"}
+            )
+    
+    async def decode(item: dict, key: str, img: Image.Image):
+        preprocess_start = time.time()
+        try:
+            x = await decode_stage(CASCADE.preprocess if CASCADE is not None else preprocess, img)
+        except HTTPException as e:
+            item["error"] = e.detail
+            return None
+        except Exception as e:
+            item["error"] = f"Error processing image: {str(e)}"
+            return None
+        item.update(cached=False, preprocessing_ms=round((time.time() - preprocess_start) * 1000, 2))
+        return item, key, x
+    
+    results = []
+    decodes = []
+    uploads = []
+    for file in files:
+        item = {"filename": file.filename, "success": False}
+        results.append(item)
+        try:
+            if file.content_type not in ALLOWED_TYPES:
+                raise HTTPException(status_code=400, detail="File must be JPG, PNG or WebP image.")
+            contents = await file.read()
+            valid = 0 < len(contents) <= MAX_UPLOAD_BYTES
+            key = content_key(contents) if valid else None
+            uploads.append((contents, None, file.content_type, file.filename, key))
+            if not valid:
+                raise HTTPException(status_code=400, detail="File empty or larger than 10MB.")
+            
+            cached = ENGINE.cache.get(key) if TFLITE_AVAILABLE else None
+            if cached is not None:
+                item.update(probs=cached, cached=True, decided_by="cache", preprocessing_ms=0.0)
+                continue
+            
+            img = Image.open(io.BytesIO(contents))
+            check_image_size(img)
+            decodes.append(decode(item, key, img))
+        except HTTPException as e:
+            item["error"] = e.detail
+        except Exception as e:
+            item["error"] = f"Error processing image: {str(e)}"
+    
+    # All files decode concurrently on the decode pool, then share one invoke
+    decoded = [d for d in await asyncio.gather(*decodes) if d is not None]
+    pending = [(item, key) for item, key, _ in decoded]
+    tensors = [x for _, _, x in decoded]
+    
+    inference_ms = 0.0
+    if tensors:
+        inference_start = time.time()
+        if TFLITE_AVAILABLE and ENGINE.ready.is_set():
+            if CASCADE is not None:
+                # One screening invoke for all files, one full invoke for the uncertain ones
+                probs, stages = await asyncio.to_thread(
+                    CASCADE.predict_arrays,
+                    np.concatenate([xs for xs, _ in tensors], axis=0),
+                    np.concatenate([xf for _, xf in tensors], axis=0),
+                )
+            else:
+                probs = await asyncio.to_thread(ENGINE.predict_arrays, np.concatenate(tensors, axis=0))
+                stages = ["full"] * len(probs)
+            for (item, key), p, stage in zip(pending, probs, stages):
+                ENGINE.cache.put(key, p)
+                item.update(probs=p, decided_by=stage)
+        else:
+            logger.warning("Using mock prediction (no inference backend available)")
+            for item, _ in pending:
+                item.update(probs=np.array([0.7, 0.3]), decided_by="mock")
+        inference_ms = round((time.time() - inference_start) * 1000, 2)
+    
+    compact = []
+    for item in results:
+        probs = item.pop("probs", None)
+        if probs is None:
+            compact.append(None)
+            continue
+        compact.append([float(probs[0]), float(probs[1])])
+        p_normal, p_tumor = float(probs[0]), float(probs[1])
+        item.update(
+            success=True,
+            prediction=LABELS[1] if p_tumor >= THRESH else LABELS[0],
+            confidence=round(max(p_normal, p_tumor), 4),
+            probabilities={LABELS[0]: round(p_normal, 4), LABELS[1]: round(p_tumor, 4)},
+        )
+    
+    total_time = time.time() - request_start
+    STATS.incr("batch_requests")
+    STATS.incr("images", sum(1 for item in results if item["success"]))
+    STATS.incr("errors", sum(1 for item in results if not item["success"]))
+    STATS.record(batch_inference=inference_ms if tensors else None, batch_total=total_time * 1000)
+    failed = [{"filename": item["filename"], "error": item["error"]} for item in results if not item["success"]]
+    if failed or random.random() < LOG_SAMPLE_RATE:
+        (logger.warning if failed else logger.info)("batch prediction", extra={
+            "event": "predict_batch", "files": len(files), "inferred": len(tensors), "failed": failed,
+            "timings_ms": {"inference_ms": inference_ms, "total_ms": round(total_time * 1000, 2)}
+        })
+    capture("/predict/batch", request_start, 200, uploads, failed=len(failed))
+    return respond({
+        "success": True,
+        "count": len(results),
+        "results": results,
+        "threshold": THRESH,
+        "model_sha": MODEL_SHA or "unknown",
+        "processing_times": {
+            "inference_ms": inference_ms,
+            "total_ms": round(total_time * 1000, 2)
         }
+    }, {"probabilities": compact}, fmt, request)
+
+def ensemble_and_queue(img: Image.Image, cache_key: str):
+    """Decode-stage work for /predict/ensemble: shared preprocessing, then every member's queue."""
+    return ENSEMBLE.submit(ENSEMBLE.preprocess(img), cache_key)
+
+@app.post("/predict/ensemble")
+async def predict_ensemble(
+    request: Request,
+    file: UploadFile = File(...),
+    fmt: str = Query("json", alias="format", pattern="^(json|compact|msgpack)$")
+):
+    """
+    Score one image with every ENSEMBLE_MODELS member concurrently.
+    Returns the aggregated and per-model probabilities; latency follows the
+    slowest member rather than the sum of all of them.
+    ?format=compact|msgpack returns [p_normal, p_tumor] plus one pair per member.
+    """
+    if ENSEMBLE is None:
+        raise HTTPException(status_code=404, detail="Ensemble mode is not enabled (set ENSEMBLE_MODELS).")
+    request_start = time.time()
+    preprocess_time = inference_time = None
     
-    except HTTPException:
+    try:
+        await load_model_lazy(ensemble=True)
+    except Exception as e:
+        logger.error(f"Ensemble loading failed: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Model loading failed. Please try again later.",
+            headers={"Retry-After": "5"}
+        )
+    
+    try:
+        if file.content_type not in ALLOWED_TYPES:
+            raise HTTPException(status_code=400, detail="File must be JPG, PNG or WebP image.")
+        contents = await file.read()
+        if not contents or len(contents) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail="File empty or larger than 10MB.")
+        img = Image.open(io.BytesIO(contents))
+        check_image_size(img)
+        
+        cache_key = content_key(contents)
+        cached = ENSEMBLE.cache.get(cache_key) if TFLITE_AVAILABLE else None
+        preprocess_start = time.time()
+        queued = None
+        if cached is None and TFLITE_AVAILABLE:
+            # One preprocessing pass per distinct input size, then all members at once
+            queued = await decode_stage(ensemble_and_queue, img, cache_key)
+        preprocess_time = time.time() - preprocess_start
+        
+        inference_start = time.time()
+        if cached is not None:
+            probs, members = cached
+        elif queued is not None:
+            probs, members = await asyncio.wrap_future(queued)
+        else:
+            logger.warning("Using mock prediction (no inference backend available)")
+            probs = np.array([0.7, 0.3])
+            members = {name: {"probs": probs, "latency_ms": 0.0} for name in ENSEMBLE.members}
+        inference_time = time.time() - inference_start
+        
+        p_normal, p_tumor = float(probs[0]), float(probs[1])
+        prediction = LABELS[1] if p_tumor >= THRESH else LABELS[0]
+        per_model = []
+        for name, member in members.items():
+            member_p = float(member["probs"][1])
+            per_model.append({
+                "model": name,
+                "prediction": LABELS[1] if member_p >= THRESH else LABELS[0],
+                "probabilities": {
+                    LABELS[0]: round(float(member["probs"][0]), 4),
+                    LABELS[1]: round(member_p, 4)
+                },
+                "latency_ms": member["latency_ms"]  # includes the wait in the member's queue
+            })
+        
+        total_time = time.time() - request_start
+        timings = {
+            "preprocessing_ms": round(preprocess_time * 1000, 2),
+            "inference_ms": round(inference_time * 1000, 2),
+            "total_ms": round(total_time * 1000, 2)
+        }
+        STATS.incr("ensemble_requests")
+        STATS.incr("images")
+        STATS.record(
+            ensemble_inference=None if cached is not None else inference_time * 1000,
+            ensemble_total=total_time * 1000,
+        )
+        if random.random() < LOG_SAMPLE_RATE:
+            logger.info("ensemble prediction", extra={
+                "event": "predict_ensemble", "prediction": prediction, "p_tumor": round(p_tumor, 4),
+                "members": {m["model"]: m["probabilities"][LABELS[1]] for m in per_model},
+                "cached": cached is not None, "timings_ms": timings
+            })
+        
+        return respond({
+            "success": True,
+            "prediction": prediction,
+            "confidence": round(max(p_normal, p_tumor), 4),
+            "probabilities": {LABELS[0]: round(p_normal, 4), LABELS[1]: round(p_tumor, 4)},
+            "aggregate": ENSEMBLE.aggregate,
+            "agreement": round(sum(m["prediction"] == prediction for m in per_model) / len(per_model), 4),
+            "models": per_model,
+            "threshold": THRESH,
+            "cached": cached is not None,
+            "processing_times": timings
+        }, {
+            "probabilities": [p_normal, p_tumor],
+            "models": [[float(m["probs"][0]), float(m["probs"][1])] for m in members.values()]
+        }, fmt, request)
+    
+    except HTTPException as e:
+        STATS.incr("errors")
+        logger.warning("ensemble prediction rejected", extra={
+            "event": "predict_ensemble", "status": e.status_code, "detail": e.detail,
+            "timings_ms": stage_timings(request_start, preprocess_time, inference_time)
+        })
         raise
     except Exception as e:
-        logger.error(f"Prediction error: {e}", exc_info=True)
+        STATS.incr("errors")
+        logger.error("ensemble prediction failed", exc_info=True, extra={
+            "event": "predict_ensemble", "status": 500, "detail": str(e),
+            "timings_ms": stage_timings(request_start, preprocess_time, inference_time)
+        })
         raise HTTPException(
             status_code=500,
             detail=f"Error processing image: {str(e)}"
         )
+
+def _save_uploads(files: List[UploadFile], directory: str) -> List[str]:
+    """Stream uploads to disk (never fully in memory) so volumes can be memory-mapped."""
+    paths, total = [], 0
+    for i, file in enumerate(files):
+        # Keep the client's suffix (.nii.gz, .dcm, .zip): readers detect formats by name
+        path = os.path.join(directory, f"{i:05d}_{os.path.basename(file.filename or 'upload')}")
+        with open(path, "wb") as out:
+            file.file.seek(0)
+            while chunk := file.file.read(1024 * 1024):
+                total += len(chunk)
+                if total > VOLUME_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Volume too large. Maximum {VOLUME_MAX_BYTES // (1024 * 1024)}MB allowed."
+                    )
+                out.write(chunk)
+        paths.append(path)
+    return paths
+
+async def score_volume(volume, predict_fn) -> dict:
+    """
+    Score a volume batch by batch. Each batch reserves its estimated memory
+    from MEMORY_BUDGET (like decode_stage) while its slices are read on the
+    decode pool and scored, so volumes and images share one admission budget.
+    """
+    window = await asyncio.wrap_future(DECODE.submit(estimate_window, volume))
+    p_tumor = np.empty(volume.num_slices, dtype=np.float32)
+    for start in range(0, volume.num_slices, VOLUME_BATCH):
+        stop = min(start + VOLUME_BATCH, volume.num_slices)
+        async with MEMORY_BUDGET.reserve(slice_batch_bytes(volume, stop - start)):
+            x = await asyncio.wrap_future(DECODE.submit(read_slice_batch, volume, window, start, stop))
+            p_tumor[start:stop] = np.asarray(await asyncio.to_thread(predict_fn, x))[:, 1]
+    return volume_result(volume, window, p_tumor, labels=LABELS, threshold=THRESH)
+
+async def _run_volume(files: List[UploadFile], axis: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="volume-")
+    try:
+        paths = await asyncio.to_thread(_save_uploads, files, directory)
+        try:
+            volume = await asyncio.to_thread(open_volume, paths, [f.filename or "" for f in files], axis=axis)
+        except RuntimeError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        except Exception as e:
+            # Reader errors quote the temporary file paths; keep them in the log only
+            logger.warning(f"Could not read volume: {e}")
+            raise HTTPException(
+                status_code=400,
+                detail="Could not read volume. Upload one .nii/.nii.gz file, DICOM (.dcm) slices, or a .zip of a DICOM series."
+            )
+        try:
+            if TFLITE_AVAILABLE and ENGINE.ready.is_set():
+                predict_fn = ENGINE.predict_arrays
+            else:
+                logger.warning("Using mock prediction (no inference backend available)")
+                predict_fn = lambda x: np.tile([0.7, 0.3], (x.shape[0], 1))
+            return await score_volume(volume, predict_fn)
+        finally:
+            volume.close()
+    finally:
+        await asyncio.to_thread(shutil.rmtree, directory, True)
+
+@app.post("/predict/volume")
+async def predict_volume(files: List[UploadFile] = File(...), axis: int = 2):
+    """
+    Predict a whole scan: one NIfTI volume (.nii/.nii.gz), DICOM slices (.dcm),
+    or a .zip of a DICOM series. Slices are windowed, normalized and scored in
+    batches; returns per-slice probabilities plus a volume-level aggregate.
+    """
+    request_start = time.time()
+    if axis not in (0, 1, 2):
+        raise HTTPException(status_code=400, detail="axis must be 0, 1 or 2.")
+    
+    if not READY.is_set() or ENGINE.unloaded:
+        try:
+            await load_model_lazy()
+        except Exception as e:
+            logger.error(f"Model loading failed: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Model loading failed. Please try again later.",
+                headers={"Retry-After": "5"}
+            )
+    
+    try:
+        result = await _run_volume(files, axis)
+    except HTTPException:
+        STATS.incr("errors")
+        raise
+    except Exception as e:
+        STATS.incr("errors")
+        logger.error("volume prediction failed", exc_info=True, extra={"event": "predict_volume", "detail": str(e)})
+        raise HTTPException(status_code=500, detail="Error processing volume.")
+    
+    total_time = time.time() - request_start
+    STATS.incr("volume_requests")
+    STATS.incr("images", result["num_slices"])
+    STATS.record(volume_total=total_time * 1000)
+    logger.info("volume prediction", extra={
+        "event": "predict_volume", "format": result["format"], "shape": result["shape"],
+        "num_slices": result["num_slices"], "prediction": result["aggregate"]["prediction"],
+        "p_tumor": result["aggregate"]["p_tumor"], "timings_ms": {"total_ms": round(total_time * 1000, 2)}
+    })
+    return {
+        "success": True,
+        **result,
+        "threshold": THRESH,
+        "model_sha": MODEL_SHA or "unknown",
+        "processing_times": {"total_ms": round(total_time * 1000, 2)}
+    }
+
+STARTUP.checkpoint("app setup")
@@ -0,0 +1,58 @@
+"""
+In-process request metrics for the debug endpoints.
+
+Keeps a bounded window of recent per-stage latencies plus monotonically
+increasing counters, cheap enough to record on every request.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+import numpy as np
+
+
+class LatencyWindow:
+    def __init__(self, maxlen: int = 2048):
+        self.maxlen = maxlen
+        self.started = time.time()
+        self._samples: Dict[str, deque] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, **stages_ms: float):
+        """Record one request's stage timings, e.g. record(preprocessing=1.2, total=9.8)."""
+        with self._lock:
+            for stage, ms in stages_ms.items():
+                if ms is None:
+                    continue
+                if stage not in self._samples:
+                    self._samples[stage] = deque(maxlen=self.maxlen)
+                self._samples[stage].append(ms)
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = {stage: np.fromiter(values, dtype=np.float64) for stage, values in self._samples.items()}
+            counters = dict(self._counters)
+        stages = {}
+        for stage, arr in samples.items():
+            if arr.size == 0:
+                continue
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            stages[stage] = {
+                "count": int(arr.size),
+                "mean_ms": round(float(arr.mean()), 2),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+            }
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "window": self.maxlen,
+            "counters": counters,
+            "stages": stages,
+        }
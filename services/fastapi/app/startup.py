@@ -0,0 +1,98 @@
+"""
+Cold-start helpers: phase timing for the startup report and Pillow plugin trimming.
+
+Cloud Run bills cold-start time to the first request, so main.py times each
+import and initialization phase (served on /debug/startup) and keeps Pillow
+from importing its ~40 format plugins when only three formats are accepted.
+Standard library only, so it can be imported before anything heavy.
+"""
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+# Pillow plugin module per accepted format
+PILLOW_PLUGINS = {
+    "JPEG": "JpegImagePlugin",
+    "PNG": "PngImagePlugin",
+    "WEBP": "WebPImagePlugin",
+    "BMP": "BmpImagePlugin",
+    "GIF": "GifImagePlugin",
+    "TIFF": "TiffImagePlugin",
+}
+
+
+def process_uptime() -> Optional[float]:
+    """Seconds since this process was started (Linux /proc), or None."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) is in clock ticks since boot; the comm field may contain spaces
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Records named startup phases; create it as early as possible in the entry module."""
+
+    def __init__(self):
+        self.created = self._last_end = time.perf_counter()
+        # Interpreter start-up and anything imported before the timer existed
+        self.before_s = process_uptime()
+        self.phases: List[Dict] = []
+
+    def _record(self, name: str, start: float, end: float):
+        self.phases.append({
+            "phase": name,
+            "start_ms": round((start - self.created) * 1000, 1),
+            "ms": round((end - start) * 1000, 1),
+        })
+        self._last_end = end
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter())
+
+    def checkpoint(self, name: str):
+        """Record everything since the previous phase ended as phase `name`."""
+        self._record(name, self._last_end, time.perf_counter())
+
+    def report(self) -> Dict:
+        return {
+            "before_timer_s": round(self.before_s, 3) if self.before_s is not None else None,
+            "phases": list(self.phases),
+            "total_ms": round(sum(p["ms"] for p in self.phases), 1),
+            "slowest": sorted(self.phases, key=lambda p: -p["ms"])[:5],
+        }
+
+    def summary(self) -> str:
+        return ", ".join(f"{p['phase']} {p['ms']:.0f}ms" for p in self.phases)
+
+
+def register_image_formats(formats: Iterable[str] = ("JPEG", "PNG", "WEBP")) -> List[str]:
+    """
+    Import only the Pillow plugins for `formats` and mark Pillow initialized,
+    so Image.open() never falls back to importing every plugin it ships.
+    Images in other formats then fail to open like any unreadable upload.
+    Returns the formats actually registered (WebP needs libwebp in the wheel).
+    """
+    from PIL import Image
+
+    registered = []
+    for fmt in formats:
+        try:
+            importlib.import_module(f"PIL.{PILLOW_PLUGINS[fmt.upper()]}")
+            registered.append(fmt.upper())
+        except ImportError:
+            pass
+    # Image.preinit()/init() skip plugin discovery once this reaches 2
+    Image._initialized = 2
+    return registered
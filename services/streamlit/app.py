@@ -1,5 +1,4 @@
-import os, io, base64, time
-import requests
+import os, io, base64, time, hashlib
 import streamlit as st
 from PIL import Image
 
@@ -7,7 +6,9 @@ from PIL import Image
 st.set_page_config(page_title="Brain Tumor Prediction Diagnosis", page_icon="🩺", layout="wide")
 
 # Setelah set_page_config, baru import modul internal yang mungkin ada st.* di dalamnya
-from config_utils import get_config, get_bool, get_int, get_list, has_secrets_file
+from config_utils import get_config, get_bool, get_int, get_list, has_secrets_file, resolve_api_base
+from backend_client import BackendError, BackendNotReadyError, CircuitOpenError, get_client
+from upload_utils import prepare_upload
 
 # ============================================================================
 # IMPORTANT: API_URL Configuration for Cloud Run Deployment
@@ -24,15 +25,13 @@ from config_utils import get_config, get_bool, get_int, get_list, has_secrets_fi
 # ============================================================================
 
 # Get API_URL from environment with fallback handling
-API_BASE = os.environ.get("API_URL", "")
+API_BASE = resolve_api_base()
 
 # Handle special "local" value for local development
-if API_BASE == "local":
-    API_BASE = "http://localhost:8080"
+if os.environ.get("API_URL") == "local":
     st.info("🔧 Running in LOCAL mode - connecting to http://localhost:8080")
-elif not API_BASE:
+elif not os.environ.get("API_URL"):
     # Fallback to Hugging Face for backward compatibility
-    API_BASE = "https://huggingface.co/spaces/iseptianto/brain-tumor-predictor"
     st.warning("⚠️ API_URL not set! Using fallback URL. Set API_URL env var for production.")
 
 # Construct full URLs
@@ -50,20 +49,54 @@ if DEBUG:
     st.sidebar.write(f"API_BASE: {API_BASE}")
     st.sidebar.write(f"FASTAPI_URL: {FASTAPI_URL}")
 
-def wait_until_ready(base_url, timeout=120, interval=2):
-    """Wait for FastAPI backend to be ready."""
-    import time
-    health_url = base_url.replace('/predict', '/health')
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            resp = requests.get(health_url, timeout=5)
-            if resp.status_code == 200 and resp.json().get("status") == "ok":
-                return True
-        except:
-            pass
-        time.sleep(interval)
-    return False
+# Shared keep-alive client (connection pool, cached readiness, circuit breaker)
+client = get_client(API_BASE)
+
+# Rerun-safe caches: every widget interaction reruns this script, so the
+# preview and the prediction are memoized by the upload's content hash.
+PREDICTION_CACHE_TTL = get_int("PREDICTION_CACHE_TTL", 3600)
+PREDICTION_CACHE_MAX = get_int("PREDICTION_CACHE_MAX", 128)
+PREVIEW_CACHE_MAX = get_int("PREVIEW_CACHE_MAX", 32)
+PREVIEW_MAX_SIDE = 768
+
+def upload_hash(uploaded) -> str:
+    """SHA-256 of the upload, computed once per uploaded file."""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    file_id = getattr(uploaded, "file_id", None) or f"{uploaded.name}:{uploaded.size}"
+    if file_id not in hashes:
+        hashes[file_id] = hashlib.sha256(uploaded.getvalue()).hexdigest()
+    return hashes[file_id]
+
+@st.cache_data(ttl=PREDICTION_CACHE_TTL, max_entries=PREVIEW_CACHE_MAX, show_spinner=False)
+def preview_thumbnail(content_hash: str, _raw: bytes) -> bytes:
+    """Small JPEG preview; decoding is cut short by draft() for JPEG input."""
+    img = Image.open(io.BytesIO(_raw))
+    img.draft("RGB", (PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))
+    img.thumbnail((PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+@st.cache_data(ttl=PREDICTION_CACHE_TTL, max_entries=PREDICTION_CACHE_MAX, show_spinner=False)
+def analyze_upload(content_hash: str, _raw: bytes) -> dict:
+    """Prediction for an upload; re-analyzing the same bytes never hits the backend."""
+    try:
+        ready = client.wait_until_ready()
+    except CircuitOpenError:
+        ready = False
+    if not ready:
+        raise BackendNotReadyError()
+
+    # Original bytes when already small, else downscaled JPEG/WebP
+    payload, upload_name, upload_mime, upload_info = prepare_upload(_raw)
+    # Pooled request; 503s back off using the server's Retry-After hint
+    resp = client.predict(files={"file": (upload_name, io.BytesIO(payload), upload_mime)})
+    if not resp.ok:
+        raise BackendError(resp.status_code, resp.text)
+    data = resp.json()
+    data["upload"] = upload_info
+    data["analyzed_at"] = time.time()
+    return data
 
 # Initialize session state
 if "lang" not in st.session_state:
@@ -171,16 +204,16 @@ upload_col, result_col = st.columns([1.2, 1])
 
 with upload_col:
     st.markdown(f"### 📤 {t['upload_title']}")
-    st.markdown("*Supported formats: JPG, PNG, JPEG (max 10MB)*")
-    uploaded = st.file_uploader("", type=["jpg", "jpeg", "png"], label_visibility="collapsed")
+    st.markdown("*Supported formats: JPG, PNG, JPEG, WEBP (max 10MB)*")
+    uploaded = st.file_uploader("", type=["jpg", "jpeg", "png", "webp"], label_visibility="collapsed")
     st.write("---")
 
     # NEW: preview placeholder (lives in upload_col)
     preview_box = st.empty()
     if uploaded is not None and not st.session_state.get("prediction_result"):
         try:
-            _probe = Image.open(uploaded).convert("RGB")
-            preview_box.image(_probe, caption=t['preview'], use_column_width=True)
+            thumb = preview_thumbnail(upload_hash(uploaded), uploaded.getvalue())
+            preview_box.image(thumb, caption=t['preview'], use_column_width=True)
         except Exception:
             pass
 
@@ -327,9 +360,9 @@ if go:
             # Store uploaded file in session state
             st.session_state["uploaded_file"] = uploaded
 
-            # Handle Streamlit UploadedFile - seek to beginning first
-            uploaded.seek(0)
-            img = Image.open(uploaded).convert("RGB")
+            # Work on the raw upload bytes; no full decode unless we downscale
+            raw = uploaded.getvalue()
+            content_hash = upload_hash(uploaded)
 
             # DO NOT render st.image(...) again in this block
 
@@ -337,74 +370,42 @@ if go:
             progress_bar.progress(0)
             progress_text.text("Starting analysis...")
 
-            # Check if backend is ready
-            with st.spinner("🔄 Warming up server & loading model..."):
-                if not wait_until_ready(FASTAPI_URL):
-                    st.error(f"❌ {t['server_not_ready']}")
-                    st.stop()
+            # Start timing
+            start = time.perf_counter()
+            clicked_at = time.time()
 
-            # Initialize progress
-            progress_bar.progress(0)
-            progress_text.text("Starting analysis...")
+            try:
+                with st.spinner("🔄 Warming up server & analyzing image with AI..."):
+                    progress_bar.progress(50)
+                    progress_text.text("Sending to AI model...")
+                    data = analyze_upload(content_hash, raw)
+            except BackendNotReadyError:
+                progress_bar.progress(0)
+                progress_text.text("")
+                st.error(f"❌ {t['server_not_ready']}")
+                st.stop()
+            except BackendError as e:
+                progress_bar.progress(0)
+                progress_text.text("")
+                st.error(f"❌ {t['error_request']}: {e.status_code} - {e.text}")
+                st.stop()
 
-            with st.spinner("🔄 Analyzing image with AI..."):
-                # Simulate progress steps
-                progress_bar.progress(25)
-                progress_text.text("Preprocessing image...")
-
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                buf.seek(0)
-
-                progress_bar.progress(50)
-                progress_text.text("Sending to AI model...")
-
-                # Start timing
-                start = time.perf_counter()
-
-                # Try prediction with exponential backoff for 503 errors
-                max_retries = 5
-                for attempt in range(max_retries):
-                    try:
-                        resp = requests.post(FASTAPI_URL, files={"file": ("image.png", buf, "image/png")}, timeout=120)
-                        if resp.status_code != 503:
-                            break
-                        elif attempt < max_retries - 1:
-                            wait_time = 2 ** attempt  # 2, 3, 5, 8, 13 seconds
-                            progress_text.text(f"Model loading... retrying in {wait_time}s")
-                            time.sleep(wait_time)
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            raise e
-
-                # Calculate elapsed time
-                elapsed = time.perf_counter() - start
-                st.session_state["processing_ms"] = int(elapsed * 1000)
+            # Calculate elapsed time
+            elapsed = time.perf_counter() - start
+            st.session_state["processing_ms"] = int(elapsed * 1000)
+            if DEBUG:
+                st.sidebar.write("Upload", data.get("upload"))
+                st.sidebar.write("From cache", data.get("analyzed_at", 0) < clicked_at)
 
-                progress_bar.progress(75)
-                progress_text.text("Processing results...")
+            # Store prediction result in session state
+            st.session_state["prediction_result"] = data
 
-            if not resp.ok:
-                progress_bar.progress(0)
-                progress_text.text("")
-                st.error(f"❌ {t['error_request']}: {resp.status_code} - {resp.text}")
-            else:
-                data = resp.json()
-                pred = data["prediction"]
-                prob = float(data["confidence"])
-                labels = data.get("labels", ["Tidak Tumor Otak", "Tumor Otak"])
-                probs = data.get("probs", [0.5, 0.5])
-                model_acc = data.get("model_accuracy", 0.85)
-
-                # Store prediction result in session state
-                st.session_state["prediction_result"] = data
-
-                progress_bar.progress(100)
-                progress_text.text(t['complete'])
-
-                # NEW: clear the preview and rerun so the right column shows results
-                preview_box.empty()
-                st.rerun()
+            progress_bar.progress(100)
+            progress_text.text(t['complete'])
+
+            # NEW: clear the preview and rerun so the right column shows results
+            preview_box.empty()
+            st.rerun()
 
         except Exception as e:
             # Calculate elapsed time even on error
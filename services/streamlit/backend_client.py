@@ -0,0 +1,217 @@
+"""
+Pooled, keep-alive HTTP client for the FastAPI backend.
+
+One requests.Session is shared per backend URL for the whole Streamlit
+process, so every Analyze click reuses warm TCP/TLS connections instead of
+paying a new handshake to Cloud Run. Readiness is cached for a short TTL,
+retries honour the server's Retry-After hint and a circuit breaker fails
+fast while the backend is down.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config_utils import get_int
+
+READY_TTL = get_int("BACKEND_READY_TTL", 30)             # seconds a healthy /health is trusted
+BREAKER_FAILURES = get_int("BACKEND_BREAKER_FAILURES", 3)  # consecutive failures before opening
+BREAKER_RESET = get_int("BACKEND_BREAKER_RESET", 30)      # seconds before a half-open probe
+POOL_SIZE = get_int("BACKEND_POOL_SIZE", 10)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_RETRY_WAIT = 30  # seconds; cap on both the computed backoff and a server's Retry-After
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend that is known to be down."""
+
+
+class BackendError(RuntimeError):
+    """Non-success answer from the backend."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class BackendNotReadyError(BackendError):
+    """Backend did not report healthy within the readiness timeout."""
+
+    def __init__(self):
+        super().__init__(503, "backend not ready")
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        if self.state == "open":
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(f"Backend unavailable, retrying in {remaining:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed half-open probe re-opens for another full cool-down
+                self.opened_at = time.monotonic()
+
+
+def retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date)."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BackendClient:
+    def __init__(self, base_url: str):
+        base_url = base_url.rstrip("/")
+        for suffix in ("/predict/batch", "/predict"):
+            if base_url.endswith(suffix):
+                base_url = base_url[: -len(suffix)]
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = CircuitBreaker()
+        self._ready_until = 0.0
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    # ---------------------------------------------------------------- readiness
+
+    def is_ready(self, force: bool = False) -> bool:
+        """Single /health probe; a healthy answer is cached for READY_TTL."""
+        if not force and time.monotonic() < self._ready_until:
+            return True
+        try:
+            resp = self.session.get(self.url("/health"), timeout=5)
+            ok = resp.status_code == 200 and resp.json().get("status") == "ok"
+        except (requests.RequestException, ValueError):
+            ok = False
+        self._ready_until = time.monotonic() + READY_TTL if ok else 0.0
+        return ok
+
+    def wait_until_ready(self, timeout: float = 120, interval: float = 2) -> bool:
+        """Wait for the backend to be ready (returns at once while cached)."""
+        self.breaker.check()
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.is_ready():
+                return True
+            if time.monotonic() + interval > deadline:
+                return False
+            time.sleep(interval)
+
+    def invalidate(self):
+        self._ready_until = 0.0
+
+    # ------------------------------------------------------------------ requests
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        max_retries: int = 5,
+        on_retry: Optional[Callable[[int, float], None]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request with Retry-After-aware backoff on 429/502/503/504.
+
+        File-like bodies are rewound before each attempt. Raises
+        CircuitOpenError without touching the network while the breaker is open.
+        """
+        self.breaker.check()
+        kwargs.setdefault("timeout", 120)
+        resp = None
+        for attempt in range(max_retries):
+            files = kwargs.get("files") or {}
+            for f in (files.values() if isinstance(files, dict) else (v for _, v in files)):
+                fileobj = f[1] if isinstance(f, tuple) else f
+                if hasattr(fileobj, "seek"):
+                    fileobj.seek(0)
+            try:
+                resp = self.session.request(method, self.url(path), **kwargs)
+            except requests.RequestException:
+                self.breaker.record_failure()
+                self.invalidate()
+                if attempt == max_retries - 1 or self.breaker.state == "open":
+                    raise
+                wait = min(2 ** attempt, MAX_RETRY_WAIT) * (0.5 + random.random() / 2)
+            else:
+                if resp.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return resp
+                self.invalidate()
+                if resp.status_code != 429:
+                    self.breaker.record_failure()
+                if attempt == max_retries - 1 or self.breaker.state == "open":
+                    return resp
+                hinted = retry_after_seconds(resp)
+                # Each wait blocks the Streamlit script thread, so a long or HTTP-date hint is capped too
+                if hinted is not None:
+                    wait = min(hinted, MAX_RETRY_WAIT)
+                else:
+                    wait = min(2 ** attempt, MAX_RETRY_WAIT) * (0.5 + random.random() / 2)
+            if on_retry:
+                on_retry(attempt + 1, wait)
+            time.sleep(wait)
+        return resp
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def predict(self, files, **kwargs) -> requests.Response:
+        return self.post("/predict", files=files, **kwargs)
+
+    def predict_batch(self, files, **kwargs) -> requests.Response:
+        """`files` is a list of ("files", (name, fileobj, mime)) tuples."""
+        return self.post("/predict/batch", files=files, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_client(base_url: str) -> BackendClient:
+    """Process-wide client per backend URL (shared by all Streamlit sessions)."""
+    return BackendClient(base_url)
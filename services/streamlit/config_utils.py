@@ -51,6 +51,15 @@ def get_list(key: str, default: Optional[List[str]] = None, sep: str = ",") -> L
     items = [item.strip() for item in val.split(sep)]
     return [item for item in items if item]
 
+FALLBACK_API_BASE = "https://huggingface.co/spaces/iseptianto/brain-tumor-predictor"
+
+def resolve_api_base() -> str:
+    """Backend base URL from API_URL ("local" -> http://localhost:8080, unset -> HF fallback)"""
+    api = os.environ.get("API_URL", "")
+    if api == "local":
+        return "http://localhost:8080"
+    return api or FALLBACK_API_BASE
+
 def has_secrets_file() -> bool:
     """Check if secrets.toml file exists without crashing"""
     try:
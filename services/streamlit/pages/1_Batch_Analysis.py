@@ -0,0 +1,149 @@
+import io, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import streamlit as st
+
+# ⬇️ WAJIB: st.set_page_config HARUS jadi perintah Streamlit pertama
+st.set_page_config(page_title="Batch Analysis", page_icon="📦", layout="wide")
+
+from config_utils import get_int, resolve_api_base
+from backend_client import CircuitOpenError, get_client
+from upload_utils import prepare_upload
+
+# ============================================================================
+# Batch analysis: many files -> /predict/batch in bounded-concurrency chunks.
+# Only the chunks currently in flight hold encoded payloads; no decoded
+# image is kept once its chunk has been sent.
+# ============================================================================
+BATCH_CHUNK_SIZE = get_int("BATCH_CHUNK_SIZE", 8)      # files per request
+BATCH_CONCURRENCY = get_int("BATCH_CONCURRENCY", 2)    # requests in flight
+BATCH_MAX_FILES = get_int("BATCH_MAX_FILES", 500)
+
+client = get_client(resolve_api_base())
+
+COLUMNS = ["file", "status", "prediction", "confidence", "p_tumor",
+           "server_ms", "roundtrip_ms", "sent_kb"]
+
+
+def _row(name, sent_bytes, roundtrip_ms, result=None, error=None, server_ms=None):
+    row = {"file": name, "status": "ok" if result else "error", "prediction": None,
+           "confidence": None, "p_tumor": None, "server_ms": server_ms,
+           "roundtrip_ms": round(roundtrip_ms, 1), "sent_kb": round(sent_bytes / 1024, 1)}
+    if result:
+        probs = list(result.get("probabilities", {}).values())
+        row.update(prediction=result.get("prediction"), confidence=result.get("confidence"),
+                   p_tumor=probs[1] if len(probs) > 1 else None)
+    else:
+        row["prediction"] = error
+    return row
+
+
+def _send_single(files):
+    """Fallback for backends without /predict/batch: one request per file."""
+    rows = []
+    for f in files:
+        payload, _, mime, info = prepare_upload(f.getvalue())
+        start = time.perf_counter()
+        resp = client.predict(files={"file": (f.name, io.BytesIO(payload), mime)})
+        elapsed = (time.perf_counter() - start) * 1000
+        if resp.ok:
+            result = resp.json()
+            rows.append(_row(f.name, info["sent_bytes"], elapsed, result=result,
+                             server_ms=result.get("processing_times", {}).get("total_ms")))
+        else:
+            rows.append(_row(f.name, info["sent_bytes"], elapsed, error=f"{resp.status_code}: {resp.text[:120]}"))
+    return rows
+
+
+def send_chunk(files):
+    """Encode one chunk and score it with a single /predict/batch request."""
+    parts, sent = [], []
+    for f in files:
+        payload, _, mime, info = prepare_upload(f.getvalue())
+        parts.append(("files", (f.name, io.BytesIO(payload), mime)))
+        sent.append(info["sent_bytes"])
+
+    start = time.perf_counter()
+    resp = client.predict_batch(parts)
+    elapsed = (time.perf_counter() - start) * 1000
+    if resp.status_code in (404, 405):
+        return _send_single(files)
+    if not resp.ok:
+        return [_row(f.name, b, elapsed / len(files), error=f"{resp.status_code}: {resp.text[:120]}")
+                for f, b in zip(files, sent)]
+
+    data = resp.json()
+    results = data.get("results", [])
+    # Per-image server time: own decode/preprocess + its share of the batched invoke
+    inferred = sum(1 for r in results if r.get("success") and not r.get("cached")) or 1
+    invoke_share = data.get("processing_times", {}).get("inference_ms", 0.0) / inferred
+    rows = []
+    for f, b, item in zip(files, sent, results):
+        if item.get("success"):
+            server_ms = item.get("preprocessing_ms", 0.0) + (0.0 if item.get("cached") else invoke_share)
+            rows.append(_row(f.name, b, elapsed / len(files), result=item, server_ms=round(server_ms, 2)))
+        else:
+            rows.append(_row(f.name, b, elapsed / len(files), error=item.get("error", "failed")))
+    return rows
+
+
+st.markdown("### 📦 **Batch Analysis**")
+st.caption("Drop a whole study folder; images are scored in parallel chunks and results stream in below.")
+
+uploads = st.file_uploader("", type=["jpg", "jpeg", "png", "webp"], accept_multiple_files=True,
+                           label_visibility="collapsed")
+if uploads and len(uploads) > BATCH_MAX_FILES:
+    st.warning(f"⚠️ Only the first {BATCH_MAX_FILES} of {len(uploads)} files will be analyzed.")
+    uploads = uploads[:BATCH_MAX_FILES]
+
+go = st.button(f"Analyze {len(uploads or [])} image(s)", type="primary",
+               use_container_width=True, disabled=not uploads)
+
+progress_bar = st.empty()
+status_text = st.empty()
+table = st.empty()
+
+if go:
+    try:
+        client.wait_until_ready()
+    except CircuitOpenError as e:
+        st.error(f"❌ {e}")
+        st.stop()
+
+    chunks = [uploads[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(uploads), BATCH_CHUNK_SIZE)]
+    rows = []
+    started = time.perf_counter()
+    progress_bar.progress(0.0)
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_CONCURRENCY)) as pool:
+        futures = {pool.submit(send_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                rows.extend(_row(f.name, 0, 0, error=str(e)) for f in futures[future])
+            done = len(rows)
+            elapsed = time.perf_counter() - started
+            rate = done / elapsed if elapsed else 0
+            eta = (len(uploads) - done) / rate if rate else 0
+            progress_bar.progress(done / len(uploads))
+            status_text.text(f"{done}/{len(uploads)} images · {rate:.1f} img/s · ETA {eta:.0f}s")
+            table.dataframe(pd.DataFrame(rows, columns=COLUMNS), use_container_width=True, hide_index=True)
+
+    st.session_state["batch_results"] = rows
+    status_text.text(f"✅ {len(rows)} images in {time.perf_counter() - started:.1f}s")
+
+# Results survive reruns (sorting, download) without re-sending anything
+if st.session_state.get("batch_results"):
+    df = pd.DataFrame(st.session_state["batch_results"], columns=COLUMNS)
+    df = df.sort_values("p_tumor", ascending=False, na_position="last")
+    table.dataframe(df, use_container_width=True, hide_index=True)
+
+    c1, c2, c3 = st.columns(3)
+    ok = df[df["status"] == "ok"]
+    c1.metric("Analyzed", f"{len(ok)}/{len(df)}")
+    c2.metric("Median round-trip", f"{ok['roundtrip_ms'].median():.0f} ms" if len(ok) else "-")
+    c3.metric("Uploaded", f"{df['sent_kb'].sum() / 1024:.1f} MB")
+
+    st.download_button("⬇️ Download CSV", df.to_csv(index=False).encode("utf-8"),
+                       file_name="batch_results.csv", mime="text/csv", use_container_width=True)
@@ -0,0 +1,120 @@
+import time
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+
+# ⬇️ WAJIB: st.set_page_config HARUS jadi perintah Streamlit pertama
+st.set_page_config(page_title="Performance", page_icon="📈", layout="wide")
+
+from config_utils import get_int, resolve_api_base
+from backend_client import CircuitOpenError, get_client
+
+# ============================================================================
+# Operator dashboard: polls /debug/stats (rolling per-stage percentiles and
+# counters) and /debug/model_meta while this page is open. Samples live in a
+# bounded per-session ring buffer; leaving the page stops the polling.
+# ============================================================================
+DASHBOARD_POLL_SECONDS = get_int("DASHBOARD_POLL_SECONDS", 5)
+DASHBOARD_HISTORY = get_int("DASHBOARD_HISTORY", 360)  # samples kept (30 min at 5 s)
+
+client = get_client(resolve_api_base())
+
+STAGES = ["preprocessing", "inference", "total"]
+
+if "perf_history" not in st.session_state or st.session_state["perf_history"].maxlen != DASHBOARD_HISTORY:
+    st.session_state["perf_history"] = deque(maxlen=DASHBOARD_HISTORY)
+history = st.session_state["perf_history"]
+
+
+def poll():
+    """One sample: rolling percentiles from /debug/stats plus throughput since the previous sample."""
+    resp = client.get("/debug/stats", max_retries=1, timeout=5)
+    if resp.status_code == 404:
+        return None, "Backend has no /debug/stats endpoint (older version)."
+    if not resp.ok:
+        return None, f"{resp.status_code}: {resp.text[:120]}"
+    data = resp.json()
+
+    now = time.time()
+    counters = data.get("counters", {})
+    sample = {"time": pd.Timestamp(now, unit="s"), "ts": now, "images": counters.get("images", 0),
+              "errors": counters.get("errors", 0), "model_load_time_s": data.get("model_load_time_s"),
+              "cache_hit_rate": data.get("cache", {}).get("hit_rate"),
+              "avg_batch_size": data.get("batching", {}).get("avg_batch_size")}
+    for stage in STAGES:
+        stats = data.get("stages", {}).get(stage, {})
+        sample[f"{stage}_p50"] = stats.get("p50_ms")
+        sample[f"{stage}_p95"] = stats.get("p95_ms")
+
+    prev = history[-1] if history else None
+    if prev and now > prev["ts"] and sample["images"] >= prev["images"]:
+        sample["throughput_ips"] = (sample["images"] - prev["images"]) / (now - prev["ts"])
+    else:
+        # First sample, or the backend restarted and its counters reset
+        sample["throughput_ips"] = None
+    history.append(sample)
+    return data, None
+
+
+st.markdown("### 📈 **Performance Dashboard**")
+st.caption(f"Polls the backend every {DASHBOARD_POLL_SECONDS}s while this page is open "
+           f"(last {DASHBOARD_HISTORY} samples kept).")
+
+c1, c2 = st.columns([1, 5])
+live = c1.toggle("Live", value=True)
+if c2.button("Clear history"):
+    history.clear()
+    st.session_state.pop("perf_model_meta", None)
+
+
+@st.fragment(run_every=DASHBOARD_POLL_SECONDS if live else None)
+def dashboard():
+    try:
+        data, error = poll()
+    except CircuitOpenError as e:
+        data, error = None, str(e)
+    except Exception as e:
+        data, error = None, f"Backend unreachable: {e}"
+    if error:
+        st.warning(f"⚠️ {error}")
+
+    if not history:
+        st.info("Waiting for the first sample…")
+        return
+    df = pd.DataFrame(list(history)).set_index("time")
+    last = history[-1]
+
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("p95 total", f"{last['total_p95']:.0f} ms" if last["total_p95"] is not None else "-")
+    m2.metric("Throughput", f"{last['throughput_ips']:.2f} img/s" if last["throughput_ips"] is not None else "-")
+    m3.metric("Cache hit rate", f"{last['cache_hit_rate']:.0%}" if last["cache_hit_rate"] is not None else "-")
+    m4.metric("Model load time", f"{last['model_load_time_s']:.2f} s" if last["model_load_time_s"] else "-")
+    m5.metric("Errors", last["errors"])
+
+    st.markdown("**Latency per stage (ms, rolling window)**")
+    cols = st.columns(len(STAGES))
+    for col, stage in zip(cols, STAGES):
+        col.caption(stage)
+        col.line_chart(df[[f"{stage}_p50", f"{stage}_p95"]].rename(columns=lambda c: c.split("_")[-1]), height=200)
+
+    t1, t2 = st.columns(2)
+    t1.markdown("**Throughput (img/s)**")
+    t1.line_chart(df["throughput_ips"], height=200)
+    t2.markdown("**Cache hit rate**")
+    t2.line_chart(df["cache_hit_rate"], height=200)
+
+    if data:
+        with st.expander("Raw /debug/stats"):
+            st.json(data)
+        # model_meta would trigger a lazy load, so fetch it once the model is up (not every poll)
+        if data.get("model_loaded") and "perf_model_meta" not in st.session_state:
+            meta = client.get("/debug/model_meta", max_retries=1, timeout=10)
+            if meta.ok:
+                st.session_state["perf_model_meta"] = meta.json()
+    if st.session_state.get("perf_model_meta"):
+        with st.expander("Model metadata"):
+            st.json(st.session_state["perf_model_meta"])
+
+
+dashboard()
@@ -0,0 +1,79 @@
+"""
+Compact upload encoding for the Analyze request.
+
+The backend resizes every image to 224x224, so shipping a lossless
+full-resolution PNG is wasted bandwidth. Small files go out as their
+original bytes; larger ones are downscaled (aspect preserved, shorter side
+kept well above the model input so the server-side resize stays
+equivalent) and re-encoded as high-quality JPEG or WebP.
+"""
+import io
+from typing import Dict, Tuple
+
+from PIL import Image
+
+from config_utils import get_config, get_int
+
+UPLOAD_MODE = (get_config("UPLOAD_MODE", "auto") or "auto").lower()  # auto | original | compress
+UPLOAD_FORMAT = (get_config("UPLOAD_FORMAT", "jpeg") or "jpeg").lower()  # jpeg | webp
+UPLOAD_QUALITY = get_int("UPLOAD_QUALITY", 92)
+UPLOAD_MIN_SIDE = get_int("UPLOAD_MIN_SIDE", 512)  # >= 2x the 224px model input
+UPLOAD_PASSTHROUGH_BYTES = get_int("UPLOAD_PASSTHROUGH_KB", 512) * 1024
+
+# Formats the backend accepts as-is
+_MIME = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+_EXT = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+def _target_size(width: int, height: int, min_side: int) -> Tuple[int, int]:
+    """Scale so the shorter side equals min_side; never upscale."""
+    scale = min_side / min(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "WEBP":
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def prepare_upload(data: bytes, mode: str = UPLOAD_MODE) -> Tuple[bytes, str, str, Dict]:
+    """
+    Return (payload, filename, mime_type, info) for the /predict upload.
+
+    `info` records what was done (mode, original/sent bytes and sizes) for
+    display and debugging.
+    """
+    img = Image.open(io.BytesIO(data))  # header only; pixels decode lazily
+    fmt = img.format
+    info = {"original_bytes": len(data), "original_size": img.size, "mode": "original"}
+
+    passthrough_ok = fmt in _MIME
+    small = len(data) <= UPLOAD_PASSTHROUGH_BYTES and min(img.size) <= UPLOAD_MIN_SIDE * 2
+    if passthrough_ok and (mode == "original" or (mode == "auto" and small)):
+        info.update(sent_bytes=len(data), sent_size=img.size)
+        return data, f"image.{_EXT[fmt]}", _MIME[fmt], info
+
+    out_fmt = "WEBP" if UPLOAD_FORMAT == "webp" else "JPEG"
+    # Grayscale scans stay single-channel (3x smaller); the server converts to RGB
+    work = img.convert("L" if img.mode in ("L", "I;16", "I") else "RGB")
+    size = _target_size(*work.size, UPLOAD_MIN_SIDE)
+    if size != work.size:
+        if hasattr(work, "reduce") and min(work.size) // min(size) >= 2:
+            # Cheap integer pre-reduction before the final high-quality resample
+            work = work.reduce(min(work.size) // min(size))
+        work = work.resize(size, Image.LANCZOS)
+    payload = _encode(work, out_fmt, UPLOAD_QUALITY)
+
+    # Keep the original if re-encoding did not actually help
+    if passthrough_ok and len(payload) >= len(data):
+        info.update(sent_bytes=len(data), sent_size=img.size)
+        return data, f"image.{_EXT[fmt]}", _MIME[fmt], info
+
+    info.update(mode="compressed", sent_bytes=len(payload), sent_size=work.size)
+    return payload, f"image.{_EXT[out_fmt]}", _MIME[out_fmt], info